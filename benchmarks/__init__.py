@@ -0,0 +1 @@
+"""Performance benchmarks for EV Trip Tracker."""
@@ -0,0 +1,389 @@
+"""Lightweight stand-ins for Home Assistant used by the benchmarks.
+
+Only what the trip state machine and entry setup touch is faked: the state
+machine, the event bus, platform setup, timers, storage and the Open-Meteo
+API. Timers run on a virtual clock that the replay advances, so a 30 minute
+trip end delay costs nothing.
+"""
+
+import asyncio
+import heapq
+import importlib
+import itertools
+import os
+import tempfile
+import time
+from contextlib import AsyncExitStack, asynccontextmanager
+from datetime import datetime, timedelta, timezone
+from unittest.mock import patch
+
+import aiohttp
+from aiohttp import web
+from homeassistant.const import EVENT_STATE_CHANGED
+from homeassistant.core import Event, State
+
+from custom_components.ev_trip_tracker import (
+    backlog,
+    barrier,
+    coordinator,
+    location,
+    model,
+    places,
+    publisher,
+    sensor,
+    statistics,
+)
+from custom_components.ev_trip_tracker.backlog import EnrichmentBacklog
+from custom_components.ev_trip_tracker.const import CONF_WEATHER_API_URL, DOMAIN
+from custom_components.ev_trip_tracker.codec import SampleStore
+from custom_components.ev_trip_tracker.history import TripHistoryStore
+from custom_components.ev_trip_tracker.metrics import Metrics
+from custom_components.ev_trip_tracker.model import ConsumptionModel
+from custom_components.ev_trip_tracker.places import Places
+from custom_components.ev_trip_tracker.route import RouteStore
+from custom_components.ev_trip_tracker.statistics import TripStatistics
+
+EPOCH = datetime(2024, 1, 1, 8, tzinfo=timezone.utc)
+PACKAGE = "custom_components.ev_trip_tracker"
+
+
+class FakeStates:
+    """State machine that fires ``state_changed`` on the fake bus."""
+
+    def __init__(self, hass: "FakeHass") -> None:
+        self._hass = hass
+        self._states: dict[str, State] = {}
+
+    def get(self, entity_id: str) -> State | None:
+        return self._states.get(entity_id)
+
+    def async_set(
+        self, entity_id: str, new_state: str, attributes: dict | None = None
+    ) -> None:
+        old_state = self._states.get(entity_id)
+        state = State(
+            entity_id,
+            new_state,
+            attributes,
+            last_updated=EPOCH + timedelta(seconds=self._hass.now),
+        )
+        self._states[entity_id] = state
+        self._hass.bus.async_fire_state_changed(entity_id, old_state, state)
+
+
+class FakeBus:
+    """Event bus with per-entity state change routing."""
+
+    def __init__(self, hass: "FakeHass") -> None:
+        self._hass = hass
+        self._trackers: dict[str, list] = {}
+        self._listeners: dict[str, list] = {}
+        # Handler time of the last state change, in nanoseconds
+        self.last_dispatch_ns = 0
+
+    def async_listen(self, event_type: str, listener) -> callable:
+        self._listeners.setdefault(event_type, []).append(listener)
+        return lambda: self._listeners[event_type].remove(listener)
+
+    def async_fire(self, event_type: str, event_data: dict | None = None) -> None:
+        event = Event(event_type, event_data or {})
+        for listener in tuple(self._listeners.get(event_type, ())):
+            listener(event)
+
+    def async_track_entities(self, entity_ids: list[str], action) -> callable:
+        for entity_id in entity_ids:
+            self._trackers.setdefault(entity_id, []).append(action)
+
+        def _remove() -> None:
+            for entity_id in entity_ids:
+                self._trackers[entity_id].remove(action)
+
+        return _remove
+
+    def async_fire_state_changed(
+        self, entity_id: str, old_state: State | None, new_state: State
+    ) -> None:
+        event = Event(
+            EVENT_STATE_CHANGED,
+            {"entity_id": entity_id, "old_state": old_state, "new_state": new_state},
+        )
+        start = time.perf_counter_ns()
+        for action in tuple(self._trackers.get(entity_id, ())):
+            action(event)
+        self.last_dispatch_ns = time.perf_counter_ns() - start
+
+
+class FakeConfig:
+    def __init__(self, config_dir: str) -> None:
+        self.config_dir = config_dir
+
+    def path(self, *parts: str) -> str:
+        return os.path.join(self.config_dir, *parts)
+
+
+class FakeConfigEntries:
+    """Sets up entity platforms and waits until their entities are added."""
+
+    def __init__(self, hass: "FakeHass") -> None:
+        self._hass = hass
+        self.entities: list = []
+
+    async def async_forward_entry_setups(self, entry, platforms: list[str]) -> None:
+        for platform in platforms:
+            module = importlib.import_module(f"{PACKAGE}.{platform}")
+            tasks = []
+
+            def _async_add_entities(entities, tasks=tasks) -> None:
+                tasks.append(
+                    self._hass.async_create_task(
+                        self._async_add(entities), f"{entry.entry_id}_add_entities"
+                    )
+                )
+
+            await module.async_setup_entry(self._hass, entry, _async_add_entities)
+            await asyncio.gather(*tasks)
+
+    async def _async_add(self, entities) -> None:
+        for entity in entities:
+            entity.async_write_ha_state = self._hass.count_state_write
+            entity.async_get_last_state = _no_last_state
+            self.entities.append(entity)
+            await entity.async_added_to_hass()
+            entity.async_write_ha_state()
+
+
+async def _no_last_state() -> None:
+    return None
+
+
+class FakeHass:
+    """Just enough of ``HomeAssistant`` for the trip sensor."""
+
+    def __init__(self, config_dir: str) -> None:
+        self.loop = asyncio.get_running_loop()
+        self.data: dict = {}
+        self.config = FakeConfig(config_dir)
+        self.config_entries = FakeConfigEntries(self)
+        self.states = FakeStates(self)
+        self.bus = FakeBus(self)
+        self.state_writes = 0
+        # Virtual clock in seconds since EPOCH, advanced by the replay
+        self.now = 0.0
+        self._timers: list = []
+        self._timer_ids = itertools.count()
+        self._tasks: set[asyncio.Task] = set()
+
+    def async_create_background_task(self, target, name: str) -> asyncio.Task:
+        task = self.loop.create_task(target, name=name)
+        self._tasks.add(task)
+        task.add_done_callback(self._tasks.discard)
+        return task
+
+    async_create_task = async_create_background_task
+
+    def async_run_hass_job(self, job, *args) -> None:
+        """Run a dispatcher target."""
+        result = job.target(*args)
+        if asyncio.iscoroutine(result):
+            self.async_create_task(result, "dispatcher")
+
+    def count_state_write(self) -> None:
+        self.state_writes += 1
+
+    def async_add_executor_job(self, target, *args) -> asyncio.Future:
+        return self.loop.run_in_executor(None, target, *args)
+
+    def async_call_later(self, delay: float, action) -> callable:
+        """Run ``action`` once the virtual clock has advanced by ``delay``."""
+        timer = [self.now + delay, next(self._timer_ids), action]
+        heapq.heappush(self._timers, timer)
+
+        def _cancel() -> None:
+            timer[2] = None
+
+        return _cancel
+
+    def advance(self, now: float) -> None:
+        """Move the virtual clock forward, running the timers that are due."""
+        while self._timers and self._timers[0][0] <= now:
+            due, _, action = heapq.heappop(self._timers)
+            self.now = due
+            if action is not None:
+                action(EPOCH + timedelta(seconds=due))
+        self.now = max(self.now, now)
+
+    async def async_block_till_done(self) -> None:
+        """Wait for all background tasks, including ones they start.
+
+        Tasks still waiting when nothing else happens, e.g. for the end
+        readings of a trip, get the clock advanced to the next timer.
+        """
+        while self._tasks:
+            _, pending = await asyncio.wait(tuple(self._tasks), timeout=0.01)
+            if pending and self._timers:
+                self.advance(self._timers[0][0])
+
+
+class FakeConfigEntry:
+    def __init__(self, entry_id: str, data: dict) -> None:
+        self.entry_id = entry_id
+        self.title = entry_id
+        self.data = data
+        self.options: dict = {}
+
+    def add_update_listener(self, listener) -> callable:
+        return lambda: None
+
+    def async_create_background_task(self, hass: FakeHass, target, name: str):
+        return hass.async_create_background_task(target, name)
+
+
+class FakeStore:
+    """In-memory replacement for ``homeassistant.helpers.storage.Store``."""
+
+    def __init__(self, hass, version: int, key: str, *args, **kwargs) -> None:
+        self._data = None
+
+    async def async_load(self):
+        return self._data
+
+    async def async_save(self, data) -> None:
+        self._data = data
+
+    def async_delay_save(self, data_func, delay: float = 0) -> None:
+        self._data = data_func()
+
+    async def async_remove(self) -> None:
+        self._data = None
+
+
+async def _stub_forecast(request: web.Request) -> web.Response:
+    """Answer like Open-Meteo's forecast endpoint."""
+    latency = request.app["latency"]
+    if latency:
+        await asyncio.sleep(latency)
+    latitude = float(request.query["latitude"])
+    return web.json_response(
+        {
+            "elevation": round(200 + latitude % 1 * 100, 1),
+            "current_weather": {"temperature": 12.5},
+        }
+    )
+
+
+@asynccontextmanager
+async def stub_open_meteo(latency: float = 0.0):
+    """Serve a local stand-in for the Open-Meteo API and yield its URL."""
+    app = web.Application()
+    app["latency"] = latency
+    app.router.add_get("/v1/forecast", _stub_forecast)
+    runner = web.AppRunner(app)
+    await runner.setup()
+    site = web.TCPSite(runner, "127.0.0.1", 0)
+    await site.start()
+    port = site._server.sockets[0].getsockname()[1]
+    try:
+        yield f"http://127.0.0.1:{port}/v1/forecast"
+    finally:
+        await runner.cleanup()
+
+
+class BenchEnvironment:
+    """A fake Home Assistant with one tracked vehicle."""
+
+    def __init__(self, hass: FakeHass, url: str) -> None:
+        self.hass = hass
+        # The stand-in API, configured like a local Open-Meteo server
+        self.url = url
+        self.state_writes = 0
+
+    async def async_add_vehicle(
+        self, config: dict, entry_id: str = "bench"
+    ) -> sensor.EVCurrentTripSensor:
+        """Set up the stores and the current trip sensor of a vehicle."""
+        hass = self.hass
+        config = {CONF_WEATHER_API_URL: self.url, **config}
+        history = TripHistoryStore(hass, entry_id)
+        await history.async_load()
+        routes = RouteStore(hass, entry_id)
+        await routes.async_load()
+        samples = SampleStore(hass, entry_id)
+        await samples.async_load()
+        trip_statistics = TripStatistics(hass, entry_id)
+        await trip_statistics.async_load()
+        consumption_model = ConsumptionModel(hass, entry_id)
+        await consumption_model.async_load()
+        trip_places = Places(hass, entry_id)
+        await trip_places.async_load()
+        enrichment_backlog = EnrichmentBacklog(hass, entry_id, self.url)
+        hass.data.setdefault(DOMAIN, {})[entry_id] = {
+            "config": config,
+            "history": history,
+            "routes": routes,
+            "samples": samples,
+            "statistics": trip_statistics,
+            "model": consumption_model,
+            "places": trip_places,
+            "backlog": enrichment_backlog,
+            "metrics": Metrics(),
+            "loaded": asyncio.Event(),
+        }
+        hass.data[DOMAIN][entry_id]["loaded"].set()
+        await enrichment_backlog.async_load()
+        coordinator.async_get_coordinator(hass).async_add_vehicle(entry_id)
+
+        entry = FakeConfigEntry(entry_id, config)
+        entity = sensor.EVCurrentTripSensor(hass, entry, config)
+        entity.async_write_ha_state = self._count_state_write
+        await entity.async_added_to_hass()
+        await hass.async_block_till_done()
+        return entity
+
+    def _count_state_write(self) -> None:
+        self.state_writes += 1
+
+
+@asynccontextmanager
+async def bench_environment(api_latency: float = 0.0):
+    """Patch the integration onto a fake Home Assistant for one replay."""
+    async with AsyncExitStack() as stack:
+        config_dir = stack.enter_context(tempfile.TemporaryDirectory())
+        hass = FakeHass(config_dir)
+        url = await stack.enter_async_context(stub_open_meteo(api_latency))
+        session = await stack.enter_async_context(aiohttp.ClientSession())
+
+        def call_later(_hass, delay, action):
+            return hass.async_call_later(delay, action)
+
+        def track_state_change_event(_hass, entity_ids, action):
+            return hass.bus.async_track_entities(entity_ids, action)
+
+        for target in (
+            patch.object(sensor, "async_call_later", call_later),
+            patch.object(publisher, "async_call_later", call_later),
+            patch.object(backlog, "async_call_later", call_later),
+            patch.object(barrier, "async_call_later", call_later),
+            patch.object(sensor, "Store", FakeStore),
+            patch.object(statistics, "Store", FakeStore),
+            patch.object(model, "Store", FakeStore),
+            patch.object(places, "Store", FakeStore),
+            patch.object(backlog, "Store", FakeStore),
+            patch.object(
+                statistics, "async_track_time_change", lambda *args, **kw: None
+            ),
+            patch.object(
+                coordinator,
+                "async_track_state_change_event",
+                track_state_change_event,
+            ),
+            # Every fake state write is a state change, none is only reported
+            patch.object(
+                coordinator,
+                "async_track_state_report_event",
+                lambda *args: lambda: None,
+            ),
+            patch.object(location, "async_get_clientsession", lambda _: session),
+        ):
+            stack.enter_context(target)
+        yield BenchEnvironment(hass, url)
+        await hass.async_block_till_done()
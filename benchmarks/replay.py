@@ -0,0 +1,324 @@
+"""Replay event streams through the trip state machine and measure it.
+
+Run from the repository root with Home Assistant installed::
+
+    python -m benchmarks.replay                     # all synthetic scenarios
+    python -m benchmarks.replay flapping --repeat 3
+    python -m benchmarks.replay --recording trip.json \\
+        --entity driving=binary_sensor.car_driving --entity odometer=sensor.car_odo
+    python -m benchmarks.replay --save              # record under this version
+    python -m benchmarks.replay --fail-on-regression
+
+Every scenario reports events per second, p50/p99 handler latency, memory
+allocated per event and the time from the event that ends a trip to
+``ev_trip_tracker_trip_completed`` (and on to ``..._trip_enriched``).
+"""
+
+import argparse
+import asyncio
+import gc
+import json
+import logging
+import os
+import subprocess
+import sys
+import time
+import tracemalloc
+from datetime import datetime
+
+from custom_components.ev_trip_tracker.const import (
+    ATTR_START_TIME,
+    CONF_BATTERY_CAPACITY,
+    CONF_BATTERY_SENSOR,
+    CONF_CHARGING_STATE_SENSOR,
+    CONF_DRIVING_STATE_SENSOR,
+    CONF_LOCATION_TRACKER,
+    CONF_MIN_TRIP_DISTANCE,
+    CONF_MIN_TRIP_DURATION,
+    CONF_ODOMETER_SENSOR,
+    CONF_POWER_SENSOR,
+    CONF_TRIP_END_DELAY,
+    EVENT_TRIP_COMPLETED,
+    EVENT_TRIP_ENRICHED,
+)
+
+from .fake_hass import bench_environment
+from .scenarios import ENTITIES, ROLES, SCENARIOS, load_recording
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+RESULTS_PATH = os.path.join(ROOT, "benchmarks", "results.json")
+MANIFEST_PATH = os.path.join(
+    ROOT, "custom_components", "ev_trip_tracker", "manifest.json"
+)
+
+CONFIG = {
+    CONF_DRIVING_STATE_SENSOR: ENTITIES["driving"],
+    CONF_ODOMETER_SENSOR: ENTITIES["odometer"],
+    CONF_BATTERY_SENSOR: ENTITIES["battery"],
+    CONF_LOCATION_TRACKER: ENTITIES["location"],
+    CONF_CHARGING_STATE_SENSOR: ENTITIES["charging"],
+    CONF_POWER_SENSOR: ENTITIES["power"],
+    CONF_BATTERY_CAPACITY: 77,
+    CONF_TRIP_END_DELAY: 300,
+    # The replay runs faster than real time, so wall clock trips are short
+    CONF_MIN_TRIP_DISTANCE: 0,
+    CONF_MIN_TRIP_DURATION: 0,
+}
+
+# Metric -> True if higher is better
+TRACKED_METRICS = {
+    "events_per_sec": True,
+    "handler_p50_us": False,
+    "handler_p99_us": False,
+    "completed_p50_ms": False,
+    "completed_p99_ms": False,
+    "alloc_bytes_per_event": False,
+}
+
+
+def _percentile(values: list[float], fraction: float) -> float | None:
+    if not values:
+        return None
+    values = sorted(values)
+    return values[min(len(values) - 1, round(fraction * (len(values) - 1)))]
+
+
+def _round(value: float | None, ndigits: int = 1) -> float | None:
+    return None if value is None else round(value, ndigits)
+
+
+async def replay(events: list, api_latency: float = 0.0) -> dict:
+    """Replay one event stream and return its timings."""
+    async with bench_environment(api_latency) as env:
+        hass = env.hass
+        await env.async_add_vehicle(CONFIG)
+
+        trigger_ns = 0
+        completed_ns: dict[str, int] = {}
+        to_completed: list[float] = []
+        to_enriched: list[float] = []
+
+        def _completed(event) -> None:
+            now = time.perf_counter_ns()
+            completed_ns[event.data[ATTR_START_TIME]] = now
+            to_completed.append((now - trigger_ns) / 1e6)
+
+        def _enriched(event) -> None:
+            started = completed_ns.pop(event.data[ATTR_START_TIME], None)
+            if started is not None:
+                to_enriched.append((time.perf_counter_ns() - started) / 1e6)
+
+        hass.bus.async_listen(EVENT_TRIP_COMPLETED, _completed)
+        hass.bus.async_listen(EVENT_TRIP_ENRICHED, _enriched)
+
+        latencies = []
+        started = time.perf_counter()
+        for when, role, state, attributes in events:
+            trigger_ns = time.perf_counter_ns()
+            hass.advance(when)
+            trigger_ns = time.perf_counter_ns()
+            hass.states.async_set(ENTITIES[role], state, attributes)
+            latencies.append(hass.bus.last_dispatch_ns / 1000)
+            # Let background work interleave like it would in Home Assistant
+            await asyncio.sleep(0)
+        # Run out the trip end delay of the last trip
+        trigger_ns = time.perf_counter_ns()
+        hass.advance(hass.now + CONFIG[CONF_TRIP_END_DELAY] + 1)
+        elapsed = time.perf_counter() - started
+        await hass.async_block_till_done()
+
+    return {
+        "events": len(events),
+        "events_per_sec": round(len(events) / elapsed),
+        "handler_p50_us": _round(_percentile(latencies, 0.5)),
+        "handler_p99_us": _round(_percentile(latencies, 0.99)),
+        "handler_max_us": _round(max(latencies, default=None)),
+        "trips": len(to_completed),
+        "completed_p50_ms": _round(_percentile(to_completed, 0.5), 3),
+        "completed_p99_ms": _round(_percentile(to_completed, 0.99), 3),
+        "enriched_p50_ms": _round(_percentile(to_enriched, 0.5)),
+        "state_writes": env.state_writes,
+    }
+
+
+async def measure_allocations(events: list) -> dict:
+    """Replay with tracemalloc and return the memory allocated per event."""
+    async with bench_environment() as env:
+        hass = env.hass
+        await env.async_add_vehicle(CONFIG)
+        gc.collect()
+        tracemalloc.start()
+        try:
+            transient = 0
+            baseline = tracemalloc.get_traced_memory()[0]
+            for when, role, state, attributes in events:
+                hass.advance(when)
+                tracemalloc.reset_peak()
+                before = tracemalloc.get_traced_memory()[0]
+                hass.states.async_set(ENTITIES[role], state, attributes)
+                transient += tracemalloc.get_traced_memory()[1] - before
+                await asyncio.sleep(0)
+            gc.collect()
+            retained = tracemalloc.get_traced_memory()[0] - baseline
+        finally:
+            tracemalloc.stop()
+        await hass.async_block_till_done()
+    count = max(len(events), 1)
+    return {
+        "alloc_bytes_per_event": round(transient / count),
+        "retained_bytes_per_event": round(retained / count),
+    }
+
+
+async def run_scenario(
+    events: list, repeat: int, api_latency: float, allocations: bool
+) -> dict:
+    """Run a scenario ``repeat`` times and keep the best run."""
+    runs = [await replay(events, api_latency) for _ in range(repeat)]
+    result = max(runs, key=lambda run: run["events_per_sec"])
+    if allocations:
+        result.update(await measure_allocations(events))
+    return result
+
+
+def _version_label() -> str:
+    """Return the integration version, plus the git commit if available."""
+    with open(MANIFEST_PATH, encoding="utf-8") as file:
+        label = json.load(file)["version"]
+    try:
+        commit = subprocess.run(
+            ["git", "rev-parse", "--short", "HEAD"],
+            cwd=ROOT,
+            capture_output=True,
+            text=True,
+            check=True,
+        ).stdout.strip()
+    except (OSError, subprocess.CalledProcessError):
+        return label
+    return f"{label}+{commit}"
+
+
+def _load_results(path: str) -> dict:
+    try:
+        with open(path, encoding="utf-8") as file:
+            return json.load(file)
+    except FileNotFoundError:
+        return {}
+
+
+def compare(current: dict, previous: dict, threshold: float) -> list[str]:
+    """Return a line per metric that got worse by more than ``threshold``."""
+    regressions = []
+    for scenario, metrics in current.items():
+        old = previous.get(scenario)
+        if not old:
+            continue
+        for metric, higher_is_better in TRACKED_METRICS.items():
+            new_value = metrics.get(metric)
+            old_value = old.get(metric)
+            if not new_value or not old_value:
+                continue
+            change = (new_value - old_value) / old_value
+            if (-change if higher_is_better else change) > threshold:
+                regressions.append(
+                    f"{scenario}.{metric}: {old_value} -> {new_value} ({change:+.0%})"
+                )
+    return regressions
+
+
+def _print_table(results: dict) -> None:
+    columns = [
+        "events",
+        "events_per_sec",
+        "handler_p50_us",
+        "handler_p99_us",
+        "trips",
+        "completed_p50_ms",
+        "completed_p99_ms",
+        "enriched_p50_ms",
+        "alloc_bytes_per_event",
+    ]
+    width = max(len(scenario) for scenario in results) + 2
+    print("scenario".ljust(width) + "".join(f"{column:>24}" for column in columns))
+    for scenario, metrics in results.items():
+        print(
+            scenario.ljust(width)
+            + "".join(f"{metrics.get(column, '-')!s:>24}" for column in columns)
+        )
+
+
+def main(argv: list[str] | None = None) -> int:
+    parser = argparse.ArgumentParser(description=__doc__.split("\n", 1)[0])
+    parser.add_argument(
+        "scenarios", nargs="*", help=f"any of {', '.join(SCENARIOS)} (default: all)"
+    )
+    parser.add_argument("--recording", action="append", default=[])
+    parser.add_argument(
+        "--entity",
+        action="append",
+        default=[],
+        metavar="ROLE=ENTITY_ID",
+        help=f"map a recorded entity to one of {', '.join(ROLES)}",
+    )
+    parser.add_argument("--repeat", type=int, default=1)
+    parser.add_argument("--api-latency", type=float, default=0.0)
+    parser.add_argument("--no-allocations", action="store_true")
+    parser.add_argument("--results", default=RESULTS_PATH)
+    parser.add_argument("--save", nargs="?", const="", metavar="LABEL")
+    parser.add_argument("--compare", metavar="LABEL")
+    parser.add_argument("--threshold", type=float, default=0.2)
+    parser.add_argument("--fail-on-regression", action="store_true")
+    args = parser.parse_args(argv)
+
+    unknown = set(args.scenarios) - SCENARIOS.keys()
+    if unknown:
+        parser.error(f"unknown scenarios: {', '.join(sorted(unknown))}")
+
+    logging.basicConfig(level=logging.WARNING)
+    streams = {}
+    if args.recording:
+        roles = {
+            entity_id: role
+            for role, entity_id in (item.split("=", 1) for item in args.entity)
+        }
+        for path in args.recording:
+            streams[os.path.basename(path)] = load_recording(path, roles)
+    for name in args.scenarios or ([] if args.recording else SCENARIOS):
+        streams[name] = SCENARIOS[name]()
+
+    results = {}
+    for name, events in streams.items():
+        results[name] = asyncio.run(
+            run_scenario(events, args.repeat, args.api_latency, not args.no_allocations)
+        )
+    _print_table(results)
+
+    saved = _load_results(args.results)
+    label = _version_label()
+    previous_label = args.compare or next(
+        (old for old in reversed(saved) if old != label), None
+    )
+    regressions = []
+    if previous_label in saved:
+        regressions = compare(
+            results, saved[previous_label]["scenarios"], args.threshold
+        )
+        print(f"\nCompared with {previous_label}:")
+        print("\n".join(regressions) if regressions else "no regressions")
+
+    if args.save is not None:
+        saved.pop(args.save or label, None)
+        saved[args.save or label] = {
+            "date": datetime.now().isoformat(timespec="seconds"),
+            "python": sys.version.split()[0],
+            "scenarios": results,
+        }
+        with open(args.results, "w", encoding="utf-8") as file:
+            json.dump(saved, file, indent=2)
+            file.write("\n")
+
+    return 1 if regressions and args.fail_on_regression else 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,175 @@
+"""Synthetic and recorded event streams for the replay benchmarks.
+
+An event stream is a list of ``(seconds, role, state, attributes)`` tuples in
+time order. Roles name the configured entities (``driving``, ``odometer``,
+``battery``, ``location``, ``charging``, ``power``) so streams are
+independent of the entity ids of a particular car.
+"""
+
+import json
+import math
+import random
+from datetime import datetime
+
+ROLES = ("driving", "odometer", "battery", "location", "charging", "power")
+
+# Role -> entity id used by the benchmark vehicle
+ENTITIES = {
+    "driving": "binary_sensor.bench_driving",
+    "odometer": "sensor.bench_odometer",
+    "battery": "sensor.bench_battery",
+    "location": "device_tracker.bench",
+    "charging": "binary_sensor.bench_charging",
+    "power": "sensor.bench_power",
+}
+
+
+class _Car:
+    """Kinematics of a synthetic car driving north-east from Zurich."""
+
+    def __init__(self, seed: int = 1) -> None:
+        self.random = random.Random(seed)
+        self.odometer = 12345.0
+        self.battery = 80.0
+        self.lat = 47.3769
+        self.lon = 8.5417
+        self.heading = 0.8
+
+    def drive(self, seconds: float, speed_kmh: float) -> float:
+        """Advance the car and return the power drawn in kW."""
+        distance = speed_kmh * seconds / 3600
+        self.odometer += distance
+        self.heading += self.random.uniform(-0.05, 0.05)
+        self.lat += distance / 111.2 * math.cos(self.heading)
+        self.lon += (
+            distance
+            / (111.2 * math.cos(math.radians(self.lat)))
+            * math.sin(self.heading)
+        )
+        power = 0.12 * speed_kmh + self.random.gauss(0, 4)
+        self.battery -= power * seconds / 3600 / 77 * 100
+        return power
+
+
+def _trip(car: _Car, start: float, minutes: float, events: list) -> float:
+    """Append one trip at 1 Hz telemetry and return its end time."""
+    events.append((start, "driving", "on", {}))
+    t = start
+    end = start + minutes * 60
+    while t < end:
+        t += 1
+        speed = 50 + 40 * math.sin(t / 300)
+        power = car.drive(1, speed)
+        events.append((t, "power", f"{power:.2f}", {"unit_of_measurement": "kW"}))
+        events.append(
+            (
+                t,
+                "location",
+                "not_home",
+                {
+                    "latitude": round(car.lat, 6),
+                    "longitude": round(car.lon, 6),
+                    "altitude": round(400 + 30 * math.sin(t / 600), 1),
+                },
+            )
+        )
+        if int(t) % 10 == 0:
+            events.append((t, "odometer", f"{car.odometer:.1f}", {}))
+        if int(t) % 60 == 0:
+            events.append((t, "battery", f"{round(car.battery)}", {}))
+    events.append((t + 1, "odometer", f"{car.odometer:.1f}", {}))
+    events.append((t + 1, "battery", f"{round(car.battery)}", {}))
+    events.append((t + 2, "driving", "off", {}))
+    return t + 2
+
+
+def commute() -> list:
+    """One 30 minute trip with 1 Hz telemetry."""
+    events: list = []
+    _trip(_Car(), 0, 30, events)
+    return events
+
+
+def long_trip() -> list:
+    """A four hour trip that forces the sample buffer to decimate."""
+    events: list = []
+    _trip(_Car(), 0, 240, events)
+    return events
+
+
+def many_trips(count: int = 200) -> list:
+    """Short trips separated by long stops, to sample time-to-completed."""
+    car = _Car()
+    events: list = []
+    t = 0.0
+    for _ in range(count):
+        t = _trip(car, t, 3, events) + 3600
+    return events
+
+
+def flapping(count: int = 5000) -> list:
+    """A driving sensor flapping every few seconds, with charging interrupts."""
+    car = _Car()
+    rng = random.Random(2)
+    events: list = []
+    t = 0.0
+    for index in range(count):
+        t += rng.uniform(1, 5)
+        events.append((t, "driving", "on" if index % 2 == 0 else "off", {}))
+        car.drive(2, 30)
+        events.append((t, "odometer", f"{car.odometer:.1f}", {}))
+        if index % 250 == 249:
+            events.append((t, "charging", "on", {}))
+            events.append((t + 1, "charging", "off", {}))
+    return events
+
+
+SCENARIOS = {
+    "commute": commute,
+    "long_trip": long_trip,
+    "many_trips": many_trips,
+    "flapping": flapping,
+}
+
+
+def load_recording(path: str, entity_roles: dict[str, str] | None = None) -> list:
+    """Load a recorded event stream.
+
+    Two formats are understood: JSON lines of ``{"t", "role", "state",
+    "attributes"}``, and the JSON returned by Home Assistant's
+    ``/api/history/period`` endpoint. The latter needs ``entity_roles`` to map
+    the recorded entity ids to roles; unmapped entities are skipped.
+    """
+    with open(path, encoding="utf-8") as file:
+        text = file.read()
+
+    events = []
+    if text.lstrip().startswith("[["):
+        roles = entity_roles or {}
+        changes = [change for history in json.loads(text) for change in history]
+        start = None
+        for change in sorted(changes, key=lambda change: change["last_updated"]):
+            role = roles.get(change["entity_id"])
+            if role is None:
+                continue
+            when = datetime.fromisoformat(change["last_updated"]).timestamp()
+            if start is None:
+                start = when
+            events.append(
+                (when - start, role, change["state"], change.get("attributes", {}))
+            )
+        return events
+
+    for line in text.splitlines():
+        if line.strip():
+            event = json.loads(line)
+            events.append(
+                (
+                    float(event["t"]),
+                    event["role"],
+                    str(event["state"]),
+                    event.get("attributes", {}),
+                )
+            )
+    events.sort(key=lambda event: event[0])
+    return events
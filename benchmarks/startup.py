@@ -0,0 +1,203 @@
+"""Measure how long the integration takes to import and to set up.
+
+Run from the repository root with Home Assistant installed::
+
+    python -m benchmarks.startup                    # 1, 5 and 20 vehicles
+    python -m benchmarks.startup --vehicles 50 --trips 20000
+
+Reports the import time of the integration and its sensor platform, taken
+in a fresh interpreter that has already imported the Home Assistant modules
+they build on. Then the given numbers of vehicles, each with a history of
+``--trips`` stored trips, are set up together on the fake Home Assistant and
+every config entry reports the time until its entities are added and until
+its stored data is loaded in the background.
+"""
+
+import argparse
+import asyncio
+import logging
+import random
+import statistics
+import subprocess
+import sys
+import time
+from datetime import timedelta
+
+from custom_components.ev_trip_tracker import async_setup_entry
+from custom_components.ev_trip_tracker.const import (
+    DOMAIN,
+    ATTR_START_TIME,
+    ATTR_END_TIME,
+    ATTR_START_ODOMETER,
+    ATTR_END_ODOMETER,
+    ATTR_START_BATTERY,
+    ATTR_END_BATTERY,
+    ATTR_DISTANCE,
+    ATTR_ENERGY_USED,
+    ATTR_DURATION,
+    ATTR_START_LATITUDE,
+    ATTR_START_LONGITUDE,
+    ATTR_END_LATITUDE,
+    ATTR_END_LONGITUDE,
+    ATTR_START_ELEVATION,
+    ATTR_END_ELEVATION,
+)
+from custom_components.ev_trip_tracker.history import TripHistoryStore
+
+from .fake_hass import EPOCH, PACKAGE, FakeConfigEntry, bench_environment
+from .replay import CONFIG, ROOT
+
+# Imported by Home Assistant before it sets up the integration
+PRELOADED_MODULES = (
+    "aiohttp",
+    "voluptuous",
+    "homeassistant.core",
+    "homeassistant.config_entries",
+    "homeassistant.helpers.config_validation",
+    "homeassistant.helpers.dispatcher",
+    "homeassistant.helpers.entity_platform",
+    "homeassistant.helpers.event",
+    "homeassistant.helpers.restore_state",
+    "homeassistant.helpers.storage",
+    "homeassistant.components.sensor",
+    "homeassistant.components.websocket_api",
+)
+
+IMPORT_SCRIPT = f"""
+import importlib, sys, time
+for name in sys.argv[1:]:
+    importlib.import_module(name)
+start = time.perf_counter()
+importlib.import_module("{PACKAGE}")
+importlib.import_module("{PACKAGE}.sensor")
+print((time.perf_counter() - start) * 1000, "numpy" in sys.modules)
+"""
+
+# A few places trips start and end at, as (lat, lon, elevation)
+PLACES = [(47.37, 8.54, 408.0), (47.5, 8.72, 447.0), (47.05, 8.31, 436.0)]
+
+
+def measure_import(repeat: int) -> dict:
+    """Import the integration in fresh interpreters and keep the fastest."""
+    runs = []
+    for _ in range(repeat):
+        output = subprocess.run(
+            [sys.executable, "-c", IMPORT_SCRIPT, *PRELOADED_MODULES],
+            cwd=ROOT,
+            capture_output=True,
+            text=True,
+            check=True,
+        ).stdout.split()
+        runs.append((float(output[0]), output[1] == "True"))
+    import_ms, numpy = min(runs)
+    return {"import_ms": round(import_ms, 1), "imports_numpy": numpy}
+
+
+def _trips(count: int) -> list[dict]:
+    """Return ``count`` trips between the places, one every eight hours."""
+    rng = random.Random(count)
+    trips = []
+    odometer = 10000.0
+    for index in range(count):
+        start = EPOCH - timedelta(hours=8 * (count - index))
+        (start_lat, start_lon, start_elevation), (end_lat, end_lon, end_elevation) = (
+            rng.sample(PLACES, 2)
+        )
+        distance = round(rng.uniform(5, 60), 1)
+        minutes = distance * 1.2
+        trips.append(
+            {
+                ATTR_START_TIME: start.isoformat(),
+                ATTR_END_TIME: (start + timedelta(minutes=minutes)).isoformat(),
+                ATTR_START_ODOMETER: odometer,
+                ATTR_END_ODOMETER: odometer + distance,
+                ATTR_START_BATTERY: 80.0,
+                ATTR_END_BATTERY: round(80 - distance / 5, 1),
+                ATTR_DISTANCE: distance,
+                ATTR_ENERGY_USED: round(distance * 0.17, 2),
+                ATTR_DURATION: round(minutes, 2),
+                ATTR_START_LATITUDE: start_lat,
+                ATTR_START_LONGITUDE: start_lon,
+                ATTR_START_ELEVATION: start_elevation,
+                ATTR_END_LATITUDE: end_lat,
+                ATTR_END_LONGITUDE: end_lon,
+                ATTR_END_ELEVATION: end_elevation,
+            }
+        )
+        odometer += distance
+    return trips
+
+
+async def measure_setup(vehicles: int, trips: int) -> dict:
+    """Set up the vehicles together and time every config entry."""
+    async with bench_environment() as env:
+        hass = env.hass
+        history = _trips(trips)
+        entries = []
+        for index in range(vehicles):
+            entry = FakeConfigEntry(f"vehicle_{index}", dict(CONFIG))
+            store = TripHistoryStore(hass, entry.entry_id)
+            await store.async_load()
+            for trip in history:
+                store.async_append(trip)
+            await store.async_flush()
+            entries.append(entry)
+
+        ready_ms = []
+        loaded_ms = []
+        start = time.perf_counter()
+
+        async def _async_setup(entry: FakeConfigEntry) -> None:
+            await async_setup_entry(hass, entry)
+            ready_ms.append((time.perf_counter() - start) * 1000)
+            await hass.data[DOMAIN][entry.entry_id]["loaded"].wait()
+            loaded_ms.append((time.perf_counter() - start) * 1000)
+
+        await asyncio.gather(*(_async_setup(entry) for entry in entries))
+        await hass.async_block_till_done()
+
+    return {
+        "vehicles": vehicles,
+        "trips": trips,
+        "entities": len(hass.config_entries.entities),
+        "ready_mean_ms": round(statistics.mean(ready_ms), 1),
+        "ready_max_ms": round(max(ready_ms), 1),
+        "loaded_mean_ms": round(statistics.mean(loaded_ms), 1),
+        "loaded_max_ms": round(max(loaded_ms), 1),
+    }
+
+
+def _print_table(results: list[dict]) -> None:
+    columns = list(results[0])
+    print("".join(f"{column:>16}" for column in columns))
+    for result in results:
+        print("".join(f"{result[column]!s:>16}" for column in columns))
+
+
+def main(argv: list[str] | None = None) -> int:
+    parser = argparse.ArgumentParser(description=__doc__.split("\n", 1)[0])
+    parser.add_argument(
+        "--vehicles", type=int, action="append", help="default: 1, 5 and 20"
+    )
+    parser.add_argument("--trips", type=int, default=5000)
+    parser.add_argument("--repeat", type=int, default=3)
+    args = parser.parse_args(argv)
+
+    logging.basicConfig(level=logging.WARNING)
+    imported = measure_import(args.repeat)
+    print(
+        f"import: {imported['import_ms']} ms"
+        + (" (imports numpy)" if imported["imports_numpy"] else "")
+    )
+    results = []
+    for vehicles in args.vehicles or (1, 5, 20):
+        runs = [
+            asyncio.run(measure_setup(vehicles, args.trips)) for _ in range(args.repeat)
+        ]
+        results.append(min(runs, key=lambda run: run["ready_max_ms"]))
+    _print_table(results)
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
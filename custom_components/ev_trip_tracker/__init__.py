@@ -1,46 +1,81 @@
+import asyncio
 import logging
 from homeassistant.config_entries import ConfigEntry
 from homeassistant.core import HomeAssistant
+import homeassistant.helpers.config_validation as cv
+from homeassistant.helpers.storage import Store
 
 from .const import (
     DOMAIN,
-    CONF_ODOMETER_SENSOR,
-    CONF_BATTERY_SENSOR,
-    CONF_LOCATION_TRACKER,
-    CONF_DRIVING_STATE_SENSOR,
-    CONF_BATTERY_CAPACITY,
-    CONF_TRIP_END_DELAY,
-    DEFAULT_TRIP_END_DELAY,
-    ATTR_START_TIME,
-    ATTR_END_TIME,
-    ATTR_START_ODOMETER,
-    ATTR_END_ODOMETER,
-    ATTR_START_BATTERY,
-    ATTR_END_BATTERY,
-    ATTR_START_LOCATION,
-    ATTR_END_LOCATION,
-    ATTR_DISTANCE,
-    ATTR_ENERGY_USED,
-    ATTR_AVG_SPEED,
-    ATTR_DURATION,
-    ATTR_START_ELEVATION,
-    ATTR_END_ELEVATION,
-    ATTR_ELEVATION_DIFF,
+    DATA_COORDINATOR,
+    DATA_LOCATION_CLIENT,
+    CHECKPOINT_STORAGE_KEY,
+    CONF_DIAGNOSTICS,
+    CONF_WEATHER_API_URL,
+    DEFAULT_WEATHER_API_URL,
 )
 
+# The other modules are imported where they are used rather than here, so
+# importing the integration does not pull in aiohttp and the stores while
+# Home Assistant boots
+
 _LOGGER = logging.getLogger(__name__)
 
 PLATFORMS = ["sensor"]
 
+CONFIG_SCHEMA = cv.config_entry_only_config_schema(DOMAIN)
+
+
+async def async_setup(hass: HomeAssistant, config: dict) -> bool:
+    """Set up the EV Trip Tracker services and websocket commands."""
+    from .services import async_setup_services
+    from .websocket_api import async_setup_websocket
+
+    async_setup_services(hass)
+    async_setup_websocket(hass)
+    return True
+
 
 async def async_setup_entry(hass: HomeAssistant, entry: ConfigEntry) -> bool:
-    """Set up EV Trip Tracker from a config entry."""
+    """Set up EV Trip Tracker from a config entry.
+
+    Only the stores are created here. They are loaded in the background, so
+    the entities are registered at once and boot is not held up by vehicles
+    with long histories.
+    """
+    from .backlog import EnrichmentBacklog
+    from .codec import SampleStore
+    from .coordinator import async_get_coordinator
+    from .history import TripHistoryStore
+    from .loader import async_load_entry
+    from .metrics import Metrics
+    from .places import Places
+    from .statistics import TripStatistics
+
     hass.data.setdefault(DOMAIN, {})
     hass.data[DOMAIN][entry.entry_id] = {
         "config": entry.data,
-        "trip_active": False,
-        "current_trip": {},
+        "history": TripHistoryStore(hass, entry.entry_id),
+        "samples": SampleStore(hass, entry.entry_id),
+        "statistics": TripStatistics(hass, entry.entry_id),
+        "places": Places(hass, entry.entry_id),
+        "backlog": EnrichmentBacklog(
+            hass,
+            entry.entry_id,
+            {**entry.data, **entry.options}.get(
+                CONF_WEATHER_API_URL, DEFAULT_WEATHER_API_URL
+            ),
+        ),
+        "metrics": Metrics(
+            {**entry.data, **entry.options}.get(CONF_DIAGNOSTICS, False)
+        ),
+        # Set once the stores, the model and the routes are loaded
+        "loaded": asyncio.Event(),
     }
+    async_get_coordinator(hass).async_add_vehicle(entry.entry_id)
+    hass.data[DOMAIN][entry.entry_id]["loader"] = entry.async_create_background_task(
+        hass, async_load_entry(hass, entry), f"{DOMAIN}_load_{entry.entry_id}"
+    )
 
     await hass.config_entries.async_forward_entry_setups(entry, PLATFORMS)
 
@@ -50,7 +85,45 @@ async def async_setup_entry(hass: HomeAssistant, entry: ConfigEntry) -> bool:
 
 async def async_unload_entry(hass: HomeAssistant, entry: ConfigEntry) -> bool:
     """Unload a config entry."""
+    from .coordinator import async_get_coordinator
+
     unload_ok = await hass.config_entries.async_unload_platforms(entry, PLATFORMS)
     if unload_ok:
-        hass.data[DOMAIN].pop(entry.entry_id)
+        data = hass.data[DOMAIN].pop(entry.entry_id)
+        coordinator = async_get_coordinator(hass)
+        coordinator.async_remove_vehicle(entry.entry_id)
+        if not coordinator.vehicles:
+            coordinator.async_shutdown()
+            hass.data.pop(DATA_COORDINATOR)
+            if client := hass.data.get(DATA_LOCATION_CLIENT):
+                client.async_close()
+        data["statistics"].async_unload()
+        data["backlog"].async_unload()
+        await data["history"].async_flush()
+        await data["samples"].async_flush()
+        # Missing if the entry is unloaded before it finished loading
+        if routes := data.get("routes"):
+            await routes.async_flush()
     return unload_ok
+
+
+async def async_remove_entry(hass: HomeAssistant, entry: ConfigEntry) -> None:
+    """Delete the stored data of a removed config entry."""
+    from .backlog import EnrichmentBacklog
+    from .codec import SampleStore
+    from .history import TripHistoryStore
+    from .model import ConsumptionModel
+    from .places import Places
+    from .route import RouteStore
+    from .statistics import TripStatistics
+
+    await TripHistoryStore(hass, entry.entry_id).async_remove()
+    await RouteStore(hass, entry.entry_id).async_remove()
+    await SampleStore(hass, entry.entry_id).async_remove()
+    await TripStatistics(hass, entry.entry_id).async_remove()
+    await ConsumptionModel(hass, entry.entry_id).async_remove()
+    await Places(hass, entry.entry_id).async_remove()
+    await EnrichmentBacklog(
+        hass, entry.entry_id, DEFAULT_WEATHER_API_URL
+    ).async_remove()
+    await Store(hass, 1, CHECKPOINT_STORAGE_KEY.format(entry.entry_id)).async_remove()
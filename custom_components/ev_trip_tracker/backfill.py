@@ -0,0 +1,320 @@
+"""Rebuild trips from the recorder history of the configured entities."""
+
+import heapq
+import logging
+import math
+from datetime import datetime, timedelta
+
+from homeassistant.components import persistent_notification
+from homeassistant.components.recorder import get_instance, history
+from homeassistant.config_entries import ConfigEntry
+from homeassistant.core import HomeAssistant, State, callback
+
+from .const import (
+    DOMAIN,
+    DRIVING_STATES,
+    CHARGING_STATES,
+    BACKFILL_CHUNK,
+    CONF_DRIVING_STATE_SENSOR,
+    CONF_CHARGING_STATE_SENSOR,
+    CONF_TRIP_END_DELAY,
+    DEFAULT_TRIP_END_DELAY,
+    CONF_MIN_TRIP_DISTANCE,
+    DEFAULT_MIN_TRIP_DISTANCE,
+    CONF_MIN_TRIP_DURATION,
+    DEFAULT_MIN_TRIP_DURATION,
+    CONF_DEM_PATH,
+    ATTR_START_TIME,
+    ATTR_END_TIME,
+    ATTR_START_ODOMETER,
+    ATTR_END_ODOMETER,
+    ATTR_START_BATTERY,
+    ATTR_END_BATTERY,
+    ATTR_START_ELEVATION,
+    ATTR_END_ELEVATION,
+    ATTR_START_TEMPERATURE,
+    ATTR_END_TEMPERATURE,
+    ATTR_DISTANCE,
+    ATTR_SAMPLE_COUNT,
+)
+from .codec import encode_samples
+from .energy import calculate_trip_metrics
+from .location import async_get_location_client
+from .route import compute_route
+from .sampler import (
+    COLUMNS,
+    COLUMN_ALTITUDE,
+    COLUMN_BATTERY,
+    COLUMN_LATITUDE,
+    COLUMN_LONGITUDE,
+    COLUMN_ODOMETER,
+    COLUMN_TEMPERATURE,
+    SampleBuffer,
+    read_state,
+    sample_entities,
+)
+
+_LOGGER = logging.getLogger(__name__)
+
+
+class TripSegmenter:
+    """Split a time-ordered stream of recorded states into trips.
+
+    The rules are those of the live trip sensor: a trip starts when the
+    driving sensor turns on, ends once it has been off for the trip end delay,
+    or at once when charging starts, and is dropped when it is shorter than
+    the minimum distance or duration. Only the current trip and its fixed-size
+    sample buffer are held, so memory does not grow with the history.
+    """
+
+    def __init__(self, config: dict, elevation_lookup=None) -> None:
+        self._config = config
+        self._elevation_lookup = elevation_lookup
+        self._driving = config[CONF_DRIVING_STATE_SENSOR]
+        self._charging = config.get(CONF_CHARGING_STATE_SENSOR)
+        self._entities = sample_entities(config)
+        self._delay = config.get(CONF_TRIP_END_DELAY, DEFAULT_TRIP_END_DELAY)
+        self._current = dict.fromkeys(COLUMNS[1:], math.nan)
+        self._trip: dict | None = None
+        self._samples: SampleBuffer | None = None
+        self._end_due: float | None = None
+        self._actual_end: float | None = None
+        # Set while a trip that started before the history did is running
+        self._partial = False
+        self.discarded = 0
+
+    @property
+    def entity_ids(self) -> list[str]:
+        """Return the entities whose history is needed."""
+        return [
+            entity_id
+            for entity_id in (self._driving, self._charging, *self._entities)
+            if entity_id
+        ]
+
+    def prime(self, state: State) -> None:
+        """Take in a state as it was at the start of the history."""
+        if state.entity_id in self._entities:
+            read_state(self._current, self._entities[state.entity_id], state)
+        if state.entity_id == self._driving:
+            self._partial = state.state in DRIVING_STATES
+
+    def feed(self, state: State) -> list:
+        """Process one recorded state and return the trips it completed."""
+        timestamp = state.last_updated.timestamp()
+        trips = self.finish(timestamp)
+
+        entity_id = state.entity_id
+        if entity_id in self._entities:
+            read_state(self._current, self._entities[entity_id], state)
+            if self._samples is not None:
+                self._samples.add(timestamp, self._current)
+
+        if entity_id == self._driving:
+            is_driving = state.state in DRIVING_STATES
+            if self._partial:
+                self._partial = is_driving
+            elif is_driving and self._trip is None:
+                self._start_trip(timestamp)
+            elif is_driving:
+                # Resumed driving, cancel the pending trip end
+                self._end_due = None
+            elif self._trip is not None:
+                self._actual_end = timestamp
+                self._end_due = timestamp + self._delay
+        elif (
+            entity_id == self._charging
+            and self._trip is not None
+            and state.state in CHARGING_STATES
+        ):
+            self._actual_end = timestamp
+            trips.extend(self._end_trip())
+        return trips
+
+    def finish(self, until: float) -> list:
+        """End the current trip if its end delay ran out by ``until``."""
+        if self._end_due is not None and self._end_due <= until:
+            return self._end_trip()
+        return []
+
+    def _value(self, column: str) -> float | None:
+        value = self._current[column]
+        return None if math.isnan(value) else value
+
+    def _position(self) -> tuple[float | None, float | None]:
+        return self._value(COLUMN_LATITUDE), self._value(COLUMN_LONGITUDE)
+
+    def _elevation(self) -> float | None:
+        lat = self._value(COLUMN_LATITUDE)
+        lon = self._value(COLUMN_LONGITUDE)
+        if self._elevation_lookup is None or lat is None or lon is None:
+            return None
+        return self._elevation_lookup(lat, lon)
+
+    def _start_trip(self, timestamp: float) -> None:
+        self._trip = {
+            ATTR_START_TIME: datetime.fromtimestamp(timestamp).isoformat(),
+            ATTR_START_ODOMETER: self._value(COLUMN_ODOMETER),
+            ATTR_START_BATTERY: self._value(COLUMN_BATTERY),
+            ATTR_START_ELEVATION: self._elevation(),
+            ATTR_START_TEMPERATURE: self._value(COLUMN_TEMPERATURE),
+            "_start_position": self._position(),
+        }
+        self._samples = SampleBuffer()
+        self._samples.add(timestamp, self._current)
+
+    def _end_trip(self) -> list:
+        trip, samples = self._trip, self._samples
+        self._trip = self._samples = self._end_due = None
+
+        trip[ATTR_END_TIME] = datetime.fromtimestamp(self._actual_end).isoformat()
+        trip[ATTR_END_ODOMETER] = self._value(COLUMN_ODOMETER)
+        trip[ATTR_END_BATTERY] = self._value(COLUMN_BATTERY)
+        trip[ATTR_END_ELEVATION] = self._elevation()
+        trip[ATTR_END_TEMPERATURE] = self._value(COLUMN_TEMPERATURE)
+        trip["_end_position"] = self._position()
+        trip[ATTR_SAMPLE_COUNT] = len(samples)
+        calculate_trip_metrics(trip, self._config, samples)
+
+        duration = (
+            datetime.fromisoformat(trip[ATTR_END_TIME])
+            - datetime.fromisoformat(trip[ATTR_START_TIME])
+        ).total_seconds()
+        if trip.get(ATTR_DISTANCE, 0) < self._config.get(
+            CONF_MIN_TRIP_DISTANCE, DEFAULT_MIN_TRIP_DISTANCE
+        ) or duration < self._config.get(
+            CONF_MIN_TRIP_DURATION, DEFAULT_MIN_TRIP_DURATION
+        ):
+            self.discarded += 1
+            return []
+
+        attributes, polyline = compute_route(
+            samples.column(COLUMN_LATITUDE),
+            samples.column(COLUMN_LONGITUDE),
+            samples.column(COLUMN_ALTITUDE),
+            self._elevation_lookup,
+        )
+        trip.update(attributes)
+        calculate_trip_metrics(trip, self._config, samples)
+        encoded = encode_samples({name: samples.column(name) for name in COLUMNS})
+        return [(trip, polyline, encoded)]
+
+
+def _segment_chunk(
+    hass: HomeAssistant,
+    segmenter: TripSegmenter,
+    start: datetime,
+    end: datetime,
+    first: bool,
+) -> list:
+    """Read one chunk of history and feed it through the segmenter."""
+    states = history.get_significant_states(
+        hass,
+        start,
+        end,
+        segmenter.entity_ids,
+        include_start_time_state=first,
+        significant_changes_only=False,
+    )
+    trips = []
+    for state in heapq.merge(*states.values(), key=lambda state: state.last_updated):
+        if first and state.last_updated <= start:
+            segmenter.prime(state)
+        else:
+            trips.extend(segmenter.feed(state))
+    return trips
+
+
+async def async_backfill(
+    hass: HomeAssistant, entry: ConfigEntry, start: datetime, end: datetime
+) -> int:
+    """Add the trips recorded between ``start`` and ``end`` to the history.
+
+    The recorder is read in chunks of ``BACKFILL_CHUNK`` seconds on its own
+    executor, and progress is shown in a persistent notification. Trips that
+    overlap a stored trip are skipped. The consumption model weighs the trips
+    it learned last most, so it only learns from the backfilled trips while
+    it has not learned from a live trip. Returns the number of trips added.
+    """
+    config = {**entry.data, **entry.options}
+    data = hass.data[DOMAIN][entry.entry_id]
+    elevation_lookup = None
+    if dem_path := config.get(CONF_DEM_PATH):
+        elevation_lookup = (
+            async_get_location_client(hass)
+            .get_dem(hass.config.path(dem_path))
+            .elevation
+        )
+    segmenter = TripSegmenter(config, elevation_lookup)
+    notification_id = f"{DOMAIN}_backfill_{entry.entry_id}"
+    recorder = get_instance(hass)
+    added = 0
+    model = data["model"]
+    learned = 0 if not model.rls.count else None
+
+    _LOGGER.info("Backfilling trips of %s from %s to %s", entry.title, start, end)
+    chunk_start = start
+    while chunk_start < end:
+        chunk_end = min(chunk_start + timedelta(seconds=BACKFILL_CHUNK), end)
+        trips = await recorder.async_add_executor_job(
+            _segment_chunk,
+            hass,
+            segmenter,
+            chunk_start,
+            chunk_end,
+            chunk_start == start,
+        )
+        if chunk_end == end:
+            trips.extend(segmenter.finish(end.timestamp()))
+        # Stop learning once a live trip was learned in between
+        train = model.rls.count == learned
+        added += _async_store_trips(data, trips, train)
+        learned = model.rls.count if train else None
+
+        progress = (chunk_end - start) / (end - start)
+        persistent_notification.async_create(
+            hass,
+            f"Read history up to {chunk_end:%Y-%m-%d} ({progress:.0%}), "
+            f"{added} trips added so far.",
+            title=f"EV Trip Tracker backfill: {entry.title}",
+            notification_id=notification_id,
+        )
+        chunk_start = chunk_end
+
+    persistent_notification.async_create(
+        hass,
+        f"Added {added} trips between {start:%Y-%m-%d} and {end:%Y-%m-%d}, "
+        f"{segmenter.discarded} were too short.",
+        title=f"EV Trip Tracker backfill: {entry.title}",
+        notification_id=notification_id,
+    )
+    _LOGGER.info("Backfilled %s trips of %s", added, entry.title)
+    return added
+
+
+@callback
+def _async_store_trips(data: dict, trips: list, train: bool) -> int:
+    """Append new trips, their routes and samples, skipping stored ones.
+
+    With ``train`` the consumption model learns from the added trips.
+    """
+    history_store = data["history"]
+    added = []
+    for trip, polyline, encoded in trips:
+        start, end = trip.pop("_start_position"), trip.pop("_end_position")
+        if history_store.has_trip_between(
+            datetime.fromisoformat(trip[ATTR_START_TIME]),
+            datetime.fromisoformat(trip[ATTR_END_TIME]),
+        ):
+            continue
+        data["places"].async_add_trip(trip, start, end)
+        history_store.async_append(trip)
+        if len(polyline):
+            data["routes"].async_append(trip[ATTR_START_TIME], polyline)
+        data["samples"].async_append(trip[ATTR_START_TIME], encoded)
+        added.append(trip)
+    if added:
+        data["statistics"].async_add_trips(added)
+        if train:
+            data["model"].async_add_trips(added)
+    return len(added)
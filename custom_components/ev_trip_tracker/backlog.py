@@ -0,0 +1,235 @@
+"""Trips whose weather lookups failed, filled in once the API is back."""
+
+import asyncio
+import logging
+import time
+from datetime import datetime
+
+from homeassistant.core import HomeAssistant, callback
+from homeassistant.helpers.dispatcher import async_dispatcher_send
+from homeassistant.helpers.event import async_call_later
+from homeassistant.helpers.storage import Store
+
+from .const import (
+    DOMAIN,
+    BACKLOG_STORAGE_KEY,
+    BACKLOG_SAVE_DELAY,
+    BACKLOG_BATCH_SIZE,
+    BACKLOG_BATCH_DAYS,
+    BACKLOG_MAX_TRIPS,
+    BACKLOG_MAX_AGE,
+    SIGNAL_LAST_TRIP_UPDATED,
+    ATTR_START_TIME,
+    ATTR_END_TIME,
+    ATTR_START_LATITUDE,
+    ATTR_START_LONGITUDE,
+    ATTR_END_LATITUDE,
+    ATTR_END_LONGITUDE,
+    ATTR_START_ELEVATION,
+    ATTR_END_ELEVATION,
+    ATTR_ELEVATION_DIFF,
+)
+from .location import async_get_location_client, jittered_backoff
+from .metrics import COUNTER_BACKLOG_ENRICHED
+
+_LOGGER = logging.getLogger(__name__)
+
+STORAGE_VERSION = 1
+
+
+def _trip_points(trip: dict) -> list[tuple[float, float, float]] | None:
+    """Return the (timestamp, lat, lon) of a stored trip's start and end."""
+    if None in (
+        trip.get(ATTR_START_LATITUDE),
+        trip.get(ATTR_START_LONGITUDE),
+        trip.get(ATTR_END_LATITUDE),
+        trip.get(ATTR_END_LONGITUDE),
+    ):
+        return None
+    return [
+        (
+            datetime.fromisoformat(trip[ATTR_START_TIME]).timestamp(),
+            trip[ATTR_START_LATITUDE],
+            trip[ATTR_START_LONGITUDE],
+        ),
+        (
+            datetime.fromisoformat(trip[ATTR_END_TIME]).timestamp(),
+            trip[ATTR_END_LATITUDE],
+            trip[ATTR_END_LONGITUDE],
+        ),
+    ]
+
+
+class EnrichmentBacklog:
+    """Stored trips that are still missing their weather, per entry.
+
+    Trips whose lookups failed while the API was down are remembered by
+    their history record and persisted across restarts. They are filled in
+    with batched hourly requests, a few dozen trips per request, as soon as
+    the API's circuit breaker closes again or on a jittered retry timer.
+    """
+
+    def __init__(self, hass: HomeAssistant, entry_id: str, url: str) -> None:
+        self.hass = hass
+        self.entry_id = entry_id
+        self.url = url
+        self._store = Store(hass, STORAGE_VERSION, BACKLOG_STORAGE_KEY.format(entry_id))
+        self.records: list[int] = []
+        self._attempts = 0
+        self._task: asyncio.Task | None = None
+        self._unsub_retry = None
+        self._unsub_recovered = None
+
+    async def async_load(self) -> None:
+        data = await self._store.async_load() or {}
+        self.records = data.get("records", [])
+        self.async_set_url(self.url)
+        if self.records:
+            self._async_schedule_retry()
+
+    @callback
+    def async_set_url(self, url: str) -> None:
+        """Follow the circuit breaker of a (new) API URL."""
+        self.url = url
+        if self._unsub_recovered:
+            self._unsub_recovered()
+        self._unsub_recovered = (
+            async_get_location_client(self.hass)
+            .breaker(url)
+            .async_add_listener(self._async_start_flush)
+        )
+
+    @callback
+    def async_unload(self) -> None:
+        """Stop retrying; the backlog is picked up again after a reload."""
+        if self._unsub_recovered:
+            self._unsub_recovered()
+            self._unsub_recovered = None
+        if self._unsub_retry:
+            self._unsub_retry()
+            self._unsub_retry = None
+        if self._task:
+            self._task.cancel()
+
+    async def async_remove(self) -> None:
+        """Delete the persisted backlog."""
+        await self._store.async_remove()
+
+    @callback
+    def async_add(self, record: int) -> None:
+        """Remember a stored trip whose weather could not be fetched."""
+        if record in self.records:
+            return
+        self.records.append(record)
+        del self.records[:-BACKLOG_MAX_TRIPS]
+        self._store.async_delay_save(self._data_to_save, BACKLOG_SAVE_DELAY)
+        self._async_schedule_retry()
+
+    @callback
+    def _async_schedule_retry(self) -> None:
+        if self._unsub_retry or self._task:
+            return
+        self._attempts += 1
+        breaker = async_get_location_client(self.hass).breaker(self.url)
+        delay = max(breaker.retry_in(), jittered_backoff(self._attempts))
+        _LOGGER.debug(
+            "Retrying %s trips without weather in %.0f seconds",
+            len(self.records),
+            delay,
+        )
+        self._unsub_retry = async_call_later(self.hass, delay, self._async_retry)
+
+    @callback
+    def _async_retry(self, _now) -> None:
+        self._unsub_retry = None
+        self._async_start_flush()
+
+    @callback
+    def _async_start_flush(self) -> None:
+        if self._task or not self.records:
+            return
+        if self._unsub_retry:
+            self._unsub_retry()
+            self._unsub_retry = None
+        self._task = self.hass.async_create_background_task(
+            self._async_flush(), f"{DOMAIN}_backlog_{self.entry_id}"
+        )
+
+    async def _async_flush(self) -> None:
+        try:
+            while self.records and await self._async_flush_batch():
+                self._attempts = 0
+        finally:
+            self._task = None
+            self._store.async_delay_save(self._data_to_save, BACKLOG_SAVE_DELAY)
+        if self.records:
+            self._async_schedule_retry()
+
+    async def _async_flush_batch(self) -> bool:
+        """Fill in the oldest trips with one request, returns False on failure."""
+        entry_data = self.hass.data[DOMAIN][self.entry_id]
+        history = entry_data["history"]
+        batch = self.records[:BACKLOG_BATCH_SIZE]
+        trips = await history.async_read(batch)
+
+        # Only the trips within a few days of the first, since the response
+        # holds the hourly weather of every day for every coordinate
+        oldest = time.time() - BACKLOG_MAX_AGE * 86400
+        done = set()
+        pending = []
+        points = []
+        for record, trip in zip(batch, trips):
+            trip_points = _trip_points(trip)
+            if trip_points is None or trip_points[0][0] < oldest:
+                # Out of the API's reach, give up on it
+                done.add(record)
+                continue
+            if (
+                points
+                and trip_points[-1][0] - points[0][0] > BACKLOG_BATCH_DAYS * 86400
+            ):
+                break
+            pending.append((record, trip))
+            points.extend(trip_points)
+
+        if points:
+            # Imported here, numpy is only needed once there is a backlog
+            from .weather import HOURLY_VARIABLES, summarize
+
+            client = async_get_location_client(self.hass)
+            locations = await client.async_get_hourly(
+                points, HOURLY_VARIABLES, self.url
+            )
+            if locations is None:
+                return False
+            last_trip = entry_data.get("last_trip") or {}
+            for index, (record, trip) in enumerate(pending):
+                trip_locations = locations[2 * index : 2 * index + 2]
+                weather = summarize(points[2 * index : 2 * index + 2], trip_locations)
+                weather[ATTR_START_ELEVATION] = trip_locations[0].get("elevation")
+                weather[ATTR_END_ELEVATION] = trip_locations[1].get("elevation")
+                # Only what is missing, sampled values stay
+                for name, value in weather.items():
+                    if trip.get(name) is None:
+                        trip[name] = value
+                if None not in (trip[ATTR_START_ELEVATION], trip[ATTR_END_ELEVATION]):
+                    trip[ATTR_ELEVATION_DIFF] = round(
+                        trip[ATTR_END_ELEVATION] - trip[ATTR_START_ELEVATION], 1
+                    )
+                history.async_update(record, trip)
+                done.add(record)
+                entry_data["metrics"].increment(COUNTER_BACKLOG_ENRICHED)
+                if last_trip.get(ATTR_START_TIME) == trip[ATTR_START_TIME]:
+                    for name in (*weather, ATTR_ELEVATION_DIFF):
+                        last_trip[name] = trip.get(name)
+                    async_dispatcher_send(
+                        self.hass, SIGNAL_LAST_TRIP_UPDATED.format(self.entry_id)
+                    )
+            _LOGGER.info("Filled in the weather of %s earlier trips", len(pending))
+
+        self.records = [record for record in self.records if record not in done]
+        return True
+
+    @callback
+    def _data_to_save(self) -> dict:
+        return {"records": self.records}
@@ -0,0 +1,74 @@
+"""Wait for sensors to report a reading taken after a trip transition."""
+
+from datetime import datetime
+
+from homeassistant.const import STATE_UNAVAILABLE, STATE_UNKNOWN
+from homeassistant.core import HomeAssistant, State, callback
+from homeassistant.helpers.event import async_call_later
+
+from .coordinator import async_get_coordinator
+
+
+def is_fresh(state: State | None, since: datetime) -> bool:
+    """Return whether a state holds a valid reading reported since ``since``.
+
+    A car that reports the same odometer or battery level again only moves
+    the state's ``last_reported``, which older Home Assistant versions lack.
+    """
+    return (
+        state is not None
+        and state.state not in (STATE_UNKNOWN, STATE_UNAVAILABLE)
+        and getattr(state, "last_reported", state.last_updated) >= since
+    )
+
+
+async def async_wait_fresh(
+    hass: HomeAssistant, entity_ids: list[str], since: datetime, timeout: float
+) -> dict[str, State]:
+    """Wait until every entity has reported since ``since``.
+
+    Cloud polled vehicles often report the odometer and battery a poll after
+    the driving state changed. This listens for their next state changes and
+    unchanged reports through the coordinator instead of polling, and gives
+    up after ``timeout`` seconds. Returns the first fresh state of every entity that
+    reported in time; the others are missing.
+    """
+    fresh = {
+        entity_id: state
+        for entity_id in entity_ids
+        if is_fresh(state := hass.states.get(entity_id), since)
+    }
+    waiting = [entity_id for entity_id in entity_ids if entity_id not in fresh]
+    if not waiting:
+        return fresh
+
+    done = hass.loop.create_future()
+
+    @callback
+    def _handle_state_change(event) -> None:
+        entity_id = event.data["entity_id"]
+        state = event.data.get("new_state")
+        if entity_id in fresh or not is_fresh(state, since):
+            return
+        # Keep the first fresh reading, later ones may already be from the
+        # next trip
+        fresh[entity_id] = state
+        if len(fresh) == len(entity_ids) and not done.done():
+            done.set_result(None)
+
+    @callback
+    def _handle_timeout(_now) -> None:
+        if not done.done():
+            done.set_result(None)
+
+    unsub = async_get_coordinator(hass).async_track(
+        waiting, _handle_state_change, reports=True
+    )
+    # Scheduled like the trip end timer, so both follow the same clock
+    unsub_timeout = async_call_later(hass, timeout, _handle_timeout)
+    try:
+        await done
+    finally:
+        unsub()
+        unsub_timeout()
+    return fresh
@@ -0,0 +1,80 @@
+"""Charging session figures from sampled power, energy and battery level."""
+
+from datetime import datetime
+
+import numpy as np
+
+from .const import (
+    CONF_BATTERY_CAPACITY,
+    CHARGE_TYPE_AC,
+    CHARGE_TYPE_DC,
+    CHARGE_TYPES,
+    DC_POWER_THRESHOLD,
+    ATTR_START_TIME,
+    ATTR_END_TIME,
+    ATTR_START_BATTERY,
+    ATTR_END_BATTERY,
+    ATTR_DURATION,
+    ATTR_ENERGY_ADDED,
+    ATTR_AVG_POWER,
+    ATTR_PEAK_POWER,
+    ATTR_CHARGE_TYPE,
+)
+from .energy import energy_from_content, integrate_power
+from .sampler import COLUMN_BATTERY_ENERGY, COLUMN_POWER, COLUMN_TIME, SampleBuffer
+
+
+def calculate_session_metrics(
+    session: dict, config: dict, samples: SampleBuffer | None, state: str | None
+) -> None:
+    """Fill in duration, energy added, power and charge type of a session.
+
+    Energy added comes from the rises of a battery energy sensor, else from
+    the integral of the sampled power, else from the battery level and
+    capacity. Power is taken by magnitude, since cars disagree on the sign
+    of charging power. ``state`` is the charging sensor state at the start,
+    which names the charge type on cars that report "ac" or "dc"; otherwise
+    a peak power above a wallbox's 22 kW counts as DC.
+    """
+    hours = (
+        datetime.fromisoformat(session[ATTR_END_TIME])
+        - datetime.fromisoformat(session[ATTR_START_TIME])
+    ).total_seconds() / 3600
+    session[ATTR_DURATION] = round(hours * 60, 2)
+
+    energy = None
+    peak = None
+    powered = None
+    if samples:
+        content = energy_from_content(samples.column(COLUMN_BATTERY_ENERGY))
+        if content is not None:
+            energy = content[1]
+        power = np.abs(np.asarray(samples.column(COLUMN_POWER)))
+        if not np.isnan(power).all():
+            peak = float(np.nanmax(power))
+            powered = integrate_power(samples.column(COLUMN_TIME), power)
+        if energy is None and powered is not None:
+            energy = powered[0]
+    if energy is None:
+        start = session.get(ATTR_START_BATTERY)
+        end = session.get(ATTR_END_BATTERY)
+        if start is not None and end is not None:
+            energy = max(end - start, 0) / 100 * config[CONF_BATTERY_CAPACITY]
+
+    session[ATTR_ENERGY_ADDED] = None if energy is None else round(energy, 2)
+    # Average over the sampled power when there is one, so pauses count
+    average = powered[0] if powered is not None else energy
+    session[ATTR_AVG_POWER] = (
+        round(average / hours, 2) if average is not None and hours > 0 else None
+    )
+    session[ATTR_PEAK_POWER] = None if peak is None else round(peak, 2)
+
+    state = str(state).lower() if state is not None else None
+    if state in CHARGE_TYPES:
+        session[ATTR_CHARGE_TYPE] = state
+    elif peak is not None:
+        session[ATTR_CHARGE_TYPE] = (
+            CHARGE_TYPE_DC if peak > DC_POWER_THRESHOLD else CHARGE_TYPE_AC
+        )
+    else:
+        session[ATTR_CHARGE_TYPE] = None
@@ -0,0 +1,290 @@
+"""Compact columnar encoding of trip sample series."""
+
+import math
+import struct
+from array import array
+
+from homeassistant.core import HomeAssistant, callback
+from homeassistant.helpers.storage import STORAGE_DIR
+
+from .const import DOMAIN, SAMPLE_MAX_DECIMALS
+from .filestore import OffsetStore
+from .sampler import COLUMN_TIME
+
+MAGIC = b"EVS"
+VERSION = 1
+
+# Column encodings, in the low bits of the column kind byte
+ENCODING_MISSING = 0  # every value is NaN, no payload
+ENCODING_TIME = 1  # milliseconds as delta-of-delta varints
+ENCODING_SCALED = 2  # decimal digits, then integer delta varints
+ENCODING_XOR = 3  # float64 bits XOR the previous value, zero bytes trimmed
+# A presence bitmap of the rows precedes the values
+FLAG_BITMAP = 0x80
+
+# start timestamp, size of the encoded series
+_SAMPLES_HEADER = struct.Struct("<dI")
+
+
+def _zigzag(value: int) -> int:
+    return value << 1 if value >= 0 else ((-value) << 1) - 1
+
+
+def _unzigzag(value: int) -> int:
+    return (value >> 1) ^ -(value & 1)
+
+
+def _write_varint(out: bytearray, value: int) -> None:
+    while value >= 0x80:
+        out.append((value & 0x7F) | 0x80)
+        value >>= 7
+    out.append(value)
+
+
+def _read_varint(data: memoryview, offset: int) -> tuple[int, int]:
+    result = shift = 0
+    while True:
+        byte = data[offset]
+        offset += 1
+        result |= (byte & 0x7F) << shift
+        if byte < 0x80:
+            return result, offset
+        shift += 7
+
+
+def _decimals(values: list[float]) -> int | None:
+    """Return the fewest decimals that represent every value exactly."""
+    # Integers have no negative zero, so -0.0 has to take the XOR encoding
+    if any(value == 0 and math.copysign(1.0, value) < 0 for value in values):
+        return None
+    for decimals in range(SAMPLE_MAX_DECIMALS + 1):
+        scale = 10**decimals
+        if all(
+            abs(value) * scale < 2**53 and round(value * scale) / scale == value
+            for value in values
+        ):
+            return decimals
+    return None
+
+
+def _encode_time(times) -> bytes:
+    """Delta-of-delta of millisecond timestamps.
+
+    Samples come at a roughly steady rate, so most of the second order
+    differences fit in one or two bytes.
+    """
+    out = bytearray()
+    previous = delta = 0
+    for index, value in enumerate(times):
+        millis = round(value * 1000)
+        if index == 0:
+            _write_varint(out, _zigzag(millis))
+        else:
+            _write_varint(out, _zigzag(millis - previous - delta))
+            delta = millis - previous
+        previous = millis
+    return bytes(out)
+
+
+def _encode_values(values) -> tuple[int, bytes]:
+    """Return the kind and payload of a value column."""
+    present = [value for value in values if not math.isnan(value)]
+    if not present:
+        return ENCODING_MISSING, b""
+
+    kind = 0
+    out = bytearray()
+    if len(present) < len(values):
+        kind |= FLAG_BITMAP
+        bitmap = bytearray((len(values) + 7) // 8)
+        for row, value in enumerate(values):
+            if not math.isnan(value):
+                bitmap[row >> 3] |= 1 << (row & 7)
+        out += bitmap
+
+    decimals = _decimals(present)
+    if decimals is not None:
+        # Sensor readings have a fixed number of decimals, so their
+        # differences are small integers
+        kind |= ENCODING_SCALED
+        out.append(decimals)
+        scale = 10**decimals
+        previous = 0
+        for value in present:
+            scaled = round(value * scale)
+            _write_varint(out, _zigzag(scaled - previous))
+            previous = scaled
+        return kind, bytes(out)
+
+    # Lossless fallback: consecutive floats share their sign, exponent and
+    # leading mantissa bits, which XOR away
+    kind |= ENCODING_XOR
+    previous = 0
+    for bits in struct.unpack(
+        f"<{len(present)}Q", struct.pack(f"<{len(present)}d", *present)
+    ):
+        xor = bits ^ previous
+        previous = bits
+        if not xor:
+            out.append(0)
+            continue
+        trailing = ((xor & -xor).bit_length() - 1) // 8
+        size = (xor.bit_length() + 7) // 8 - trailing
+        out.append(trailing << 4 | size)
+        out += (xor >> (8 * trailing)).to_bytes(size, "little")
+    return kind, bytes(out)
+
+
+def encode_samples(columns: dict) -> bytes:
+    """Encode equally long sample columns, keyed by name.
+
+    The time column is kept to the millisecond, every other column exactly.
+    Missing values (NaN) cost one bit each.
+    """
+    length = len(columns[COLUMN_TIME])
+    out = bytearray(MAGIC)
+    out.append(VERSION)
+    _write_varint(out, length)
+    _write_varint(out, len(columns))
+    for name, values in columns.items():
+        if name == COLUMN_TIME:
+            kind, payload = ENCODING_TIME, _encode_time(values)
+        else:
+            kind, payload = _encode_values(values)
+        encoded_name = name.encode()
+        _write_varint(out, len(encoded_name))
+        out += encoded_name
+        out.append(kind)
+        _write_varint(out, len(payload))
+        out += payload
+    return bytes(out)
+
+
+class SampleReader:
+    """Decode single columns of an encoded sample series on demand.
+
+    Only the column headers are parsed up front. Each column keeps a
+    ``memoryview`` of its part of the buffer, so nothing is copied and a
+    route can be drawn from the position columns alone.
+    """
+
+    def __init__(self, data: bytes | memoryview) -> None:
+        view = memoryview(data)
+        if bytes(view[:3]) != MAGIC or view[3] != VERSION:
+            raise ValueError("Not an encoded sample series")
+        self._length, offset = _read_varint(view, 4)
+        count, offset = _read_varint(view, offset)
+        self._columns: dict[str, tuple[int, memoryview]] = {}
+        for _ in range(count):
+            size, offset = _read_varint(view, offset)
+            name = bytes(view[offset : offset + size]).decode()
+            kind = view[offset + size]
+            size, offset = _read_varint(view, offset + size + 1)
+            self._columns[name] = (kind, view[offset : offset + size])
+            offset += size
+
+    def __len__(self) -> int:
+        return self._length
+
+    @property
+    def names(self) -> list[str]:
+        return list(self._columns)
+
+    def column(self, name: str) -> array:
+        """Decode one column into an ``array('d')``, NaN where missing."""
+        kind, payload = self._columns[name]
+        length = self._length
+        encoding = kind & ~FLAG_BITMAP
+        values = array("d", [math.nan]) * length
+        if encoding == ENCODING_MISSING:
+            return values
+
+        offset = 0
+        rows = range(length)
+        if kind & FLAG_BITMAP:
+            offset = (length + 7) // 8
+            bitmap = payload[:offset]
+            rows = [row for row in rows if bitmap[row >> 3] >> (row & 7) & 1]
+
+        if encoding == ENCODING_TIME:
+            previous = delta = 0
+            for row in rows:
+                value, offset = _read_varint(payload, offset)
+                if row == 0:
+                    previous = _unzigzag(value)
+                else:
+                    delta += _unzigzag(value)
+                    previous += delta
+                values[row] = previous / 1000
+        elif encoding == ENCODING_SCALED:
+            scale = 10 ** payload[offset]
+            offset += 1
+            previous = 0
+            for row in rows:
+                value, offset = _read_varint(payload, offset)
+                previous += _unzigzag(value)
+                values[row] = previous / scale
+        elif encoding == ENCODING_XOR:
+            previous = 0
+            unpack = struct.Struct("<d").unpack
+            for row in rows:
+                control = payload[offset]
+                offset += 1
+                if control:
+                    size = control & 0x0F
+                    previous ^= int.from_bytes(
+                        payload[offset : offset + size], "little"
+                    ) << (8 * (control >> 4))
+                    offset += size
+                values[row] = unpack(previous.to_bytes(8, "little"))[0]
+        else:
+            raise ValueError(f"Unknown encoding of column {name}")
+        return values
+
+
+class SampleStore(OffsetStore):
+    """Append-only file of encoded trip samples, keyed by trip start.
+
+    Like the routes, only the offset of every trip's samples is kept in
+    memory, and reading one column of a trip reads that trip only.
+    """
+
+    def __init__(self, hass: HomeAssistant, entry_id: str) -> None:
+        super().__init__(
+            hass,
+            hass.config.path(STORAGE_DIR, f"{DOMAIN}.{entry_id}.samples"),
+            "samples",
+            _SAMPLES_HEADER,
+        )
+
+    @callback
+    def async_append(self, start_time: str, data: bytes) -> None:
+        """Queue an encoded sample series for writing."""
+        self._async_append(start_time, len(data), data)
+
+    async def async_get(
+        self, start_time: str, names: list[str] | None = None
+    ) -> dict[str, list] | None:
+        """Return some or all sample columns of the trip that started then."""
+        if start_time not in self:
+            return None
+        await self.async_flush()
+        return await self.hass.async_add_executor_job(self._get, start_time, names)
+
+    def _get(self, start_time: str, names: list[str] | None) -> dict[str, list]:
+        reader = self.read(start_time)
+        return {
+            name: [
+                None if math.isnan(value) else value for value in reader.column(name)
+            ]
+            for name in names or reader.names
+            if name in reader.names
+        }
+
+    def read(self, start_time: str) -> SampleReader | None:
+        """Return a reader over the samples of a trip.
+
+        Blocking; run it in the executor after ``async_flush``.
+        """
+        data = self._read(start_time)
+        return None if data is None else SampleReader(data)
@@ -10,15 +10,32 @@ from .const import (
     CONF_ODOMETER_SENSOR,
     CONF_BATTERY_SENSOR,
     CONF_CHARGING_STATE_SENSOR,
+    CONF_LOCK_SENSOR,
+    CONF_PLUG_SENSOR,
     CONF_LOCATION_TRACKER,
     CONF_DRIVING_STATE_SENSOR,
     CONF_BATTERY_CAPACITY,
     CONF_TRIP_END_DELAY,
     DEFAULT_TRIP_END_DELAY,
+    CONF_ADAPTIVE_TRIP_END,
     CONF_MIN_TRIP_DISTANCE,
     DEFAULT_MIN_TRIP_DISTANCE,
     CONF_MIN_TRIP_DURATION,
     DEFAULT_MIN_TRIP_DURATION,
+    CONF_TEMPERATURE_SENSOR,
+    CONF_POWER_SENSOR,
+    CONF_BATTERY_ENERGY_SENSOR,
+    CONF_TEMPERATURE_CACHE_TTL,
+    DEFAULT_TEMPERATURE_CACHE_TTL,
+    CONF_COMPACT_ATTRIBUTES,
+    CONF_DIAGNOSTICS,
+    CONF_DEM_PATH,
+    CONF_WEATHER_API_URL,
+    DEFAULT_WEATHER_API_URL,
+    CONF_WEATHER_MODE,
+    DEFAULT_WEATHER_MODE,
+    WEATHER_MODE_CURRENT,
+    WEATHER_MODE_TRIP,
     ATTR_START_TIME,
     ATTR_END_TIME,
     ATTR_START_ODOMETER,
@@ -71,7 +88,24 @@ class EVTripTrackerOptionsFlow(config_entries.OptionsFlow):
                 ): selector.EntitySelector(
                     selector.EntitySelectorConfig(domain="sensor")
                 ),
-                vol.Optional(CONF_CHARGING_STATE_SENSOR): selector.EntitySelector(
+                vol.Optional(
+                    CONF_CHARGING_STATE_SENSOR,
+                    description={
+                        "suggested_value": current.get(CONF_CHARGING_STATE_SENSOR)
+                    },
+                ): selector.EntitySelector(
+                    selector.EntitySelectorConfig(domain=["binary_sensor", "sensor"])
+                ),
+                vol.Optional(
+                    CONF_LOCK_SENSOR,
+                    description={"suggested_value": current.get(CONF_LOCK_SENSOR)},
+                ): selector.EntitySelector(
+                    selector.EntitySelectorConfig(domain=["lock", "binary_sensor"])
+                ),
+                vol.Optional(
+                    CONF_PLUG_SENSOR,
+                    description={"suggested_value": current.get(CONF_PLUG_SENSOR)},
+                ): selector.EntitySelector(
                     selector.EntitySelectorConfig(domain=["binary_sensor", "sensor"])
                 ),
                 vol.Required(
@@ -79,6 +113,28 @@ class EVTripTrackerOptionsFlow(config_entries.OptionsFlow):
                 ): selector.EntitySelector(
                     selector.EntitySelectorConfig(domain=["device_tracker", "sensor"])
                 ),
+                vol.Optional(
+                    CONF_TEMPERATURE_SENSOR,
+                    description={
+                        "suggested_value": current.get(CONF_TEMPERATURE_SENSOR)
+                    },
+                ): selector.EntitySelector(
+                    selector.EntitySelectorConfig(domain="sensor")
+                ),
+                vol.Optional(
+                    CONF_POWER_SENSOR,
+                    description={"suggested_value": current.get(CONF_POWER_SENSOR)},
+                ): selector.EntitySelector(
+                    selector.EntitySelectorConfig(domain="sensor")
+                ),
+                vol.Optional(
+                    CONF_BATTERY_ENERGY_SENSOR,
+                    description={
+                        "suggested_value": current.get(CONF_BATTERY_ENERGY_SENSOR)
+                    },
+                ): selector.EntitySelector(
+                    selector.EntitySelectorConfig(domain="sensor")
+                ),
                 vol.Required(
                     CONF_BATTERY_CAPACITY,
                     default=current.get(CONF_BATTERY_CAPACITY, 60),
@@ -95,6 +151,10 @@ class EVTripTrackerOptionsFlow(config_entries.OptionsFlow):
                         min=0, max=3600, step=10, unit_of_measurement="seconds"
                     )
                 ),
+                vol.Required(
+                    CONF_ADAPTIVE_TRIP_END,
+                    default=current.get(CONF_ADAPTIVE_TRIP_END, True),
+                ): selector.BooleanSelector(),
                 vol.Required(
                     CONF_MIN_TRIP_DISTANCE,
                     default=current.get(
@@ -115,6 +175,43 @@ class EVTripTrackerOptionsFlow(config_entries.OptionsFlow):
                         min=0, max=600, step=10, unit_of_measurement="seconds"
                     )
                 ),
+                vol.Required(
+                    CONF_TEMPERATURE_CACHE_TTL,
+                    default=current.get(
+                        CONF_TEMPERATURE_CACHE_TTL, DEFAULT_TEMPERATURE_CACHE_TTL
+                    ),
+                ): selector.NumberSelector(
+                    selector.NumberSelectorConfig(
+                        min=0, max=3600, step=60, unit_of_measurement="seconds"
+                    )
+                ),
+                vol.Required(
+                    CONF_WEATHER_MODE,
+                    default=current.get(CONF_WEATHER_MODE, DEFAULT_WEATHER_MODE),
+                ): selector.SelectSelector(
+                    selector.SelectSelectorConfig(
+                        options=[WEATHER_MODE_CURRENT, WEATHER_MODE_TRIP],
+                        mode=selector.SelectSelectorMode.DROPDOWN,
+                    )
+                ),
+                vol.Optional(
+                    CONF_DEM_PATH,
+                    description={"suggested_value": current.get(CONF_DEM_PATH)},
+                ): selector.TextSelector(),
+                vol.Required(
+                    CONF_WEATHER_API_URL,
+                    default=current.get(CONF_WEATHER_API_URL, DEFAULT_WEATHER_API_URL),
+                ): selector.TextSelector(
+                    selector.TextSelectorConfig(type=selector.TextSelectorType.URL)
+                ),
+                vol.Required(
+                    CONF_COMPACT_ATTRIBUTES,
+                    default=current.get(CONF_COMPACT_ATTRIBUTES, False),
+                ): selector.BooleanSelector(),
+                vol.Required(
+                    CONF_DIAGNOSTICS,
+                    default=current.get(CONF_DIAGNOSTICS, False),
+                ): selector.BooleanSelector(),
             }
         )
         return self.async_show_form(step_id="init", data_schema=data_schema)
@@ -149,9 +246,24 @@ class EVTripTrackerConfigFlow(config_entries.ConfigFlow, domain=DOMAIN):
                 vol.Optional(CONF_CHARGING_STATE_SENSOR): selector.EntitySelector(
                     selector.EntitySelectorConfig(domain=["binary_sensor", "sensor"])
                 ),
+                vol.Optional(CONF_LOCK_SENSOR): selector.EntitySelector(
+                    selector.EntitySelectorConfig(domain=["lock", "binary_sensor"])
+                ),
+                vol.Optional(CONF_PLUG_SENSOR): selector.EntitySelector(
+                    selector.EntitySelectorConfig(domain=["binary_sensor", "sensor"])
+                ),
                 vol.Required(CONF_LOCATION_TRACKER): selector.EntitySelector(
                     selector.EntitySelectorConfig(domain="device_tracker")
                 ),
+                vol.Optional(CONF_TEMPERATURE_SENSOR): selector.EntitySelector(
+                    selector.EntitySelectorConfig(domain="sensor")
+                ),
+                vol.Optional(CONF_POWER_SENSOR): selector.EntitySelector(
+                    selector.EntitySelectorConfig(domain="sensor")
+                ),
+                vol.Optional(CONF_BATTERY_ENERGY_SENSOR): selector.EntitySelector(
+                    selector.EntitySelectorConfig(domain="sensor")
+                ),
                 vol.Required(
                     CONF_BATTERY_CAPACITY, default=60
                 ): selector.NumberSelector(
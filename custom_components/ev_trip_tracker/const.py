@@ -12,6 +12,119 @@ CONF_MIN_TRIP_DISTANCE = "min_trip_distance"
 DEFAULT_MIN_TRIP_DISTANCE = 1  # km
 CONF_MIN_TRIP_DURATION = "min_trip_duration"
 DEFAULT_MIN_TRIP_DURATION = 120  # seconds
+CONF_TEMPERATURE_SENSOR = "temperature_sensor"
+CONF_POWER_SENSOR = "power_sensor"
+CONF_BATTERY_ENERGY_SENSOR = "battery_energy_sensor"
+CONF_TEMPERATURE_CACHE_TTL = "temperature_cache_ttl"
+CONF_COMPACT_ATTRIBUTES = "compact_attributes"
+CONF_DEM_PATH = "dem_path"
+CONF_DIAGNOSTICS = "diagnostics"
+CONF_LOCK_SENSOR = "lock_sensor"
+CONF_PLUG_SENSOR = "plug_sensor"
+CONF_ADAPTIVE_TRIP_END = "adaptive_trip_end"
+CONF_WEATHER_MODE = "weather_mode"
+WEATHER_MODE_CURRENT = "current"  # current weather at trip start and end
+WEATHER_MODE_TRIP = "trip"  # one hourly request along the trip at trip end
+DEFAULT_WEATHER_MODE = WEATHER_MODE_CURRENT
+DEFAULT_TEMPERATURE_CACHE_TTL = 900  # seconds
+CONF_WEATHER_API_URL = "weather_api_url"
+DEFAULT_WEATHER_API_URL = "https://api.open-meteo.com/v1/forecast"
+
+DATA_LOCATION_CLIENT = f"{DOMAIN}_location_client"
+DATA_COORDINATOR = f"{DOMAIN}_coordinator"
+DATA_WEBSOCKET_CACHE = f"{DOMAIN}_websocket_cache"
+LOCATION_REQUEST_TIMEOUT = 10  # seconds
+ENRICHMENT_DEADLINE = 60  # seconds
+LOCATION_WARMUP_TRIPS = 100  # recent trips whose ends seed the elevation cache
+API_FAILURE_THRESHOLD = 3  # failed requests in a row before failing fast
+API_BACKOFF_MIN = 30  # seconds before the first retry, doubled per failure
+API_BACKOFF_MAX = 3600  # seconds
+BACKLOG_STORAGE_KEY = f"{DOMAIN}.{{}}.backlog"
+BACKLOG_SAVE_DELAY = 10  # seconds
+BACKLOG_BATCH_SIZE = 25  # trips per request, two coordinates each
+BACKLOG_BATCH_DAYS = 7  # days of hourly weather per request
+BACKLOG_MAX_TRIPS = 1000  # oldest trips are given up beyond this
+BACKLOG_MAX_AGE = 90  # days Open-Meteo's forecast API looks back
+# Waiting for odometer and battery readings taken after a trip starts or ends
+FRESH_READING_TIMEOUT = 60  # seconds before the trip is closed regardless
+FRESH_READING_CORRECTION = 900  # seconds a stored trip is still corrected
+FRESH_READING_GRACE = 5  # seconds a reading may precede the transition
+SAMPLE_CAPACITY = 1024  # samples kept per trip
+SAMPLE_MIN_INTERVAL = 5  # seconds, doubles each time the buffer fills up
+SAMPLE_MAX_DECIMALS = 7  # decimals stored as integers, more fall back to XOR
+ROUTE_SIMPLIFY_TOLERANCE = 10  # metres
+WEATHER_MAX_POINTS = 12  # coordinates per weather request
+BACKFILL_CHUNK = 86400  # seconds of recorder history read at a time
+DEFAULT_BACKFILL_DAYS = 365
+MIN_CHARGING_DURATION = 60  # seconds, shorter sessions without energy are dropped
+DC_POWER_THRESHOLD = 22  # kW, peak power above which a session counts as DC
+MODEL_FORGETTING = 0.995  # per trip, ~200 trips of memory
+MODEL_HUBER_K = 1.5  # residual stddevs before a trip is down-weighted
+MODEL_REJECT = 5  # residual stddevs before a trip is ignored
+MODEL_MIN_DISTANCE = 2  # km, shorter trips are too noisy to learn from
+MODEL_MIN_TRIPS = 5  # trips learned before predicting
+MODEL_REFERENCE_TEMPERATURE = 20  # °C, assumed when unknown
+PLACE_CELL_SIZE = 0.0015  # degrees, ~170 m of latitude
+PLACE_MIN_VISITS = 3  # trip endpoints that make a cell part of a place
+PLACE_MIN_RADIUS = 100  # metres
+PLACE_ROUTES_SHOWN = 20
+END_DELAY_LOCKED = 15  # seconds after the stop when the car is locked
+END_DELAY_ZONE = 60  # seconds after the stop inside a zone
+END_DELAY_LEARNED_MIN = 60  # seconds, shortest delay where stops resumed before
+END_LEARNED_MARGIN = 1.5  # times the longest resumed stop at a place
+END_LEARNED_PLACES = 256  # places remembered
+END_CELL_PRECISION = 7  # geohash characters, ~150 m
+
+DRIVING_STATES = ["on", "driving", "true", "True", True]
+PLUGGED_STATES = ["on", "plugged", "connected", "true", "True", True]
+CHARGING_STATES = ["on", "charging", "Charging", "ac", "dc", "true", "True", True]
+
+SERVICE_BACKFILL = "backfill"
+ATTR_CONFIG_ENTRY_ID = "config_entry_id"
+ATTR_START = "start"
+ATTR_END = "end"
+
+SERVICE_EXPORT = "export"
+ATTR_FORMAT = "format"
+ATTR_FILENAME = "filename"
+EXPORT_FORMAT_CSV = "csv"
+EXPORT_FORMAT_GPX = "gpx"
+EXPORT_FORMAT_PARQUET = "parquet"
+EXPORT_FORMATS = (EXPORT_FORMAT_CSV, EXPORT_FORMAT_GPX, EXPORT_FORMAT_PARQUET)
+
+WS_TYPE_TRIPS_LIST = f"{DOMAIN}/trips/list"
+WS_TYPE_TRIPS_AGGREGATE = f"{DOMAIN}/trips/aggregate"
+WS_TYPE_TRIP_SAMPLES = f"{DOMAIN}/trips/samples"
+ATTR_PLACE = "place"
+ATTR_CURSOR = "cursor"
+ATTR_LIMIT = "limit"
+ATTR_GROUP_BY = "group_by"
+ATTR_COLUMNS = "columns"
+WEBSOCKET_PAGE_SIZE = 50  # trips per page by default
+WEBSOCKET_MAX_PAGE_SIZE = 500
+WEBSOCKET_SCAN_CHUNK = 256  # records read at a time while filtering by place
+WEBSOCKET_CACHE_SIZE = 32  # encoded responses kept
+
+EVENT_TRIP_COMPLETED = f"{DOMAIN}_trip_completed"
+EVENT_TRIP_ENRICHED = f"{DOMAIN}_trip_enriched"
+EVENT_CHARGING_COMPLETED = f"{DOMAIN}_charging_completed"
+SIGNAL_LAST_TRIP_UPDATED = f"{DOMAIN}_last_trip_updated_{{}}"
+SIGNAL_STATISTICS_UPDATED = f"{DOMAIN}_statistics_updated_{{}}"
+SIGNAL_FLEET_UPDATED = f"{DOMAIN}_fleet_updated"
+SIGNAL_MODEL_UPDATED = f"{DOMAIN}_model_updated_{{}}"
+SIGNAL_PLACES_UPDATED = f"{DOMAIN}_places_updated_{{}}"
+SIGNAL_ENTRY_LOADED = f"{DOMAIN}_entry_loaded_{{}}"
+
+PERIOD_DAY = "day"
+PERIOD_WEEK = "week"
+PERIOD_MONTH = "month"
+PERIOD_LIFETIME = "lifetime"
+PERIODS = (PERIOD_DAY, PERIOD_WEEK, PERIOD_MONTH, PERIOD_LIFETIME)
+STATISTICS_SAVE_DELAY = 10  # seconds
+
+CHECKPOINT_STORAGE_KEY = f"{DOMAIN}.{{}}.checkpoint"
+CHECKPOINT_SAVE_DELAY = 5  # seconds
+PUBLISH_INTERVAL = 30  # seconds between state writes during a trip
 
 ATTR_START_TIME = "start_time"
 ATTR_END_TIME = "end_time"
@@ -24,6 +137,7 @@ ATTR_END_LOCATION = "end_location"
 ATTR_DISTANCE = "distance"
 ATTR_ENERGY_USED = "energy_used"
 ATTR_ENERGY_CONSUMPTION = "energy_consumption"
+ATTR_ENERGY_REGENERATED = "energy_regenerated"
 ATTR_AVG_SPEED = "avg_speed"
 ATTR_DURATION = "duration_minutes"  # minutes
 ATTR_DURATION_FORMATTED = "duration_formatted"
@@ -34,3 +148,22 @@ ATTR_ELEVATION_DIFF = "elevation_diff"
 ATTR_START_TEMPERATURE = "start_temperature"
 ATTR_END_TEMPERATURE = "end_temperature"
 ATTR_AVG_TEMPERATURE = "avg_temperature"
+ATTR_PRECIPITATION = "precipitation"  # mm
+ATTR_AVG_WIND_SPEED = "avg_wind_speed"  # km/h
+ATTR_SAMPLE_COUNT = "sample_count"
+ATTR_ENERGY_ADDED = "energy_added"  # kWh
+ATTR_AVG_POWER = "avg_power"  # kW
+ATTR_PEAK_POWER = "peak_power"  # kW
+ATTR_CHARGE_TYPE = "charge_type"
+ATTR_LATITUDE = "latitude"
+ATTR_LONGITUDE = "longitude"
+ATTR_START_LATITUDE = "start_latitude"
+ATTR_START_LONGITUDE = "start_longitude"
+ATTR_END_LATITUDE = "end_latitude"
+ATTR_END_LONGITUDE = "end_longitude"
+CHARGE_TYPE_AC = "ac"
+CHARGE_TYPE_DC = "dc"
+CHARGE_TYPES = (CHARGE_TYPE_AC, CHARGE_TYPE_DC)
+ATTR_ROUTE_DISTANCE = "route_distance"
+ATTR_ELEVATION_GAIN = "elevation_gain"
+ATTR_ELEVATION_LOSS = "elevation_loss"
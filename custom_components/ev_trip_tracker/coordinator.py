@@ -0,0 +1,199 @@
+"""Shared state change dispatcher for every tracked vehicle."""
+
+import logging
+from collections.abc import Callable
+
+from homeassistant.core import Event, HomeAssistant, callback
+from homeassistant.helpers.dispatcher import async_dispatcher_send
+from homeassistant.helpers.event import async_track_state_change_event
+
+try:
+    from homeassistant.helpers.event import async_track_state_report_event
+except ImportError:
+    # Home Assistant before 2024.8 does not tell when a state is reported
+    # again unchanged
+    async_track_state_report_event = None
+
+from .const import DATA_COORDINATOR, SIGNAL_FLEET_UPDATED
+
+_LOGGER = logging.getLogger(__name__)
+
+
+class EVTripFleetCoordinator:
+    """Route state changes of all vehicles through one listener.
+
+    Vehicles register callbacks per entity_id. A single state change listener
+    covers the union of all registered entities and dispatches each event with
+    one dict lookup, however many vehicles are configured. The listener is
+    only rebuilt when an entity is tracked for the first time. Unchanged
+    states reported again go through a second listener the same way.
+    """
+
+    def __init__(self, hass: HomeAssistant) -> None:
+        self.hass = hass
+        self.vehicles: set[str] = set()
+        self.active_trips: set[str] = set()
+        self._routes: dict[str, list[Callable[[Event], None]]] = {}
+        self._subscribed: frozenset[str] = frozenset()
+        self._unsub = None
+        self._report_routes: dict[str, list[Callable[[Event], None]]] = {}
+        self._report_subscribed: frozenset[str] = frozenset()
+        self._unsub_reports = None
+        # entry_id -> callback that adds the fleet sensors to that entry
+        self._fleet_platforms: dict[str, Callable[[], None]] = {}
+        self._fleet_owner: str | None = None
+
+    @callback
+    def async_add_vehicle(self, entry_id: str) -> None:
+        """Register a vehicle."""
+        self.vehicles.add(entry_id)
+
+    @callback
+    def async_remove_vehicle(self, entry_id: str) -> None:
+        """Forget a vehicle and hand the fleet sensors to another one."""
+        self.vehicles.discard(entry_id)
+        self.active_trips.discard(entry_id)
+        self._fleet_platforms.pop(entry_id, None)
+        if self._fleet_owner == entry_id:
+            self._fleet_owner = None
+            self._async_ensure_fleet_entities()
+        async_dispatcher_send(self.hass, SIGNAL_FLEET_UPDATED)
+
+    @callback
+    def async_shutdown(self) -> None:
+        """Stop listening."""
+        if self._unsub:
+            self._unsub()
+            self._unsub = None
+        if self._unsub_reports:
+            self._unsub_reports()
+            self._unsub_reports = None
+        self._routes.clear()
+        self._report_routes.clear()
+        self._subscribed = frozenset()
+        self._report_subscribed = frozenset()
+
+    @callback
+    def async_track(
+        self,
+        entity_ids: list[str],
+        action: Callable[[Event], None],
+        reports: bool = False,
+    ) -> Callable[[], None]:
+        """Call ``action`` for state changes of ``entity_ids``.
+
+        With ``reports``, ``action`` is also called when one of them reports
+        its unchanged state again, with the state's ``last_reported`` updated.
+        """
+        entity_ids = [entity_id for entity_id in entity_ids if entity_id]
+        for entity_id in entity_ids:
+            self._routes.setdefault(entity_id, []).append(action)
+        if not self._subscribed.issuperset(entity_ids):
+            self._async_resubscribe()
+        if reports and async_track_state_report_event is not None:
+            for entity_id in entity_ids:
+                self._report_routes.setdefault(entity_id, []).append(action)
+            if not self._report_subscribed.issuperset(entity_ids):
+                self._async_resubscribe_reports()
+        else:
+            reports = False
+
+        @callback
+        def _remove() -> None:
+            _remove_route(self._routes, entity_ids, action)
+            if reports:
+                _remove_route(self._report_routes, entity_ids, action)
+
+        return _remove
+
+    @callback
+    def _async_resubscribe(self) -> None:
+        """Rebuild the state change listener for the current entities."""
+        if self._unsub:
+            self._unsub()
+        self._subscribed = frozenset(self._subscribed | self._routes.keys())
+        self._unsub = async_track_state_change_event(
+            self.hass, list(self._subscribed), self._async_dispatch
+        )
+        _LOGGER.debug("Tracking %s entities", len(self._subscribed))
+
+    @callback
+    def _async_resubscribe_reports(self) -> None:
+        """Rebuild the state report listener for the current entities."""
+        if self._unsub_reports:
+            self._unsub_reports()
+        self._report_subscribed = frozenset(
+            self._report_subscribed | self._report_routes.keys()
+        )
+        self._unsub_reports = async_track_state_report_event(
+            self.hass, list(self._report_subscribed), self._async_dispatch_report
+        )
+
+    @callback
+    def _async_dispatch(self, event: Event) -> None:
+        """Hand a state change to the vehicles tracking the entity."""
+        actions = self._routes.get(event.data["entity_id"])
+        if actions:
+            for action in tuple(actions):
+                action(event)
+
+    @callback
+    def _async_dispatch_report(self, event: Event) -> None:
+        """Hand an unchanged state report to the vehicles waiting for it."""
+        actions = self._report_routes.get(event.data["entity_id"])
+        if actions:
+            for action in tuple(actions):
+                action(event)
+
+    @callback
+    def async_set_trip_active(self, entry_id: str, active: bool) -> None:
+        """Record whether a vehicle is on a trip."""
+        if active:
+            self.active_trips.add(entry_id)
+        else:
+            self.active_trips.discard(entry_id)
+        async_dispatcher_send(self.hass, SIGNAL_FLEET_UPDATED)
+
+    @callback
+    def async_add_fleet_platform(
+        self, entry_id: str, add_fleet_entities: Callable[[], None]
+    ) -> None:
+        """Offer an entry's sensor platform to host the fleet sensors."""
+        self._fleet_platforms[entry_id] = add_fleet_entities
+        self._async_ensure_fleet_entities()
+
+    @callback
+    def _async_ensure_fleet_entities(self) -> None:
+        """Add the fleet sensors once there is more than one vehicle."""
+        if self._fleet_owner or len(self.vehicles) < 2 or not self._fleet_platforms:
+            return
+        self._fleet_owner, add_fleet_entities = next(
+            iter(self._fleet_platforms.items())
+        )
+        add_fleet_entities()
+
+
+@callback
+def _remove_route(
+    routes: dict[str, list[Callable[[Event], None]]],
+    entity_ids: list[str],
+    action: Callable[[Event], None],
+) -> None:
+    """Stop routing ``entity_ids`` to ``action``."""
+    for entity_id in entity_ids:
+        actions = routes.get(entity_id)
+        if actions and action in actions:
+            actions.remove(action)
+            if not actions:
+                # Stays subscribed; dropping it would rebuild the listener
+                # every time a trip ends
+                del routes[entity_id]
+
+
+@callback
+def async_get_coordinator(hass: HomeAssistant) -> EVTripFleetCoordinator:
+    """Return the coordinator shared by all config entries."""
+    coordinator = hass.data.get(DATA_COORDINATOR)
+    if coordinator is None:
+        coordinator = hass.data[DATA_COORDINATOR] = EVTripFleetCoordinator(hass)
+    return coordinator
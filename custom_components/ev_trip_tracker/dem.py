@@ -0,0 +1,128 @@
+"""Offline elevation lookup from memory-mapped SRTM ``.hgt`` tiles."""
+
+import logging
+import math
+import mmap
+import os
+import struct
+import threading
+from collections import OrderedDict
+
+_LOGGER = logging.getLogger(__name__)
+
+# Open tiles kept mapped; a 1 arc-second tile is ~25 MB of address space
+MAX_OPEN_TILES = 16
+# SRTM marks missing samples with this value
+VOID = -32768
+
+_SAMPLE = struct.Struct(">h")
+
+
+def tile_name(lat: float, lon: float) -> str:
+    """Return the name of the 1x1 degree tile containing a coordinate."""
+    lat0 = math.floor(lat)
+    lon0 = math.floor(lon)
+    return (
+        f"{'N' if lat0 >= 0 else 'S'}{abs(lat0):02d}"
+        f"{'E' if lon0 >= 0 else 'W'}{abs(lon0):03d}.hgt"
+    )
+
+
+class _Tile:
+    """One memory-mapped tile of ``size`` x ``size`` big-endian int16 samples."""
+
+    __slots__ = ("map", "size")
+
+    def __init__(self, path: str) -> None:
+        with open(path, "rb") as file:
+            self.map = mmap.mmap(file.fileno(), 0, access=mmap.ACCESS_READ)
+        self.size = math.isqrt(len(self.map) // 2)
+        if self.size * self.size * 2 != len(self.map) or self.size < 2:
+            self.map.close()
+            raise ValueError(f"{path} is not a square .hgt tile")
+
+    def sample(self, row: int, col: int) -> int:
+        return _SAMPLE.unpack_from(self.map, (row * self.size + col) * 2)[0]
+
+    def close(self) -> None:
+        self.map.close()
+
+
+class ElevationTiles:
+    """Bilinear elevation lookups from a directory of ``.hgt`` tiles.
+
+    Tiles are memory-mapped on first use, so a lookup only pages in the four
+    samples around the coordinate instead of reading the tile into RAM. Both
+    3 arc-second (1201x1201) and 1 arc-second (3601x3601) tiles are supported.
+    Lookups do blocking file I/O and must run in the executor.
+    """
+
+    def __init__(self, directory: str) -> None:
+        self.directory = directory
+        self._tiles: OrderedDict[str, _Tile | None] = OrderedDict()
+        self._lock = threading.Lock()
+
+    def elevation(self, lat: float, lon: float) -> float | None:
+        """Return the elevation in metres, None if no tile covers it."""
+        with self._lock:
+            tile = self._get_tile(tile_name(lat, lon))
+            if tile is None:
+                return None
+
+            last = tile.size - 1
+            # Rows run from north to south, columns from west to east
+            y = (math.floor(lat) + 1 - lat) * last
+            x = (lon - math.floor(lon)) * last
+            row = min(int(y), last)
+            col = min(int(x), last)
+            fy = y - row
+            fx = x - col
+            row1 = min(row + 1, last)
+            col1 = min(col + 1, last)
+
+            total = 0.0
+            weights = 0.0
+            for r, c, weight in (
+                (row, col, (1 - fy) * (1 - fx)),
+                (row, col1, (1 - fy) * fx),
+                (row1, col, fy * (1 - fx)),
+                (row1, col1, fy * fx),
+            ):
+                value = tile.sample(r, c)
+                if value != VOID:
+                    total += value * weight
+                    weights += weight
+        if weights == 0:
+            return None
+        return round(total / weights, 1)
+
+    def _get_tile(self, name: str) -> _Tile | None:
+        """Return a mapped tile, opening it on first use."""
+        if name in self._tiles:
+            self._tiles.move_to_end(name)
+            return self._tiles[name]
+
+        tile = None
+        path = os.path.join(self.directory, name)
+        try:
+            tile = _Tile(path)
+        except FileNotFoundError:
+            _LOGGER.debug("No elevation tile %s", path)
+        except (OSError, ValueError) as e:
+            _LOGGER.warning("Failed to open elevation tile %s: %s", path, e)
+
+        # Missing tiles are remembered too, so they are not looked up every time
+        self._tiles[name] = tile
+        if len(self._tiles) > MAX_OPEN_TILES:
+            _, evicted = self._tiles.popitem(last=False)
+            if evicted is not None:
+                evicted.close()
+        return tile
+
+    def close(self) -> None:
+        """Unmap all tiles."""
+        with self._lock:
+            for tile in self._tiles.values():
+                if tile is not None:
+                    tile.close()
+            self._tiles.clear()
@@ -0,0 +1,60 @@
+"""Diagnostics support for EV Trip Tracker."""
+
+from homeassistant.components.diagnostics import async_redact_data
+from homeassistant.config_entries import ConfigEntry
+from homeassistant.core import HomeAssistant
+
+from .const import (
+    DOMAIN,
+    ATTR_START_LOCATION,
+    ATTR_END_LOCATION,
+    ATTR_LATITUDE,
+    ATTR_LONGITUDE,
+    ATTR_START_LATITUDE,
+    ATTR_START_LONGITUDE,
+    ATTR_END_LATITUDE,
+    ATTR_END_LONGITUDE,
+)
+from .history import RECORD_KIND_CHARGING
+from .coordinator import async_get_coordinator
+from .loader import async_wait_loaded
+from .location import async_get_location_client
+
+TO_REDACT = {
+    ATTR_START_LOCATION,
+    ATTR_END_LOCATION,
+    ATTR_LATITUDE,
+    ATTR_LONGITUDE,
+    ATTR_START_LATITUDE,
+    ATTR_START_LONGITUDE,
+    ATTR_END_LATITUDE,
+    ATTR_END_LONGITUDE,
+    # Kept with the active trip until it ends
+    "_start_position",
+    "_end_position",
+}
+
+
+async def async_get_config_entry_diagnostics(
+    hass: HomeAssistant, entry: ConfigEntry
+) -> dict:
+    """Return diagnostics for a config entry."""
+    await async_wait_loaded(hass, [entry.entry_id])
+    data = hass.data[DOMAIN][entry.entry_id]
+    # Missing until the sensor platform is set up
+    current_trip_sensor = data.get("current_trip_sensor")
+    return {
+        "config": dict(entry.data),
+        "options": dict(entry.options),
+        "trip_active": entry.entry_id in async_get_coordinator(hass).active_trips,
+        "current_trip": async_redact_data(
+            current_trip_sensor.trip_data if current_trip_sensor else {}, TO_REDACT
+        ),
+        "last_trip": async_redact_data(data.get("last_trip", {}), TO_REDACT),
+        "last_charge": async_redact_data(data.get("last_charge", {}), TO_REDACT),
+        "stored_trips": data["history"].count(),
+        "stored_charging_sessions": data["history"].count(RECORD_KIND_CHARGING),
+        "metrics": data["metrics"].as_dict(),
+        "location_api": async_get_location_client(hass).metrics.as_dict(),
+        "trips_without_weather": len(data["backlog"].records),
+    }
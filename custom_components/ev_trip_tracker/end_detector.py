@@ -0,0 +1,108 @@
+"""Adaptive choice of how long to wait before ending a trip."""
+
+from collections import OrderedDict
+
+from homeassistant.const import STATE_NOT_HOME, STATE_UNAVAILABLE, STATE_UNKNOWN
+from homeassistant.core import State
+
+from .const import (
+    END_CELL_PRECISION,
+    END_DELAY_LOCKED,
+    END_DELAY_ZONE,
+    END_DELAY_LEARNED_MIN,
+    END_LEARNED_MARGIN,
+    END_LEARNED_PLACES,
+    PLUGGED_STATES,
+)
+from .location import geohash_encode
+
+
+def is_locked(state: State | None) -> bool:
+    """Return whether a lock entity or lock binary sensor reports locked."""
+    if state is None:
+        return False
+    if state.domain == "lock":
+        return state.state == "locked"
+    # A lock binary sensor is on when unlocked
+    if state.attributes.get("device_class") == "lock":
+        return state.state == "off"
+    return state.state in ("on", "locked")
+
+
+def is_plugged(state: State | None) -> bool:
+    """Return whether a plug sensor reports the charge cable connected."""
+    return state is not None and state.state in PLUGGED_STATES
+
+
+def in_zone(state: State | None) -> bool:
+    """Return whether a device tracker is inside a Home Assistant zone."""
+    return state is not None and state.state not in (
+        STATE_NOT_HOME,
+        STATE_UNKNOWN,
+        STATE_UNAVAILABLE,
+    )
+
+
+def stop_cell(lat: float | None, lon: float | None) -> str | None:
+    """Return the place a stop is remembered by."""
+    if lat is None or lon is None:
+        return None
+    return geohash_encode(lat, lon, END_CELL_PRECISION)
+
+
+class TripEndDetector:
+    """Pick the trip end delay from the evidence that the car is parked.
+
+    The configured trip end delay is the upper bound. A plugged in car ends
+    the trip at once. Otherwise a locked car or a car inside a zone ends it
+    after a few seconds, unless the odometer moved since the stop. Places
+    where driving resumed after a stop before are remembered per ~150 m cell
+    with the longest such stop, and the trip is held open a margin longer
+    than that there, so short stops keep merging into the trip.
+    """
+
+    def __init__(self, max_delay: float) -> None:
+        self.max_delay = max_delay
+        # cell -> longest stop after which driving resumed, in seconds
+        self._stops: OrderedDict[str, float] = OrderedDict()
+
+    def delay(
+        self,
+        cell: str | None,
+        *,
+        plugged: bool = False,
+        locked: bool = False,
+        zone: bool = False,
+        moving: bool = False,
+    ) -> float:
+        """Return the seconds to wait after the stop before ending the trip."""
+        if plugged:
+            return 0
+        if moving:
+            return self.max_delay
+        learned = self._stops.get(cell) if cell else None
+        if learned is not None:
+            return min(
+                self.max_delay,
+                max(END_DELAY_LEARNED_MIN, learned * END_LEARNED_MARGIN),
+            )
+        if locked:
+            return min(self.max_delay, END_DELAY_LOCKED)
+        if zone:
+            return min(self.max_delay, END_DELAY_ZONE)
+        return self.max_delay
+
+    def learn(self, cell: str | None, stop: float) -> None:
+        """Remember that driving resumed ``stop`` seconds after stopping."""
+        if not cell or stop > self.max_delay:
+            return
+        self._stops[cell] = max(stop, self._stops.get(cell, 0))
+        self._stops.move_to_end(cell)
+        if len(self._stops) > END_LEARNED_PLACES:
+            self._stops.popitem(last=False)
+
+    def as_dict(self) -> dict:
+        return dict(self._stops)
+
+    def load(self, data: dict) -> None:
+        self._stops = OrderedDict(data)
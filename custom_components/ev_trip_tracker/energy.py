@@ -0,0 +1,178 @@
+"""Trip energy from sampled power or battery energy readings, and the trip metrics."""
+
+from datetime import datetime
+
+import numpy as np
+
+from .const import (
+    CONF_BATTERY_CAPACITY,
+    CONF_BATTERY_ENERGY_SENSOR,
+    CONF_POWER_SENSOR,
+    ATTR_START_TIME,
+    ATTR_END_TIME,
+    ATTR_START_ODOMETER,
+    ATTR_END_ODOMETER,
+    ATTR_START_BATTERY,
+    ATTR_END_BATTERY,
+    ATTR_DISTANCE,
+    ATTR_ROUTE_DISTANCE,
+    ATTR_ENERGY_USED,
+    ATTR_ENERGY_REGENERATED,
+    ATTR_ENERGY_CONSUMPTION,
+    ATTR_DURATION,
+    ATTR_DURATION_FORMATTED,
+    ATTR_AVG_SPEED,
+    ATTR_START_ELEVATION,
+    ATTR_END_ELEVATION,
+    ATTR_ELEVATION_DIFF,
+    ATTR_START_TEMPERATURE,
+    ATTR_END_TEMPERATURE,
+    ATTR_AVG_TEMPERATURE,
+)
+from .sampler import (
+    COLUMN_BATTERY_ENERGY,
+    COLUMN_POWER,
+    COLUMN_TEMPERATURE,
+    COLUMN_TIME,
+    SampleBuffer,
+)
+
+
+def integrate_power(times, power) -> tuple[float, float] | None:
+    """Return the consumed and regenerated kWh of sampled power in kW.
+
+    Power is integrated with the trapezoidal rule. Positive power is drawn
+    from the battery, negative power is regenerative braking. A segment that
+    crosses zero is split at the crossing, so consumption and regeneration in
+    the same segment don't cancel out.
+    """
+    t = np.asarray(times, dtype=np.float64)
+    p = np.asarray(power, dtype=np.float64)
+    valid = ~np.isnan(p)
+    t, p = t[valid], p[valid]
+    if len(p) < 2:
+        return None
+
+    hours = np.diff(t) / 3600
+    p0 = p[:-1]
+    p1 = p[1:]
+    magnitude = np.abs(p0) + np.abs(p1)
+    crossing = (p0 * p1 < 0) & (magnitude > 0)
+    # Triangles on either side of the crossing; safe divisor off the crossing
+    divisor = np.where(crossing, magnitude, 1.0)
+    positive = np.where(
+        crossing,
+        np.maximum(p0, p1) ** 2 / divisor,
+        np.maximum(p0, 0) + np.maximum(p1, 0),
+    )
+    negative = np.where(
+        crossing,
+        np.minimum(p0, p1) ** 2 / divisor,
+        -(np.minimum(p0, 0) + np.minimum(p1, 0)),
+    )
+    return float(np.sum(positive * hours) / 2), float(np.sum(negative * hours) / 2)
+
+
+def energy_from_content(content) -> tuple[float, float] | None:
+    """Return the consumed and regenerated kWh of sampled battery energy.
+
+    Every drop of the energy left in the battery counts as consumption and
+    every rise while driving as regeneration.
+    """
+    values = np.asarray(content, dtype=np.float64)
+    values = values[~np.isnan(values)]
+    if len(values) < 2:
+        return None
+    steps = np.diff(values)
+    return float(-steps[steps < 0].sum()), float(steps[steps > 0].sum())
+
+
+def calculate_trip_metrics(
+    trip: dict, config: dict, samples: SampleBuffer | None = None
+) -> None:
+    """Calculate distance, energy, avg speed."""
+    start_odo = trip.get(ATTR_START_ODOMETER)
+    end_odo = trip.get(ATTR_END_ODOMETER)
+    start_bat = trip.get(ATTR_START_BATTERY)
+    end_bat = trip.get(ATTR_END_BATTERY)
+    start_time = datetime.fromisoformat(trip[ATTR_START_TIME])
+    end_time = datetime.fromisoformat(trip[ATTR_END_TIME])
+
+    # Distance
+    if start_odo and end_odo:
+        trip[ATTR_DISTANCE] = round(end_odo - start_odo, 2)
+    route_distance = trip.get(ATTR_ROUTE_DISTANCE)
+    if route_distance:
+        distance = trip.get(ATTR_DISTANCE)
+        # Odometers that only report whole kilometres are refined by the
+        # route, as long as both agree to within one step
+        if not distance or (
+            distance == int(distance) and abs(route_distance - distance) < 1
+        ):
+            trip[ATTR_DISTANCE] = route_distance
+
+    # Energy used (kWh), preferring power or battery energy samples over
+    # the coarse battery percentage
+    energy = integrate_energy(config, samples) if samples else None
+    if energy is not None:
+        consumed, regenerated = energy
+        trip[ATTR_ENERGY_USED] = round(consumed - regenerated, 2)
+        trip[ATTR_ENERGY_REGENERATED] = round(regenerated, 2)
+    elif start_bat and end_bat:
+        battery_capacity = config[CONF_BATTERY_CAPACITY]
+        energy = (start_bat - end_bat) / 100 * battery_capacity
+        trip[ATTR_ENERGY_USED] = round(energy, 2)
+
+    if trip.get(ATTR_ENERGY_USED) is not None and trip.get(ATTR_DISTANCE):
+        trip[ATTR_ENERGY_CONSUMPTION] = round(
+            ((trip[ATTR_ENERGY_USED] / trip[ATTR_DISTANCE]) * 100),
+            2,
+        )
+
+    # Duration
+    duration = end_time - start_time
+    trip[ATTR_DURATION] = round(duration.total_seconds() / 60, 2)
+
+    seconds = duration.total_seconds()
+    hours, remainder = divmod(seconds, 3600)
+    minutes, seconds = divmod(remainder, 60)
+    trip[ATTR_DURATION_FORMATTED] = (
+        f"{int(hours)}:{int(minutes):02d}:{int(seconds):02d}"
+    )
+
+    # Average speed
+    if trip.get(ATTR_DISTANCE) and duration.total_seconds() > 0:
+        hours = duration.total_seconds() / 3600
+        trip[ATTR_AVG_SPEED] = round(trip[ATTR_DISTANCE] / hours, 1)
+
+    # Elevation diff
+    start_elev = trip.get(ATTR_START_ELEVATION)
+    end_elev = trip.get(ATTR_END_ELEVATION)
+    if start_elev is not None and end_elev is not None:
+        trip[ATTR_ELEVATION_DIFF] = round(end_elev - start_elev, 1)
+
+    start_temp = trip.get(ATTR_START_TEMPERATURE)
+    end_temp = trip.get(ATTR_END_TEMPERATURE)
+    if samples:
+        avg_temp = samples.time_weighted_mean(
+            COLUMN_TEMPERATURE,
+            (start_time.timestamp(), start_temp),
+            (end_time.timestamp(), end_temp),
+        )
+        if avg_temp is not None:
+            trip[ATTR_AVG_TEMPERATURE] = round(avg_temp, 1)
+    elif start_temp is not None and end_temp is not None:
+        trip[ATTR_AVG_TEMPERATURE] = round(((start_temp + end_temp) / 2), 1)
+
+
+def integrate_energy(config: dict, samples: SampleBuffer) -> tuple[float, float] | None:
+    """Return consumed and regenerated kWh from the energy samples."""
+    if config.get(CONF_POWER_SENSOR):
+        energy = integrate_power(
+            samples.column(COLUMN_TIME), samples.column(COLUMN_POWER)
+        )
+        if energy is not None:
+            return energy
+    if config.get(CONF_BATTERY_ENERGY_SENSOR):
+        return energy_from_content(samples.column(COLUMN_BATTERY_ENERGY))
+    return None
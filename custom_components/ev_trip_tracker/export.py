@@ -0,0 +1,172 @@
+"""Stream stored trips to CSV, GPX or Parquet files."""
+
+import csv
+import logging
+import os
+from contextlib import ExitStack
+from datetime import datetime
+from xml.sax.saxutils import escape
+
+from homeassistant.core import HomeAssistant
+from homeassistant.exceptions import HomeAssistantError
+
+from .const import (
+    DOMAIN,
+    ATTR_START_TIME,
+    ATTR_END_TIME,
+    ATTR_DISTANCE,
+    ATTR_ENERGY_USED,
+    ATTR_DURATION,
+    EXPORT_FORMAT_CSV,
+    EXPORT_FORMAT_GPX,
+    EXPORT_FORMAT_PARQUET,
+)
+from .history import TRIP_FIELDS, TripHistoryStore
+from .route import RouteStore
+
+_LOGGER = logging.getLogger(__name__)
+
+COLUMN_VEHICLE = "vehicle"
+
+
+class _CsvWriter:
+    def __init__(self, file) -> None:
+        self._writer = csv.DictWriter(
+            file, (COLUMN_VEHICLE, *TRIP_FIELDS), extrasaction="ignore"
+        )
+        self._writer.writeheader()
+
+    def write(self, vehicle: str, trips: list[dict], routes: RouteStore) -> int:
+        self._writer.writerows({COLUMN_VEHICLE: vehicle, **trip} for trip in trips)
+        return len(trips)
+
+    def close(self) -> None:
+        pass
+
+
+class _GpxWriter:
+    """Write one track per trip with a stored route."""
+
+    def __init__(self, file) -> None:
+        self._file = file
+        file.write(
+            '<?xml version="1.0" encoding="UTF-8"?>\n'
+            '<gpx version="1.1" creator="EV Trip Tracker" '
+            'xmlns="http://www.topografix.com/GPX/1/1">\n'
+        )
+
+    def write(self, vehicle: str, trips: list[dict], routes: RouteStore) -> int:
+        written = 0
+        for trip in trips:
+            points = routes.read(trip[ATTR_START_TIME])
+            if points is None or not len(points):
+                continue
+            description = ", ".join(
+                f"{trip[name]} {unit}"
+                for name, unit in (
+                    (ATTR_DISTANCE, "km"),
+                    (ATTR_ENERGY_USED, "kWh"),
+                    (ATTR_DURATION, "min"),
+                )
+                if trip[name] is not None
+            )
+            self._file.write(
+                f"<trk><name>{escape(vehicle)} {trip[ATTR_START_TIME]}</name>"
+                f"<desc>{escape(description)}</desc><trkseg>\n"
+            )
+            self._file.writelines(
+                f'<trkpt lat="{lat:.6f}" lon="{lon:.6f}"/>\n' for lat, lon in points
+            )
+            self._file.write("</trkseg></trk>\n")
+            written += 1
+        return written
+
+    def close(self) -> None:
+        self._file.write("</gpx>\n")
+
+
+class _ParquetWriter:
+    """Write one row group per chunk of trips."""
+
+    def __init__(self, path: str) -> None:
+        try:
+            import pyarrow as pa
+            import pyarrow.parquet as pq
+        except ImportError as err:
+            raise HomeAssistantError("Parquet export needs pyarrow installed") from err
+        self._pa = pa
+        fields = [pa.field(COLUMN_VEHICLE, pa.string())]
+        for name in TRIP_FIELDS:
+            if name in (ATTR_START_TIME, ATTR_END_TIME):
+                fields.append(pa.field(name, pa.timestamp("s")))
+            else:
+                fields.append(pa.field(name, pa.float64()))
+        self._schema = pa.schema(fields)
+        self._writer = pq.ParquetWriter(path, self._schema, compression="zstd")
+
+    def write(self, vehicle: str, trips: list[dict], routes: RouteStore) -> int:
+        columns = {COLUMN_VEHICLE: [vehicle] * len(trips)}
+        for name in TRIP_FIELDS:
+            if name in (ATTR_START_TIME, ATTR_END_TIME):
+                columns[name] = [datetime.fromisoformat(trip[name]) for trip in trips]
+            else:
+                columns[name] = [trip[name] for trip in trips]
+        self._writer.write_table(
+            self._pa.Table.from_pydict(columns, schema=self._schema)
+        )
+        return len(trips)
+
+    def close(self) -> None:
+        self._writer.close()
+
+
+def export_trips(
+    path: str,
+    export_format: str,
+    vehicles: list[tuple[str, TripHistoryStore, RouteStore, object]],
+) -> int:
+    """Write the trips of every vehicle to ``path`` and return how many.
+
+    ``vehicles`` holds the name, history, routes and record numbers to
+    export of each vehicle. Trips are read and written a chunk at a time,
+    so memory does not grow with the number of trips. The file is written
+    next to ``path`` and moved into place once complete. Blocking; run it in
+    the executor after flushing the stores.
+    """
+    os.makedirs(os.path.dirname(path), exist_ok=True)
+    temp_path = f"{path}.part"
+    count = 0
+    try:
+        with ExitStack() as stack:
+            if export_format == EXPORT_FORMAT_PARQUET:
+                writer = _ParquetWriter(temp_path)
+            else:
+                file = stack.enter_context(
+                    open(temp_path, "w", encoding="utf-8", newline="")
+                )
+                if export_format == EXPORT_FORMAT_GPX:
+                    writer = _GpxWriter(file)
+                else:
+                    writer = _CsvWriter(file)
+            # Closed before the file it writes to, and on errors as well
+            stack.callback(writer.close)
+            for name, history, routes, positions in vehicles:
+                for trips in history.iter_chunks(positions):
+                    count += writer.write(name, trips, routes)
+        os.replace(temp_path, path)
+    except BaseException:
+        if os.path.exists(temp_path):
+            os.remove(temp_path)
+        raise
+    _LOGGER.info("Exported %s trips to %s", count, path)
+    return count
+
+
+def default_path(hass: HomeAssistant, export_format: str) -> str:
+    """Return a timestamped file name in the integration's export folder."""
+    extension = {
+        EXPORT_FORMAT_CSV: "csv",
+        EXPORT_FORMAT_GPX: "gpx",
+        EXPORT_FORMAT_PARQUET: "parquet",
+    }[export_format]
+    return hass.config.path(DOMAIN, f"trips_{datetime.now():%Y%m%d_%H%M%S}.{extension}")
@@ -0,0 +1,165 @@
+"""Append-only files written from the executor."""
+
+import asyncio
+import logging
+import os
+import struct
+from datetime import datetime
+
+from homeassistant.core import HomeAssistant, callback
+
+from .const import DOMAIN
+
+_LOGGER = logging.getLogger(__name__)
+
+
+class PositionalWriter:
+    """Queue of writes at fixed file offsets, flushed in the executor.
+
+    Writes are queued from the event loop and written in order by a single
+    background task, so appends never wait for the disk.
+    """
+
+    def __init__(self, hass: HomeAssistant, path: str, name: str) -> None:
+        self.hass = hass
+        self.path = path
+        self._name = name
+        self._pending: list[tuple[int, bytes]] = []
+        self._flush_task: asyncio.Task | None = None
+
+    @callback
+    def async_write(self, offset: int, data: bytes) -> None:
+        """Queue a write and make sure a flush is running."""
+        self._pending.append((offset, data))
+        if self._flush_task is None:
+            self._flush_task = self.hass.async_create_background_task(
+                self._async_flush(), f"{DOMAIN}_{self._name}_flush"
+            )
+
+    async def _async_flush(self) -> None:
+        """Write queued data in order until the queue is empty."""
+        try:
+            while self._pending:
+                pending, self._pending = self._pending, []
+                await self.hass.async_add_executor_job(self._write, pending)
+        finally:
+            self._flush_task = None
+
+    def _write(self, pending: list[tuple[int, bytes]]) -> None:
+        """Write data at their offsets."""
+        os.makedirs(os.path.dirname(self.path), exist_ok=True)
+        fd = os.open(self.path, os.O_WRONLY | os.O_CREAT, 0o644)
+        try:
+            for offset, data in pending:
+                os.pwrite(fd, data, offset)
+        finally:
+            os.close(fd)
+
+    async def async_flush(self) -> None:
+        """Wait until every queued write has reached the disk."""
+        if self._flush_task is not None:
+            await asyncio.shield(self._flush_task)
+
+    @callback
+    def async_cancel(self) -> None:
+        """Drop the writes that are still queued."""
+        self._pending.clear()
+        if self._flush_task is not None:
+            self._flush_task.cancel()
+
+    async def async_remove(self) -> None:
+        """Cancel pending writes and delete the file."""
+        self.async_cancel()
+        await self.hass.async_add_executor_job(self._remove)
+
+    def _remove(self) -> None:
+        try:
+            os.remove(self.path)
+        except FileNotFoundError:
+            pass
+
+
+class OffsetStore:
+    """Append-only file of variable-length records, keyed by trip start.
+
+    Every record starts with ``header``, a struct of the start timestamp and
+    the number of ``item_size`` byte items that follow. Only the offset of
+    every record is kept in memory, so reading one reads that record only.
+    """
+
+    def __init__(
+        self,
+        hass: HomeAssistant,
+        path: str,
+        name: str,
+        header: struct.Struct,
+        item_size: int = 1,
+    ) -> None:
+        self.hass = hass
+        self.path = path
+        self._name = name
+        self._header = header
+        self._item_size = item_size
+        self._offsets: dict[float, int] = {}
+        self._size = 0
+        self._writer = PositionalWriter(hass, path, name)
+
+    def __contains__(self, start_time: str) -> bool:
+        return datetime.fromisoformat(start_time).timestamp() in self._offsets
+
+    async def async_load(self) -> None:
+        """Index the records in the file."""
+        await self.hass.async_add_executor_job(self._load)
+
+    def _load(self) -> None:
+        if not os.path.exists(self.path):
+            return
+        header = self._header
+        with open(self.path, "rb") as file:
+            file.seek(0, os.SEEK_END)
+            end = file.tell()
+            offset = 0
+            while offset + header.size <= end:
+                file.seek(offset)
+                start_ts, count = header.unpack(file.read(header.size))
+                size = header.size + count * self._item_size
+                if offset + size > end:
+                    # Partially written last record
+                    break
+                self._offsets[start_ts] = offset
+                offset += size
+        self._size = offset
+        _LOGGER.debug("Indexed %s %s in %s", len(self._offsets), self._name, self.path)
+
+    @callback
+    def _async_append(self, start_time: str, count: int, data: bytes) -> None:
+        """Queue a record of ``count`` items for writing."""
+        start_ts = datetime.fromisoformat(start_time).timestamp()
+        record = self._header.pack(start_ts, count) + data
+        self._offsets[start_ts] = self._size
+        self._writer.async_write(self._size, record)
+        self._size += len(record)
+
+    async def async_flush(self) -> None:
+        """Wait until every queued record has reached the disk."""
+        await self._writer.async_flush()
+
+    def _read(self, start_time: str) -> bytes | None:
+        """Return the items of the record of a trip.
+
+        Blocking; run it in the executor after ``async_flush``.
+        """
+        offset = self._offsets.get(datetime.fromisoformat(start_time).timestamp())
+        if offset is None:
+            return None
+        header = self._header
+        fd = os.open(self.path, os.O_RDONLY)
+        try:
+            _, count = header.unpack(os.pread(fd, header.size, offset))
+            return os.pread(fd, count * self._item_size, offset + header.size)
+        finally:
+            os.close(fd)
+
+    async def async_remove(self) -> None:
+        """Delete the file."""
+        await self._writer.async_remove()
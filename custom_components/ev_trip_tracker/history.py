@@ -0,0 +1,442 @@
+"""Append-only, time-indexed trip history store."""
+
+import logging
+import math
+import os
+import struct
+from array import array
+from bisect import bisect_left, bisect_right
+from collections.abc import Iterator
+from datetime import datetime, timezone
+
+from homeassistant.core import HomeAssistant, callback
+from homeassistant.helpers.storage import STORAGE_DIR
+
+from .const import (
+    DOMAIN,
+    ATTR_START_TIME,
+    ATTR_END_TIME,
+    ATTR_START_ODOMETER,
+    ATTR_END_ODOMETER,
+    ATTR_START_BATTERY,
+    ATTR_END_BATTERY,
+    ATTR_DISTANCE,
+    ATTR_ENERGY_USED,
+    ATTR_ENERGY_CONSUMPTION,
+    ATTR_AVG_SPEED,
+    ATTR_DURATION,
+    ATTR_DURATION_FORMATTED,
+    ATTR_START_ELEVATION,
+    ATTR_END_ELEVATION,
+    ATTR_ELEVATION_DIFF,
+    ATTR_START_TEMPERATURE,
+    ATTR_END_TEMPERATURE,
+    ATTR_AVG_TEMPERATURE,
+    ATTR_ROUTE_DISTANCE,
+    ATTR_ELEVATION_GAIN,
+    ATTR_ELEVATION_LOSS,
+    ATTR_ENERGY_REGENERATED,
+    ATTR_PRECIPITATION,
+    ATTR_AVG_WIND_SPEED,
+    ATTR_ENERGY_ADDED,
+    ATTR_AVG_POWER,
+    ATTR_PEAK_POWER,
+    ATTR_CHARGE_TYPE,
+    ATTR_LATITUDE,
+    ATTR_LONGITUDE,
+    ATTR_START_LATITUDE,
+    ATTR_START_LONGITUDE,
+    ATTR_END_LATITUDE,
+    ATTR_END_LONGITUDE,
+    CHARGE_TYPES,
+)
+from .filestore import PositionalWriter
+
+_LOGGER = logging.getLogger(__name__)
+
+MAGIC = b"EVTH"
+VERSION = 1
+READ_CHUNK_RECORDS = 4096
+
+RECORD_KIND_TRIP = 0
+RECORD_KIND_CHARGING = 1
+
+# (attribute, struct format, decimals kept when decoding)
+# Odometers need double precision, everything else fits a float32.
+_FIELDS = (
+    (ATTR_START_ODOMETER, "d", 2),
+    (ATTR_END_ODOMETER, "d", 2),
+    (ATTR_START_BATTERY, "f", 2),
+    (ATTR_END_BATTERY, "f", 2),
+    (ATTR_DISTANCE, "f", 2),
+    (ATTR_ENERGY_USED, "f", 2),
+    (ATTR_ENERGY_CONSUMPTION, "f", 2),
+    (ATTR_AVG_SPEED, "f", 1),
+    (ATTR_DURATION, "f", 2),
+    (ATTR_START_ELEVATION, "f", 1),
+    (ATTR_END_ELEVATION, "f", 1),
+    (ATTR_ELEVATION_DIFF, "f", 1),
+    (ATTR_START_TEMPERATURE, "f", 1),
+    (ATTR_END_TEMPERATURE, "f", 1),
+    (ATTR_AVG_TEMPERATURE, "f", 1),
+    (ATTR_ROUTE_DISTANCE, "f", 2),
+    (ATTR_ELEVATION_GAIN, "f", 1),
+    (ATTR_ELEVATION_LOSS, "f", 1),
+    (ATTR_ENERGY_REGENERATED, "f", 2),
+    (ATTR_PRECIPITATION, "f", 1),
+    (ATTR_AVG_WIND_SPEED, "f", 1),
+    (ATTR_ENERGY_ADDED, "f", 2),
+    (ATTR_AVG_POWER, "f", 2),
+    (ATTR_PEAK_POWER, "f", 2),
+    (ATTR_CHARGE_TYPE, "f", 0),
+    (ATTR_LATITUDE, "f", 5),
+    (ATTR_LONGITUDE, "f", 5),
+    (ATTR_START_LATITUDE, "f", 5),
+    (ATTR_START_LONGITUDE, "f", 5),
+    (ATTR_END_LATITUDE, "f", 5),
+    (ATTR_END_LONGITUDE, "f", 5),
+)
+# Text attributes stored as their index in the tuple
+_ENUMS = {ATTR_CHARGE_TYPE: CHARGE_TYPES}
+
+# kind, start timestamp, end timestamp, then the value fields
+_RECORD = struct.Struct("<B3xdd" + "".join(fmt for _, fmt, _ in _FIELDS))
+# Stored attributes of a trip and of a charging session, in record order
+CHARGING_FIELDS = (
+    ATTR_START_TIME,
+    ATTR_END_TIME,
+    ATTR_START_ODOMETER,
+    ATTR_END_ODOMETER,
+    ATTR_START_BATTERY,
+    ATTR_END_BATTERY,
+    ATTR_DURATION,
+    ATTR_ENERGY_ADDED,
+    ATTR_AVG_POWER,
+    ATTR_PEAK_POWER,
+    ATTR_CHARGE_TYPE,
+    ATTR_LATITUDE,
+    ATTR_LONGITUDE,
+)
+_CHARGING_ONLY = frozenset(CHARGING_FIELDS[7:])
+TRIP_FIELDS = (
+    ATTR_START_TIME,
+    ATTR_END_TIME,
+    *(name for name, _, _ in _FIELDS if name not in _CHARGING_ONLY),
+)
+_KIND_FIELDS = {
+    RECORD_KIND_TRIP: frozenset(TRIP_FIELDS),
+    RECORD_KIND_CHARGING: frozenset(CHARGING_FIELDS),
+}
+_HEADER = struct.Struct("<4sHHI")  # magic, version, record size, names length
+_FIELD_NAMES = ",".join(name for name, _, _ in _FIELDS).encode()
+
+
+def format_duration(seconds: float) -> str:
+    """Format a duration as H:MM:SS."""
+    hours, remainder = divmod(seconds, 3600)
+    minutes, seconds = divmod(remainder, 60)
+    return f"{int(hours)}:{int(minutes):02d}:{int(seconds):02d}"
+
+
+def encode_trip(trip: dict, kind: int = RECORD_KIND_TRIP) -> bytes:
+    """Pack a trip or charging session dict into a fixed-width record."""
+    values = []
+    for name, _, _ in _FIELDS:
+        value = trip.get(name)
+        if value is not None and name in _ENUMS:
+            value = _ENUMS[name].index(value)
+        values.append(math.nan if value is None else float(value))
+    return _RECORD.pack(
+        kind,
+        datetime.fromisoformat(trip[ATTR_START_TIME]).timestamp(),
+        datetime.fromisoformat(trip[ATTR_END_TIME]).timestamp(),
+        *values,
+    )
+
+
+def decode_trip(record: bytes | memoryview, offset: int = 0) -> dict:
+    """Unpack a fixed-width record into a trip or charging session dict."""
+    kind, start_ts, end_ts, *values = _RECORD.unpack_from(record, offset)
+    names = _KIND_FIELDS.get(kind, _KIND_FIELDS[RECORD_KIND_TRIP])
+    trip = {
+        ATTR_START_TIME: datetime.fromtimestamp(start_ts).isoformat(),
+        ATTR_END_TIME: datetime.fromtimestamp(end_ts).isoformat(),
+    }
+    for (name, _, ndigits), value in zip(_FIELDS, values):
+        if name not in names:
+            continue
+        if math.isnan(value):
+            trip[name] = None
+        elif name in _ENUMS:
+            trip[name] = _ENUMS[name][int(value)]
+        else:
+            trip[name] = round(value, ndigits)
+    trip[ATTR_DURATION_FORMATTED] = format_duration(end_ts - start_ts)
+    return trip
+
+
+class TripHistoryStore:
+    """Store completed trips as fixed-width records in an append-only file.
+
+    Records are only ever appended, or rewritten in place when a trip is
+    enriched after the fact. Charging sessions share the file with their own
+    record kind. An in-memory index of start and end timestamps per kind (20
+    bytes per record) answers range and overlap queries, so only the matching records are read
+    from disk. All file I/O runs in the executor.
+    """
+
+    def __init__(self, hass: HomeAssistant, entry_id: str) -> None:
+        self.hass = hass
+        self.path = hass.config.path(STORAGE_DIR, f"{DOMAIN}.{entry_id}.trips")
+        self._data_offset = 0
+        self._count = 0
+        # Per record kind, start timestamps in ascending order, the end
+        # timestamps and the record each belongs to
+        self._index: dict[int, tuple[array, array, array]] = {}
+        self._writer = PositionalWriter(hass, self.path, "history")
+        # Bumped by every write, so cached query results can tell they are stale
+        self.generation = 0
+
+    def __len__(self) -> int:
+        return self._count
+
+    def count(self, kind: int = RECORD_KIND_TRIP) -> int:
+        """Return the number of stored records of a kind."""
+        return len(self._kind_index(kind)[0])
+
+    def _kind_index(self, kind: int) -> tuple[array, array, array]:
+        index = self._index.get(kind)
+        if index is None:
+            index = self._index[kind] = (array("d"), array("d"), array("I"))
+        return index
+
+    async def async_load(self) -> None:
+        """Open the history file and build the time index."""
+        await self.hass.async_add_executor_job(self._load)
+        _LOGGER.debug("Loaded %s trips from %s", self._count, self.path)
+
+    def _load(self) -> None:
+        """Read the header and the start and end timestamps of every record."""
+        if not os.path.exists(self.path):
+            self._write_header()
+            return
+
+        with open(self.path, "rb") as file:
+            magic, version, record_size, names_length = _HEADER.unpack(
+                file.read(_HEADER.size)
+            )
+            names = file.read(names_length)
+        if magic != MAGIC:
+            raise ValueError(f"{self.path} is not a trip history file")
+        if version != VERSION or names != _FIELD_NAMES:
+            self._migrate(names.decode().split(","), record_size)
+            record_size = _RECORD.size
+            names_length = len(_FIELD_NAMES)
+
+        self._data_offset = _HEADER.size + names_length
+        keys = []
+        with open(self.path, "rb") as file:
+            file.seek(0, os.SEEK_END)
+            self._count = (file.tell() - self._data_offset) // record_size
+            file.seek(self._data_offset)
+            for first in range(0, self._count, READ_CHUNK_RECORDS):
+                chunk = file.read(
+                    min(READ_CHUNK_RECORDS, self._count - first) * record_size
+                )
+                keys.extend(
+                    struct.unpack_from("<B3xdd", chunk, offset)
+                    for offset in range(0, len(chunk), record_size)
+                )
+
+        self._index = {}
+        for position in sorted(range(len(keys)), key=keys.__getitem__):
+            kind, start_ts, end_ts = keys[position]
+            times, ends, positions = self._kind_index(kind)
+            times.append(start_ts)
+            ends.append(end_ts)
+            positions.append(position)
+
+    def _write_header(self) -> None:
+        """Create an empty history file."""
+        os.makedirs(os.path.dirname(self.path), exist_ok=True)
+        with open(self.path, "wb") as file:
+            file.write(
+                _HEADER.pack(MAGIC, VERSION, _RECORD.size, len(_FIELD_NAMES))
+                + _FIELD_NAMES
+            )
+        self._data_offset = _HEADER.size + len(_FIELD_NAMES)
+
+    def _migrate(self, old_names: list[str], old_record_size: int) -> None:
+        """Rewrite a file written with an older field layout."""
+        _LOGGER.info("Migrating trip history %s to the current layout", self.path)
+        old_format = "<B3xdd" + "".join(
+            next((fmt for name, fmt, _ in _FIELDS if name == old), "f")
+            for old in old_names
+        )
+        old_record = struct.Struct(old_format)
+        if old_record.size != old_record_size:
+            raise ValueError(f"{self.path} has an unknown record layout")
+
+        temp_path = f"{self.path}.migrate"
+        with open(self.path, "rb") as src, open(temp_path, "wb") as dst:
+            _, _, _, names_length = _HEADER.unpack(src.read(_HEADER.size))
+            src.seek(_HEADER.size + names_length)
+            dst.write(
+                _HEADER.pack(MAGIC, VERSION, _RECORD.size, len(_FIELD_NAMES))
+                + _FIELD_NAMES
+            )
+            while chunk := src.read(READ_CHUNK_RECORDS * old_record_size):
+                # Drop a partially written trailing record
+                chunk = chunk[: len(chunk) - len(chunk) % old_record_size]
+                out = bytearray()
+                for kind, start_ts, end_ts, *values in old_record.iter_unpack(chunk):
+                    old = dict(zip(old_names, values))
+                    out += _RECORD.pack(
+                        kind,
+                        start_ts,
+                        end_ts,
+                        *(old.get(name, math.nan) for name, _, _ in _FIELDS),
+                    )
+                dst.write(out)
+        os.replace(temp_path, self.path)
+
+    @callback
+    def async_append(self, trip: dict, kind: int = RECORD_KIND_TRIP) -> int:
+        """Queue a trip for writing and return its record number."""
+        record = encode_trip(trip, kind)
+        position = self._count
+        self._count += 1
+
+        start_ts = datetime.fromisoformat(trip[ATTR_START_TIME]).timestamp()
+        end_ts = datetime.fromisoformat(trip[ATTR_END_TIME]).timestamp()
+        times, ends, positions = self._kind_index(kind)
+        if not times or start_ts >= times[-1]:
+            times.append(start_ts)
+            ends.append(end_ts)
+            positions.append(position)
+        else:
+            # Older trip, e.g. from a backfill
+            index = bisect_right(times, start_ts)
+            times.insert(index, start_ts)
+            ends.insert(index, end_ts)
+            positions.insert(index, position)
+
+        self._queue_write(position, record)
+        return position
+
+    @callback
+    def async_update(
+        self, position: int, trip: dict, kind: int = RECORD_KIND_TRIP
+    ) -> None:
+        """Queue an in-place rewrite of an existing record."""
+        self._queue_write(position, encode_trip(trip, kind))
+
+    @callback
+    def _queue_write(self, position: int, record: bytes) -> None:
+        """Add a write to the queue."""
+        self.generation += 1
+        self._writer.async_write(self._data_offset + position * _RECORD.size, record)
+
+    async def async_flush(self) -> None:
+        """Wait until every queued write has reached the disk."""
+        await self._writer.async_flush()
+
+    async def async_get_range(
+        self,
+        start: datetime | None = None,
+        end: datetime | None = None,
+        limit: int | None = None,
+        newest_first: bool = False,
+        kind: int = RECORD_KIND_TRIP,
+    ) -> list[dict]:
+        """Return trips that started within [start, end)."""
+        positions = self.positions(start, end, kind)
+        if newest_first:
+            positions = positions[::-1]
+        if limit is not None:
+            positions = positions[:limit]
+        if not positions:
+            return []
+
+        await self.async_flush()
+        return await self.hass.async_add_executor_job(self._read, positions)
+
+    def positions(
+        self,
+        start: datetime | None = None,
+        end: datetime | None = None,
+        kind: int = RECORD_KIND_TRIP,
+    ) -> array:
+        """Return the record numbers of trips that started within [start, end)."""
+        return self.entries(start, end, kind)[1]
+
+    def entries(
+        self,
+        start: datetime | None = None,
+        end: datetime | None = None,
+        kind: int = RECORD_KIND_TRIP,
+    ) -> tuple[array, array]:
+        """Return the start timestamps and record numbers within [start, end)."""
+        times, _, positions = self._kind_index(kind)
+        low = bisect_left(times, start.timestamp()) if start else 0
+        high = bisect_left(times, end.timestamp()) if end else len(times)
+        return times[low:high], positions[low:high]
+
+    def has_trip_between(self, start: datetime, end: datetime) -> bool:
+        """Return whether a stored trip overlaps [start, end].
+
+        Stored trips do not overlap each other, so of the trips that started
+        before ``start`` only the last one can still reach into the window.
+        """
+        times, ends, _ = self._kind_index(RECORD_KIND_TRIP)
+        index = bisect_left(times, start.timestamp())
+        if index < len(times) and times[index] <= end.timestamp():
+            return True
+        return index > 0 and ends[index - 1] >= start.timestamp()
+
+    def first_start(self) -> datetime | None:
+        """Return the start of the oldest stored trip."""
+        times = self._kind_index(RECORD_KIND_TRIP)[0]
+        return datetime.fromtimestamp(times[0], timezone.utc) if times else None
+
+    async def async_get_last(
+        self, count: int, kind: int = RECORD_KIND_TRIP
+    ) -> list[dict]:
+        """Return the most recent trips, newest first."""
+        return await self.async_get_range(limit=count, newest_first=True, kind=kind)
+
+    async def async_read(self, positions) -> list[dict]:
+        """Return the trips at ``positions``, in that order."""
+        await self.async_flush()
+        return await self.hass.async_add_executor_job(self._read, positions)
+
+    def iter_chunks(self, positions) -> Iterator[list[dict]]:
+        """Yield the trips at ``positions`` a chunk at a time.
+
+        Blocking; run it in the executor after ``async_flush``.
+        """
+        for first in range(0, len(positions), READ_CHUNK_RECORDS):
+            yield self._read(positions[first : first + READ_CHUNK_RECORDS])
+
+    def _read(self, positions) -> list[dict]:
+        """Read records by position.
+
+        Callers match the trips to ``positions`` by order, so a record that
+        cannot be read raises instead of being left out.
+        """
+        size = _RECORD.size
+        trips = []
+        fd = os.open(self.path, os.O_RDONLY)
+        try:
+            for position in positions:
+                record = os.pread(fd, size, self._data_offset + position * size)
+                if len(record) != size:
+                    raise ValueError(f"Trip {position} of {self.path} is truncated")
+                trips.append(decode_trip(record))
+        finally:
+            os.close(fd)
+        return trips
+
+    async def async_remove(self) -> None:
+        """Delete the history file."""
+        await self._writer.async_remove()
@@ -0,0 +1,126 @@
+"""Load the stored data of a vehicle in the background after setup."""
+
+import asyncio
+import importlib
+import logging
+from collections.abc import Iterable
+
+from homeassistant.config_entries import ConfigEntry
+from homeassistant.core import HomeAssistant
+from homeassistant.exceptions import HomeAssistantError
+from homeassistant.helpers.dispatcher import async_dispatcher_send
+
+from .const import (
+    DOMAIN,
+    LOCATION_WARMUP_TRIPS,
+    SIGNAL_ENTRY_LOADED,
+    SIGNAL_FLEET_UPDATED,
+    ATTR_START_LATITUDE,
+    ATTR_START_LONGITUDE,
+    ATTR_START_ELEVATION,
+    ATTR_END_LATITUDE,
+    ATTR_END_LONGITUDE,
+    ATTR_END_ELEVATION,
+)
+from .history import RECORD_KIND_CHARGING
+from .location import async_get_location_client
+
+_LOGGER = logging.getLogger(__name__)
+
+# Built on numpy, so they are imported in the executor once the entities are
+# set up instead of while Home Assistant boots
+DEFERRED_MODULES = ("model", "route", "weather", "energy", "charging")
+
+
+def _import_deferred() -> None:
+    for name in DEFERRED_MODULES:
+        importlib.import_module(f".{name}", __package__)
+
+
+def _known_elevations(trips: list[dict]) -> list[tuple[float, float, float]]:
+    """Return the (lat, lon, elevation) of the trip starts and ends."""
+    points = []
+    for trip in trips:
+        for lat, lon, elevation in (
+            (ATTR_START_LATITUDE, ATTR_START_LONGITUDE, ATTR_START_ELEVATION),
+            (ATTR_END_LATITUDE, ATTR_END_LONGITUDE, ATTR_END_ELEVATION),
+        ):
+            if None not in (trip.get(lat), trip.get(lon), trip.get(elevation)):
+                points.append((trip[lat], trip[lon], trip[elevation]))
+    return points
+
+
+async def async_load_entry(hass: HomeAssistant, entry: ConfigEntry) -> None:
+    """Load the stores of a vehicle and warm the caches built on them.
+
+    Runs as a background task of the entry, so its entities are registered
+    at once and show their restored state until this is done. If loading
+    fails the entry is marked failed and its stored data sensors become
+    unavailable until it is reloaded.
+    """
+    data = hass.data[DOMAIN][entry.entry_id]
+    try:
+        await hass.async_add_executor_job(_import_deferred)
+        from .model import ConsumptionModel
+        from .route import RouteStore
+
+        data["model"] = ConsumptionModel(hass, entry.entry_id)
+        data["routes"] = RouteStore(hass, entry.entry_id)
+        await asyncio.gather(
+            data["history"].async_load(),
+            data["routes"].async_load(),
+            data["samples"].async_load(),
+            data["statistics"].async_load(),
+            data["model"].async_load(),
+            data["places"].async_load(),
+        )
+        # Flushing needs the history
+        await data["backlog"].async_load()
+
+        # Restore the last trip so it survives restarts
+        last_trips = await data["history"].async_get_last(LOCATION_WARMUP_TRIPS)
+        if last_trips:
+            data["last_trip"] = last_trips[0]
+        last_charges = await data["history"].async_get_last(1, RECORD_KIND_CHARGING)
+        if last_charges:
+            data["last_charge"] = last_charges[0]
+        # Trips mostly start and end at the same few places
+        async_get_location_client(hass).async_warm(_known_elevations(last_trips))
+    except Exception:
+        _LOGGER.exception(
+            "Failed to load the stored data of entry %s, reload it to retry",
+            entry.entry_id,
+        )
+        data["load_failed"] = True
+    else:
+        data["loaded"].set()
+        _LOGGER.debug(
+            "Loaded %s stored trips of entry %s",
+            data["history"].count(),
+            entry.entry_id,
+        )
+    async_dispatcher_send(hass, SIGNAL_ENTRY_LOADED.format(entry.entry_id))
+    async_dispatcher_send(hass, SIGNAL_FLEET_UPDATED)
+
+
+async def async_wait_loaded(hass: HomeAssistant, entry_ids: Iterable[str]) -> None:
+    """Wait until the stored data of the vehicles is loaded.
+
+    Raises HomeAssistantError if a vehicle failed to load it.
+    """
+    entries = hass.data.get(DOMAIN, {})
+    waiting = {
+        entry_id: entries[entry_id]
+        for entry_id in entry_ids
+        if entry_id in entries and not entries[entry_id]["loaded"].is_set()
+    }
+    if not waiting:
+        return
+    await asyncio.wait([data["loader"] for data in waiting.values()])
+    for entry_id, data in waiting.items():
+        if not data["loaded"].is_set():
+            entry = hass.config_entries.async_get_entry(entry_id)
+            raise HomeAssistantError(
+                f"The stored data of {entry.title if entry else entry_id} "
+                "failed to load, reload it to retry"
+            )
@@ -0,0 +1,393 @@
+"""Cached, coalescing Open-Meteo client for trip location data."""
+
+import asyncio
+import logging
+import random
+import time
+from collections import OrderedDict
+from collections.abc import Callable
+from datetime import datetime, timezone
+
+import aiohttp
+from homeassistant.core import HomeAssistant, callback
+from homeassistant.helpers.aiohttp_client import async_get_clientsession
+
+from .const import (
+    API_BACKOFF_MAX,
+    API_BACKOFF_MIN,
+    API_FAILURE_THRESHOLD,
+    DATA_LOCATION_CLIENT,
+    DEFAULT_TEMPERATURE_CACHE_TTL,
+    DEFAULT_WEATHER_API_URL,
+    LOCATION_REQUEST_TIMEOUT,
+)
+from .dem import ElevationTiles
+from .metrics import (
+    COUNTER_API_FAILURES,
+    COUNTER_API_REJECTED,
+    COUNTER_API_REQUESTS,
+    COUNTER_BREAKER_OPENED,
+    COUNTER_CACHE_HITS,
+    COUNTER_COALESCED,
+    METRIC_API_REQUEST,
+    Metrics,
+)
+
+_LOGGER = logging.getLogger(__name__)
+
+# ~150 m cells for elevation, ~5 km cells for temperature
+ELEVATION_PRECISION = 7
+TEMPERATURE_PRECISION = 5
+ELEVATION_CACHE_SIZE = 2048
+TEMPERATURE_CACHE_SIZE = 256
+
+_BASE32 = "0123456789bcdefghjkmnpqrstuvwxyz"
+
+
+def geohash_encode(lat: float, lon: float, precision: int) -> str:
+    """Encode a coordinate as a geohash of the given length."""
+    lat_lo, lat_hi = -90.0, 90.0
+    lon_lo, lon_hi = -180.0, 180.0
+    chars = []
+    bits = 0
+    value = 0
+    even = True
+    while len(chars) < precision:
+        if even:
+            mid = (lon_lo + lon_hi) / 2
+            if lon >= mid:
+                value = (value << 1) | 1
+                lon_lo = mid
+            else:
+                value <<= 1
+                lon_hi = mid
+        else:
+            mid = (lat_lo + lat_hi) / 2
+            if lat >= mid:
+                value = (value << 1) | 1
+                lat_lo = mid
+            else:
+                value <<= 1
+                lat_hi = mid
+        even = not even
+        bits += 1
+        if bits == 5:
+            chars.append(_BASE32[value])
+            bits = 0
+            value = 0
+    return "".join(chars)
+
+
+class LRUCache:
+    """Small ordered-dict LRU cache."""
+
+    def __init__(self, maxsize: int) -> None:
+        self._maxsize = maxsize
+        self._data: OrderedDict = OrderedDict()
+
+    def get(self, key):
+        try:
+            self._data.move_to_end(key)
+        except KeyError:
+            return None
+        return self._data[key]
+
+    def set(self, key, value) -> None:
+        self._data[key] = value
+        self._data.move_to_end(key)
+        if len(self._data) > self._maxsize:
+            self._data.popitem(last=False)
+
+    def __len__(self) -> int:
+        return len(self._data)
+
+
+def jittered_backoff(attempt: int) -> float:
+    """Return the delay before retry ``attempt``, counting from 1.
+
+    The delay doubles per attempt up to a maximum, and its upper half is
+    random so that installations that lost the API together do not all
+    retry at the same moment.
+    """
+    delay = min(API_BACKOFF_MAX, API_BACKOFF_MIN * 2 ** (attempt - 1))
+    return delay / 2 + random.uniform(0, delay / 2)
+
+
+class CircuitBreaker:
+    """Fail fast while an API is down.
+
+    After a few failed requests in a row the circuit opens and requests are
+    refused without waiting for a timeout. Once a jittered backoff has passed
+    one request is let through as a probe: success closes the circuit and
+    tells the listeners, failure opens it again for twice as long.
+    """
+
+    def __init__(self) -> None:
+        self.failures = 0
+        self.opened = 0
+        self._retry_at = 0.0
+        self._listeners: list[Callable[[], None]] = []
+
+    @property
+    def is_open(self) -> bool:
+        return self.opened > 0
+
+    def allow(self) -> bool:
+        """Return whether a request may be sent now."""
+        if not self.opened:
+            return True
+        now = time.monotonic()
+        if now < self._retry_at:
+            return False
+        # Hold off other requests while the probe is out
+        self._retry_at = now + LOCATION_REQUEST_TIMEOUT
+        return True
+
+    def retry_in(self) -> float:
+        """Return the seconds until the next probe is let through."""
+        return max(0.0, self._retry_at - time.monotonic()) if self.opened else 0.0
+
+    def record_success(self) -> None:
+        recovered = self.opened > 0
+        self.failures = self.opened = 0
+        if recovered:
+            for listener in list(self._listeners):
+                listener()
+
+    def record_failure(self) -> bool:
+        """Count a failed request, returns whether the circuit (re)opened."""
+        self.failures += 1
+        if not self.opened and self.failures < API_FAILURE_THRESHOLD:
+            return False
+        self.opened += 1
+        self._retry_at = time.monotonic() + jittered_backoff(self.opened)
+        return True
+
+    @callback
+    def async_add_listener(self, listener: Callable[[], None]) -> Callable[[], None]:
+        """Call ``listener`` when the circuit closes again."""
+        self._listeners.append(listener)
+        return lambda: self._listeners.remove(listener)
+
+
+class LocationDataClient:
+    """Serve elevation and temperature lookups from a grid-keyed cache.
+
+    Elevation never changes, so it is cached for the lifetime of Home Assistant.
+    Temperature is cached per coarser cell for a caller supplied TTL. Concurrent
+    lookups for the same cell share one in-flight request. When a directory of
+    DEM tiles is given, elevation is read from it first and the API is only
+    used for temperature and for places no tile covers. Every API URL has its
+    own circuit breaker, so lookups fail fast while it is down.
+    """
+
+    def __init__(self, hass: HomeAssistant) -> None:
+        self.hass = hass
+        self._elevations = LRUCache(ELEVATION_CACHE_SIZE)
+        self._temperatures = LRUCache(TEMPERATURE_CACHE_SIZE)
+        self._inflight: dict[tuple[str, str], asyncio.Task] = {}
+        self._timeout = aiohttp.ClientTimeout(total=LOCATION_REQUEST_TIMEOUT)
+        self._dems: dict[str, ElevationTiles] = {}
+        self._breakers: dict[str, CircuitBreaker] = {}
+        # API calls are rare, so these are always collected
+        self.metrics = Metrics(enabled=True)
+
+    async def async_get(
+        self,
+        lat: float,
+        lon: float,
+        temperature_ttl: float = DEFAULT_TEMPERATURE_CACHE_TTL,
+        dem_directory: str | None = None,
+        url: str = DEFAULT_WEATHER_API_URL,
+    ) -> dict:
+        """Return elevation and temperature for a coordinate."""
+        elevation_key = geohash_encode(lat, lon, ELEVATION_PRECISION)
+        temperature_key = elevation_key[:TEMPERATURE_PRECISION]
+
+        elevation = self._elevations.get(elevation_key)
+        if elevation is None and dem_directory:
+            elevation = await self.hass.async_add_executor_job(
+                self.get_dem(dem_directory).elevation, lat, lon
+            )
+            if elevation is not None:
+                self._elevations.set(elevation_key, elevation)
+        cached_temperature = self._temperatures.get(temperature_key)
+        if (
+            elevation is not None
+            and cached_temperature is not None
+            and time.monotonic() - cached_temperature[0] < temperature_ttl
+        ):
+            self.metrics.increment(COUNTER_CACHE_HITS)
+            return {"elevation": elevation, "temperature": cached_temperature[1]}
+
+        # Coalesced per API, so a request is never answered by another URL
+        inflight_key = (elevation_key, url)
+        task = self._inflight.get(inflight_key)
+        if task is not None:
+            self.metrics.increment(COUNTER_COALESCED)
+        else:
+            task = self.hass.async_create_background_task(
+                self._async_fetch(lat, lon, elevation_key, temperature_key, url),
+                f"{DATA_LOCATION_CLIENT}_{elevation_key}",
+            )
+            self._inflight[inflight_key] = task
+            task.add_done_callback(lambda _task: self._inflight.pop(inflight_key, None))
+
+        # Shield so one cancelled caller does not cancel the shared request
+        return await asyncio.shield(task)
+
+    async def async_get_hourly(
+        self,
+        points: list[tuple[float, float, float]],
+        variables: tuple[str, ...],
+        url: str = DEFAULT_WEATHER_API_URL,
+    ) -> list[dict] | None:
+        """Fetch hourly weather for several (timestamp, lat, lon) points at once.
+
+        Open-Meteo takes comma separated coordinates and answers with one
+        result per coordinate, each holding the hourly series of the days the
+        points span and the grid elevation. Returns None if the request fails.
+        """
+        days = sorted(
+            {
+                datetime.fromtimestamp(timestamp, timezone.utc).date().isoformat()
+                for timestamp, _, _ in points
+            }
+        )
+        params = {
+            "latitude": ",".join(f"{lat:.4f}" for _, lat, _ in points),
+            "longitude": ",".join(f"{lon:.4f}" for _, _, lon in points),
+            "hourly": ",".join(variables),
+            "timeformat": "unixtime",
+            "start_date": days[0],
+            "end_date": days[-1],
+        }
+        data = await self._async_request(url, params, "trip weather")
+        if data is None:
+            return None
+
+        locations = data if isinstance(data, list) else [data]
+        if len(locations) != len(points):
+            _LOGGER.warning(
+                "Unexpected trip weather response for %s points", len(points)
+            )
+            return None
+        for (_, lat, lon), location in zip(points, locations):
+            elevation_key = geohash_encode(lat, lon, ELEVATION_PRECISION)
+            if (
+                location.get("elevation") is not None
+                and self._elevations.get(elevation_key) is None
+            ):
+                self._elevations.set(elevation_key, location["elevation"])
+        return locations
+
+    def cached_elevation(self, lat: float, lon: float) -> float | None:
+        """Return the cached elevation of a coordinate."""
+        return self._elevations.get(geohash_encode(lat, lon, ELEVATION_PRECISION))
+
+    @callback
+    def async_warm(self, points: list[tuple[float, float, float]]) -> None:
+        """Seed the elevation cache with (lat, lon, elevation) of stored trips."""
+        for lat, lon, elevation in points:
+            elevation_key = geohash_encode(lat, lon, ELEVATION_PRECISION)
+            if self._elevations.get(elevation_key) is None:
+                self._elevations.set(elevation_key, elevation)
+
+    def breaker(self, url: str) -> CircuitBreaker:
+        """Return the circuit breaker of an API URL."""
+        breaker = self._breakers.get(url)
+        if breaker is None:
+            breaker = self._breakers[url] = CircuitBreaker()
+        return breaker
+
+    def get_dem(self, directory: str) -> ElevationTiles:
+        """Return the tile reader for a directory."""
+        dem = self._dems.get(directory)
+        if dem is None:
+            dem = self._dems[directory] = ElevationTiles(directory)
+        return dem
+
+    @callback
+    def async_close(self) -> None:
+        """Unmap any open elevation tiles."""
+        for dem in self._dems.values():
+            dem.close()
+        self._dems.clear()
+
+    async def _async_request(self, url: str, params: dict, what: str) -> dict | None:
+        """GET a JSON response through the circuit breaker of the URL.
+
+        Returns None when the request failed or was refused.
+        """
+        breaker = self.breaker(url)
+        if not breaker.allow():
+            self.metrics.increment(COUNTER_API_REJECTED)
+            return None
+        self.metrics.increment(COUNTER_API_REQUESTS)
+        start = time.perf_counter()
+        try:
+            session = async_get_clientsession(self.hass)
+            async with session.get(
+                url, params=params, timeout=self._timeout
+            ) as response:
+                response.raise_for_status()
+                data = await response.json()
+        except (aiohttp.ClientError, asyncio.TimeoutError, ValueError) as e:
+            self.metrics.increment(COUNTER_API_FAILURES)
+            if breaker.record_failure():
+                self.metrics.increment(COUNTER_BREAKER_OPENED)
+                _LOGGER.warning(
+                    "Failed to fetch %s: %s, pausing requests for %.0f seconds",
+                    what,
+                    e,
+                    breaker.retry_in(),
+                )
+            else:
+                _LOGGER.warning("Failed to fetch %s: %s", what, e)
+            return None
+        finally:
+            self.metrics.observe(
+                METRIC_API_REQUEST, (time.perf_counter() - start) * 1000
+            )
+        breaker.record_success()
+        return data
+
+    async def _async_fetch(
+        self,
+        lat: float,
+        lon: float,
+        elevation_key: str,
+        temperature_key: str,
+        url: str,
+    ) -> dict:
+        """Fetch from Open-Meteo and populate the caches."""
+        params = {
+            "latitude": lat,
+            "longitude": lon,
+            "current_weather": "true",
+        }
+        data = await self._async_request(url, params, "location data")
+        if data is None:
+            return {
+                "elevation": self._elevations.get(elevation_key),
+                "temperature": None,
+            }
+
+        # Keep an elevation read from local tiles over the coarser API one
+        elevation = self._elevations.get(elevation_key)
+        if elevation is None:
+            elevation = data.get("elevation")
+        temperature = data.get("current_weather", {}).get("temperature")
+        if elevation is not None:
+            self._elevations.set(elevation_key, elevation)
+        if temperature is not None:
+            self._temperatures.set(temperature_key, (time.monotonic(), temperature))
+        return {"elevation": elevation, "temperature": temperature}
+
+
+def async_get_location_client(hass: HomeAssistant) -> LocationDataClient:
+    """Return the location data client shared by all config entries."""
+    client = hass.data.get(DATA_LOCATION_CLIENT)
+    if client is None:
+        client = hass.data[DATA_LOCATION_CLIENT] = LocationDataClient(hass)
+    return client
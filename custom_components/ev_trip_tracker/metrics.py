@@ -0,0 +1,150 @@
+"""Counters and timing histograms for diagnostics."""
+
+import functools
+import time
+from bisect import bisect_left
+from collections.abc import Callable
+
+# Histograms, in milliseconds unless noted
+METRIC_DRIVING_HANDLER = "driving_handler_ms"
+METRIC_CHARGING_HANDLER = "charging_handler_ms"
+METRIC_START_TRIP = "start_trip_ms"
+METRIC_END_TRIP = "end_trip_ms"
+METRIC_ENRICHMENT = "enrichment_ms"
+METRIC_END_DELAY = "end_delay_s"
+METRIC_TIME_TO_ENRICHED = "time_to_enriched_s"
+METRIC_API_REQUEST = "api_request_ms"
+
+# Counters
+COUNTER_TRIPS_STARTED = "trips_started"
+COUNTER_TRIPS_COMPLETED = "trips_completed"
+COUNTER_DISCARDED_DISTANCE = "trips_discarded_distance"
+COUNTER_DISCARDED_DURATION = "trips_discarded_duration"
+COUNTER_END_CANCELLED = "trip_end_cancelled"
+COUNTER_CHARGING_ENDS = "trips_ended_by_charging"
+COUNTER_RESTORED = "trips_restored"
+COUNTER_DEADLINE_EXCEEDED = "enrichment_deadline_exceeded"
+COUNTER_STALE_READINGS = "stale_readings"
+COUNTER_TRIPS_CORRECTED = "trips_corrected"
+COUNTER_API_REQUESTS = "api_requests"
+COUNTER_API_FAILURES = "api_failures"
+COUNTER_API_REJECTED = "api_requests_rejected"
+COUNTER_BREAKER_OPENED = "api_circuit_opened"
+COUNTER_BACKLOG_ENRICHED = "backlog_trips_enriched"
+COUNTER_CACHE_HITS = "cache_hits"
+COUNTER_COALESCED = "coalesced_requests"
+
+# Upper bucket bounds, roughly three per decade from 10 us to 1 hour
+BUCKETS = tuple(
+    round(base * 10**exponent, 6)
+    for exponent in range(-2, 7)
+    for base in (1, 2.5, 5)
+    if base * 10**exponent <= 3600000
+)
+
+
+class Histogram:
+    """Fixed-bucket histogram; memory and update cost do not grow."""
+
+    __slots__ = ("counts", "count", "total", "max")
+
+    def __init__(self) -> None:
+        self.counts = [0] * (len(BUCKETS) + 1)
+        self.count = 0
+        self.total = 0.0
+        self.max = 0.0
+
+    def observe(self, value: float) -> None:
+        self.counts[bisect_left(BUCKETS, value)] += 1
+        self.count += 1
+        self.total += value
+        if value > self.max:
+            self.max = value
+
+    def percentile(self, fraction: float) -> float | None:
+        """Return the upper bound of the bucket holding the percentile."""
+        if not self.count:
+            return None
+        rank = fraction * self.count
+        seen = 0
+        for index, count in enumerate(self.counts):
+            seen += count
+            if seen >= rank and count:
+                return BUCKETS[index] if index < len(BUCKETS) else self.max
+        return self.max
+
+    def as_dict(self) -> dict:
+        return {
+            "count": self.count,
+            "mean": round(self.total / self.count, 3) if self.count else None,
+            "p50": self.percentile(0.5),
+            "p99": self.percentile(0.99),
+            "max": round(self.max, 3),
+        }
+
+
+class Metrics:
+    """Counters and histograms that cost a flag check while disabled."""
+
+    def __init__(self, enabled: bool = False) -> None:
+        self.enabled = enabled
+        self.counters: dict[str, int] = {}
+        self.histograms: dict[str, Histogram] = {}
+        self._listeners: list[Callable[[], None]] = []
+
+    def add_listener(self, listener: Callable[[], None]) -> Callable[[], None]:
+        """Call ``listener`` after every change, return a function to remove it."""
+        self._listeners.append(listener)
+        return lambda: self._listeners.remove(listener)
+
+    def _notify(self) -> None:
+        for listener in self._listeners:
+            listener()
+
+    def increment(self, name: str, amount: int = 1) -> None:
+        if self.enabled:
+            self.counters[name] = self.counters.get(name, 0) + amount
+            self._notify()
+
+    def observe(self, name: str, value: float) -> None:
+        if self.enabled:
+            histogram = self.histograms.get(name)
+            if histogram is None:
+                histogram = self.histograms[name] = Histogram()
+            histogram.observe(value)
+            self._notify()
+
+    def reset(self) -> None:
+        self.counters.clear()
+        self.histograms.clear()
+        self._notify()
+
+    def as_dict(self) -> dict:
+        return {
+            "enabled": self.enabled,
+            "counters": dict(sorted(self.counters.items())),
+            "histograms": {
+                name: histogram.as_dict()
+                for name, histogram in sorted(self.histograms.items())
+            },
+        }
+
+
+def timed(name: str):
+    """Record the run time of a method of an object with a ``metrics`` attribute."""
+
+    def decorator(func):
+        @functools.wraps(func)
+        def wrapper(self, *args, **kwargs):
+            metrics = self.metrics
+            if not metrics.enabled:
+                return func(self, *args, **kwargs)
+            start = time.perf_counter()
+            try:
+                return func(self, *args, **kwargs)
+            finally:
+                metrics.observe(name, (time.perf_counter() - start) * 1000)
+
+        return wrapper
+
+    return decorator
@@ -0,0 +1,216 @@
+"""Online consumption model, trained by recursive least squares per trip."""
+
+import logging
+import math
+
+import numpy as np
+
+from homeassistant.core import HomeAssistant, callback
+from homeassistant.helpers.dispatcher import async_dispatcher_send
+from homeassistant.helpers.storage import Store
+
+from .const import (
+    DOMAIN,
+    ATTR_DISTANCE,
+    ATTR_ENERGY_CONSUMPTION,
+    ATTR_AVG_SPEED,
+    ATTR_AVG_TEMPERATURE,
+    ATTR_ELEVATION_DIFF,
+    MODEL_FORGETTING,
+    MODEL_HUBER_K,
+    MODEL_REJECT,
+    MODEL_MIN_DISTANCE,
+    MODEL_MIN_TRIPS,
+    MODEL_REFERENCE_TEMPERATURE,
+    SIGNAL_MODEL_UPDATED,
+    STATISTICS_SAVE_DELAY,
+)
+
+_LOGGER = logging.getLogger(__name__)
+
+STORAGE_VERSION = 1
+
+FEATURES = ("intercept", "heating", "cooling", "speed", "speed_squared", "climb")
+
+
+def features(temperature: float | None, speed: float, climb: float) -> np.ndarray:
+    """Return the regressors for a trip.
+
+    Consumption rises below ~18 °C (heating) and above ~24 °C (air
+    conditioning), grows with speed and its square (drag), and with the
+    climb in metres per km. Everything is scaled to roughly unit size.
+    """
+    if temperature is None:
+        temperature = MODEL_REFERENCE_TEMPERATURE
+    return np.array(
+        (
+            1.0,
+            max(0.0, 18 - temperature) / 10,
+            max(0.0, temperature - 24) / 10,
+            speed / 100,
+            (speed / 100) ** 2,
+            climb / 10,
+        )
+    )
+
+
+def _running_mean(mean: float | None, value: float) -> float:
+    """Exponentially weighted mean over roughly the last 20 trips."""
+    return value if mean is None else mean + 0.05 * (value - mean)
+
+
+class RecursiveLeastSquares:
+    """Huber-weighted recursive least squares with exponential forgetting.
+
+    Each update costs O(d²) for d features, independent of the number of
+    trips. Residuals beyond ``MODEL_HUBER_K`` robust standard deviations are
+    down-weighted, and beyond ``MODEL_REJECT`` they are dropped once the
+    model has seen ``MODEL_MIN_TRIPS`` trips. The forgetting factor lets the
+    model follow seasons, tyres and battery ageing.
+    """
+
+    def __init__(self, size: int = len(FEATURES)) -> None:
+        self.theta = np.zeros(size)
+        self.p = np.eye(size) * 100
+        # Robust residual scale in kWh/100 km
+        self.scale = 5.0
+        self.count = 0
+        self.rejected = 0
+
+    def predict(self, x: np.ndarray) -> float:
+        return float(x @ self.theta)
+
+    def update(self, x: np.ndarray, y: float) -> bool:
+        """Fold in one observation, return False if it was rejected."""
+        error = y - self.predict(x)
+        if self.count >= MODEL_MIN_TRIPS and abs(error) > MODEL_REJECT * self.scale:
+            self.rejected += 1
+            return False
+        limit = MODEL_HUBER_K * self.scale
+        weight = 1.0 if abs(error) <= limit else limit / abs(error)
+
+        px = self.p @ x
+        gain = px / (MODEL_FORGETTING / weight + x @ px)
+        self.theta = self.theta + gain * error
+        self.p = (self.p - np.outer(gain, px)) / MODEL_FORGETTING
+        # Mean absolute deviation of the clipped residual, scaled to a sigma
+        self.scale += 0.1 * (1.25 * min(abs(error), limit) - self.scale)
+        self.count += 1
+        return True
+
+    def as_dict(self) -> dict:
+        return {
+            "theta": self.theta.tolist(),
+            "p": self.p.tolist(),
+            "scale": self.scale,
+            "count": self.count,
+            "rejected": self.rejected,
+        }
+
+    @classmethod
+    def from_dict(cls, data: dict) -> "RecursiveLeastSquares":
+        model = cls()
+        if len(data.get("theta", ())) == len(model.theta):
+            model.theta = np.array(data["theta"])
+            model.p = np.array(data["p"])
+            model.scale = data["scale"]
+            model.count = data["count"]
+            model.rejected = data.get("rejected", 0)
+        return model
+
+
+class ConsumptionModel:
+    """Per-entry consumption model, updated in O(1) per completed trip.
+
+    The coefficients are persisted with a debounced save, so predictions
+    never rescan the trip history.
+    """
+
+    def __init__(self, hass: HomeAssistant, entry_id: str) -> None:
+        self.hass = hass
+        self.entry_id = entry_id
+        self._store = Store(hass, STORAGE_VERSION, f"{DOMAIN}.{entry_id}.model")
+        self.rls = RecursiveLeastSquares()
+        # Running means of the trip speed and temperature, used when the
+        # prediction is asked without them
+        self.mean_speed: float | None = None
+        self.mean_temperature: float | None = None
+
+    async def async_load(self) -> None:
+        data = await self._store.async_load() or {}
+        self.rls = RecursiveLeastSquares.from_dict(data.get("rls", {}))
+        self.mean_speed = data.get("mean_speed")
+        self.mean_temperature = data.get("mean_temperature")
+
+    async def async_remove(self) -> None:
+        """Delete the persisted model."""
+        await self._store.async_remove()
+
+    @property
+    def ready(self) -> bool:
+        return self.rls.count >= MODEL_MIN_TRIPS
+
+    @callback
+    def async_add_trips(self, trips: list[dict]) -> None:
+        """Train on completed trips with a known consumption."""
+        changed = False
+        for trip in trips:
+            distance = trip.get(ATTR_DISTANCE)
+            consumption = trip.get(ATTR_ENERGY_CONSUMPTION)
+            speed = trip.get(ATTR_AVG_SPEED)
+            if (
+                not distance
+                or distance < MODEL_MIN_DISTANCE
+                or consumption is None
+                or not speed
+            ):
+                continue
+            climb = (trip.get(ATTR_ELEVATION_DIFF) or 0) / distance
+            x = features(trip.get(ATTR_AVG_TEMPERATURE), speed, climb)
+            if not self.rls.update(x, consumption):
+                _LOGGER.debug("Consumption of %s is an outlier, not learned", trip)
+                continue
+            self.mean_speed = _running_mean(self.mean_speed, speed)
+            if (temperature := trip.get(ATTR_AVG_TEMPERATURE)) is not None:
+                self.mean_temperature = _running_mean(
+                    self.mean_temperature, temperature
+                )
+            changed = True
+        if changed:
+            self._store.async_delay_save(self._data_to_save, STATISTICS_SAVE_DELAY)
+            async_dispatcher_send(self.hass, SIGNAL_MODEL_UPDATED.format(self.entry_id))
+
+    def predict(
+        self,
+        temperature: float | None,
+        speed: float | None = None,
+        climb: float = 0.0,
+    ) -> float | None:
+        """Return the expected consumption in kWh/100 km."""
+        speed = speed or self.mean_speed
+        if temperature is None:
+            temperature = self.mean_temperature
+        if not self.ready or speed is None:
+            return None
+        value = self.rls.predict(features(temperature, speed, climb))
+        return value if math.isfinite(value) and value > 0 else None
+
+    def as_attributes(self) -> dict:
+        return {
+            "trips_learned": self.rls.count,
+            "outliers_rejected": self.rls.rejected,
+            "residual_stddev": round(self.rls.scale, 2),
+            "mean_speed": (
+                round(self.mean_speed, 1) if self.mean_speed is not None else None
+            ),
+            "coefficients": dict(
+                zip(FEATURES, (round(value, 3) for value in self.rls.theta))
+            ),
+        }
+
+    def _data_to_save(self) -> dict:
+        return {
+            "rls": self.rls.as_dict(),
+            "mean_speed": self.mean_speed,
+            "mean_temperature": self.mean_temperature,
+        }
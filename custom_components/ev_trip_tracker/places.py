@@ -0,0 +1,382 @@
+"""Place labels from zones and frequently visited trip endpoints."""
+
+import logging
+import math
+from collections import deque
+
+from homeassistant.components.zone import DOMAIN as ZONE_DOMAIN, async_active_zone
+from homeassistant.components.zone.const import ATTR_RADIUS
+from homeassistant.const import ATTR_LATITUDE, ATTR_LONGITUDE
+from homeassistant.core import HomeAssistant, callback
+from homeassistant.helpers.dispatcher import async_dispatcher_send
+from homeassistant.helpers.storage import Store
+from homeassistant.util.location import distance
+
+from .const import (
+    DOMAIN,
+    ATTR_START_LOCATION,
+    ATTR_END_LOCATION,
+    ATTR_DISTANCE,
+    ATTR_ENERGY_CONSUMPTION,
+    ATTR_DURATION,
+    ATTR_START_LATITUDE,
+    ATTR_START_LONGITUDE,
+    ATTR_END_LATITUDE,
+    ATTR_END_LONGITUDE,
+    PLACE_CELL_SIZE,
+    PLACE_MIN_VISITS,
+    PLACE_MIN_RADIUS,
+    SIGNAL_PLACES_UPDATED,
+    STATISTICS_SAVE_DELAY,
+)
+from .statistics import RunningStats
+
+_LOGGER = logging.getLogger(__name__)
+
+STORAGE_VERSION = 1
+
+# Per route values that get a running mean and variance
+ROUTE_TRACKED = (ATTR_DISTANCE, ATTR_ENERGY_CONSUMPTION, ATTR_DURATION)
+
+
+def _cell(lat: float, lon: float) -> tuple[int, int]:
+    return math.floor(lat / PLACE_CELL_SIZE), math.floor(lon / PLACE_CELL_SIZE)
+
+
+def _key(cell: tuple[int, int]) -> str:
+    return f"{cell[0]}:{cell[1]}"
+
+
+def _neighbours(cell: tuple[int, int]):
+    row, col = cell
+    for d_row in (-1, 0, 1):
+        for d_col in (-1, 0, 1):
+            yield row + d_row, col + d_col
+
+
+class Place:
+    """A discovered place: centroid, radius and number of visits."""
+
+    __slots__ = ("name", "latitude", "longitude", "radius", "visits", "cells", "reach")
+
+    def __init__(
+        self, name: str, latitude: float, longitude: float, radius: float, visits: int
+    ) -> None:
+        self.name = name
+        self.latitude = latitude
+        self.longitude = longitude
+        self.radius = radius
+        self.visits = visits
+        # Member cells, and the lookup cells the radius reaches
+        self.cells: list[tuple[int, int]] = []
+        self.reach: tuple[tuple[int, int], tuple[int, int]] | None = None
+
+
+class PlaceIndex:
+    """Grid density clustering of trip endpoints with a grid lookup index.
+
+    Endpoints are counted per cell of ``PLACE_CELL_SIZE`` degrees, together
+    with their coordinate sums. Clustering is DBSCAN on the grid: a cell whose
+    3x3 neighbourhood holds at least ``PLACE_MIN_VISITS`` endpoints is a core
+    cell, touching core cells form one place, and non-core cells next to a
+    place are its border. Each place is registered in every cell its radius
+    reaches, so a lookup checks the few places of one cell, however many
+    places there are. An endpoint only reclusters the one place around it,
+    and only when it adds a core or border cell to it.
+    """
+
+    def __init__(self) -> None:
+        # cell -> [endpoints, latitude sum, longitude sum]
+        self._cells: dict[tuple[int, int], list] = {}
+        # densest cell key of a place -> its name, so names survive reclustering.
+        # Names are never reused.
+        self.names: dict[str, str] = {}
+        self._core: set[tuple[int, int]] = set()
+        self._place_of: dict[tuple[int, int], Place] = {}
+        self._grid: dict[tuple[int, int], list[Place]] = {}
+
+    @property
+    def places(self) -> list[Place]:
+        return list({id(place): place for place in self._place_of.values()}.values())
+
+    def add(self, lat: float, lon: float) -> bool:
+        """Count an endpoint, return True if the places changed."""
+        cell = _cell(lat, lon)
+        counts = self._cells.setdefault(cell, [0, 0.0, 0.0])
+        counts[0] += 1
+        counts[1] += lat
+        counts[2] += lon
+        # Only the neighbourhood sums around this cell changed
+        new_core = [
+            neighbour
+            for neighbour in _neighbours(cell)
+            if neighbour in self._cells
+            and neighbour not in self._core
+            and self._density(neighbour) >= PLACE_MIN_VISITS
+        ]
+        if not new_core:
+            if place := self._place_of.get(cell):
+                place.visits += 1
+                return False
+            # A new border cell joins the place next to it
+            core = next((n for n in _neighbours(cell) if n in self._core), None)
+            if core is None:
+                return False
+            self._build(core)
+            return True
+        self._core.update(new_core)
+        built = set()
+        for core in new_core:
+            if core not in built:
+                built.update(self._build(core).cells)
+        return True
+
+    def lookup(self, lat: float, lon: float) -> Place | None:
+        """Return the nearest place whose radius covers the point."""
+        best = None
+        best_distance = math.inf
+        for place in self._grid.get(_cell(lat, lon), ()):
+            meters = distance(lat, lon, place.latitude, place.longitude)
+            if meters <= place.radius and meters < best_distance:
+                best, best_distance = place, meters
+        return best
+
+    def cluster(self) -> None:
+        """Rebuild all places and the lookup grid from the cell counts."""
+        self._core = {
+            cell for cell in self._cells if self._density(cell) >= PLACE_MIN_VISITS
+        }
+        self._place_of = {}
+        self._grid = {}
+        built = set()
+        for cell in sorted(self._core, key=lambda cell: -self._cells[cell][0]):
+            if cell not in built:
+                built.update(self._build(cell).cells)
+
+    def _density(self, cell: tuple[int, int]) -> int:
+        return sum(
+            self._cells[neighbour][0]
+            for neighbour in _neighbours(cell)
+            if neighbour in self._cells
+        )
+
+    def _build(self, start: tuple[int, int]) -> Place:
+        """(Re)build the place of the core cells connected to ``start``."""
+        # Flood fill the touching core cells, then add the border cells
+        members = [start]
+        seen = {start}
+        queue = deque(members)
+        while queue:
+            for neighbour in _neighbours(queue.popleft()):
+                if neighbour in self._core and neighbour not in seen:
+                    seen.add(neighbour)
+                    members.append(neighbour)
+                    queue.append(neighbour)
+        # The places this one grew out of keep the name of the largest
+        old = {
+            id(place): place
+            for cell in members
+            if (place := self._place_of.get(cell)) is not None
+        }.values()
+        for place in old:
+            self._unregister(place)
+        members += {
+            neighbour
+            for cell in members
+            for neighbour in _neighbours(cell)
+            if neighbour in self._cells and neighbour not in self._core
+        }
+
+        cells = self._cells
+        visits = sum(cells[cell][0] for cell in members)
+        lat = sum(cells[cell][1] for cell in members) / visits
+        lon = sum(cells[cell][2] for cell in members) / visits
+        half_diagonal = distance(0, 0, PLACE_CELL_SIZE / 2, PLACE_CELL_SIZE / 2)
+        radius = max(
+            PLACE_MIN_RADIUS,
+            max(
+                distance(
+                    lat,
+                    lon,
+                    cells[cell][1] / cells[cell][0],
+                    cells[cell][2] / cells[cell][0],
+                )
+                for cell in members
+            )
+            + half_diagonal,
+        )
+        # The densest cell may have changed since the place was named
+        ranked = sorted(members, key=lambda cell: -cells[cell][0])
+        key = _key(ranked[0])
+        name = next(
+            (self.names[_key(cell)] for cell in ranked if _key(cell) in self.names),
+            None,
+        )
+        if name is None and old:
+            name = max(old, key=lambda place: place.visits).name
+        if name is None:
+            name = f"Place {len(set(self.names.values())) + 1}"
+        self.names[key] = name
+
+        place = Place(name, lat, lon, radius, visits)
+        place.cells = members
+        for cell in members:
+            self._place_of[cell] = place
+        # Register the place in every cell its radius reaches
+        reach_lat = radius / 111_320
+        reach_lon = reach_lat / max(math.cos(math.radians(lat)), 0.01)
+        place.reach = (
+            _cell(lat - reach_lat, lon - reach_lon),
+            _cell(lat + reach_lat, lon + reach_lon),
+        )
+        for cell in self._reach(place):
+            self._grid.setdefault(cell, []).append(place)
+        return place
+
+    def _unregister(self, place: Place) -> None:
+        for cell in place.cells:
+            if self._place_of.get(cell) is place:
+                del self._place_of[cell]
+        for cell in self._reach(place):
+            if (entries := self._grid.get(cell)) is not None:
+                entries.remove(place)
+                if not entries:
+                    del self._grid[cell]
+
+    @staticmethod
+    def _reach(place: Place):
+        low, high = place.reach
+        for row in range(low[0], high[0] + 1):
+            for col in range(low[1], high[1] + 1):
+                yield row, col
+
+    def as_dict(self) -> dict:
+        return {
+            "cells": {_key(cell): counts for cell, counts in self._cells.items()},
+            "names": self.names,
+        }
+
+    @classmethod
+    def from_dict(cls, data: dict) -> "PlaceIndex":
+        index = cls()
+        index._cells = {
+            tuple(map(int, key.split(":"))): counts
+            for key, counts in data.get("cells", {}).items()
+        }
+        index.names = data.get("names", {})
+        index.cluster()
+        return index
+
+
+class Places:
+    """Per-entry place labels and per route statistics.
+
+    Trip ends are labelled with the Home Assistant zone they are in, else
+    with the discovered place around them. Trips between two labelled
+    places are folded into running statistics per route.
+    """
+
+    def __init__(self, hass: HomeAssistant, entry_id: str) -> None:
+        self.hass = hass
+        self.entry_id = entry_id
+        self._store = Store(hass, STORAGE_VERSION, f"{DOMAIN}.{entry_id}.places")
+        self.index = PlaceIndex()
+        self.routes: dict[str, dict[str, RunningStats]] = {}
+        # Bumped whenever the places change, so cached labels can tell
+        self.generation = 0
+
+    async def async_load(self) -> None:
+        data = await self._store.async_load() or {}
+        self.index = PlaceIndex.from_dict(data)
+        self.generation += 1
+        self.routes = {
+            route: {name: RunningStats(*values) for name, values in stats.items()}
+            for route, stats in data.get("routes", {}).items()
+        }
+
+    async def async_remove(self) -> None:
+        """Delete the persisted places."""
+        await self._store.async_remove()
+
+    @callback
+    def async_label(self, position) -> str | None:
+        """Return the zone or place name of a (lat, lon) position."""
+        if not position or None in position:
+            return None
+        lat, lon = position
+        if (zone := async_active_zone(self.hass, lat, lon)) is not None:
+            return zone.name
+        place = self.index.lookup(lat, lon)
+        return place.name if place else None
+
+    @callback
+    def async_area(self, name: str) -> tuple[float, float, float] | None:
+        """Return latitude, longitude and radius of a zone or place by name."""
+        for state in self.hass.states.async_all(ZONE_DOMAIN):
+            if state.name == name:
+                return (
+                    state.attributes[ATTR_LATITUDE],
+                    state.attributes[ATTR_LONGITUDE],
+                    state.attributes[ATTR_RADIUS],
+                )
+        for place in self.index.places:
+            if place.name == name:
+                return place.latitude, place.longitude, place.radius
+        return None
+
+    @callback
+    def async_add_trip(self, trip: dict, start, end) -> None:
+        """Learn a trip's endpoints, label them and update its route.
+
+        ``start`` and ``end`` are (lat, lon) positions, or None if unknown.
+        """
+        for position in (start, end):
+            # Zones already name their endpoints
+            if (
+                position
+                and None not in position
+                and async_active_zone(self.hass, *position) is None
+                and self.index.add(*position)
+            ):
+                self.generation += 1
+        # Stored with the trip, so stored trips can be matched to places later
+        trip[ATTR_START_LATITUDE], trip[ATTR_START_LONGITUDE] = start or (None, None)
+        trip[ATTR_END_LATITUDE], trip[ATTR_END_LONGITUDE] = end or (None, None)
+        trip[ATTR_START_LOCATION] = self.async_label(start)
+        trip[ATTR_END_LOCATION] = self.async_label(end)
+        if trip[ATTR_START_LOCATION] and trip[ATTR_END_LOCATION]:
+            route = self.routes.setdefault(
+                f"{trip[ATTR_START_LOCATION]} → {trip[ATTR_END_LOCATION]}",
+                {name: RunningStats() for name in ROUTE_TRACKED},
+            )
+            for name, stats in route.items():
+                if trip.get(name) is not None:
+                    stats.add(trip[name])
+        self._store.async_delay_save(self._data_to_save, STATISTICS_SAVE_DELAY)
+        async_dispatcher_send(self.hass, SIGNAL_PLACES_UPDATED.format(self.entry_id))
+
+    def route_attributes(self, limit: int) -> dict:
+        """Return the most driven routes with their mean values."""
+        routes = sorted(
+            self.routes.items(),
+            key=lambda item: -item[1][ATTR_DISTANCE].count,
+        )[:limit]
+        return {
+            route: {
+                "trips": stats[ATTR_DISTANCE].count,
+                **{
+                    f"avg_{name}": round(value.mean, 2) if value.count else None
+                    for name, value in stats.items()
+                },
+            }
+            for route, stats in routes
+        }
+
+    def _data_to_save(self) -> dict:
+        return {
+            **self.index.as_dict(),
+            "routes": {
+                route: {name: value.as_list() for name, value in stats.items()}
+                for route, stats in self.routes.items()
+            },
+        }
@@ -0,0 +1,62 @@
+"""Throttled, change-only state publishing."""
+
+import time
+
+from homeassistant.core import HomeAssistant, callback
+from homeassistant.helpers.entity import Entity
+from homeassistant.helpers.event import async_call_later
+
+
+class ThrottledPublisher:
+    """Write an entity's state at most once per interval, and only if changed.
+
+    A throttled update that arrives too early is coalesced into one trailing
+    write at the end of the interval, so the last value is never lost.
+    Writes whose state and attributes equal the last published ones are
+    skipped entirely, which keeps the recorder and websocket traffic down.
+    """
+
+    def __init__(self, hass: HomeAssistant, entity: Entity, interval: float) -> None:
+        self.hass = hass
+        self._entity = entity
+        self._interval = interval
+        self._last_write = 0.0
+        self._last_published = None
+        self._unsub_trailing = None
+
+    @callback
+    def async_publish(self, force: bool = False) -> None:
+        """Publish now if allowed, otherwise schedule a trailing write."""
+        if force or time.monotonic() - self._last_write >= self._interval:
+            self._async_write()
+        elif self._unsub_trailing is None:
+            self._unsub_trailing = async_call_later(
+                self.hass,
+                self._interval - (time.monotonic() - self._last_write),
+                self._async_trailing_write,
+            )
+
+    @callback
+    def _async_trailing_write(self, _now) -> None:
+        self._unsub_trailing = None
+        self._async_write()
+
+    @callback
+    def _async_write(self) -> None:
+        if self._unsub_trailing:
+            self._unsub_trailing()
+            self._unsub_trailing = None
+        published = (self._entity.state, self._entity.extra_state_attributes)
+        if published == self._last_published:
+            return
+        # Attributes are rebuilt on every access, so keeping them is safe
+        self._last_published = published
+        self._last_write = time.monotonic()
+        self._entity.async_write_ha_state()
+
+    @callback
+    def async_cancel(self) -> None:
+        """Drop a pending trailing write."""
+        if self._unsub_trailing:
+            self._unsub_trailing()
+            self._unsub_trailing = None
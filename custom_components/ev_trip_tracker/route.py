@@ -0,0 +1,198 @@
+"""Route geometry computed from the location samples of a trip."""
+
+import struct
+from collections.abc import Callable
+
+import numpy as np
+from homeassistant.core import HomeAssistant, callback
+from homeassistant.helpers.storage import STORAGE_DIR
+
+from .const import (
+    DOMAIN,
+    ATTR_ROUTE_DISTANCE,
+    ATTR_ELEVATION_GAIN,
+    ATTR_ELEVATION_LOSS,
+    ROUTE_SIMPLIFY_TOLERANCE,
+)
+from .filestore import OffsetStore
+
+EARTH_RADIUS = 6371008.8  # metres
+# Vertical noise ignored when summing climb and descent, in metres
+GPS_ALTITUDE_TOLERANCE = 5.0
+DEM_ALTITUDE_TOLERANCE = 1.0
+# Samples in the moving average applied to GPS altitudes
+GPS_ALTITUDE_SMOOTHING = 5
+
+# start timestamp, number of points, then float32 latitude/longitude pairs
+_ROUTE_HEADER = struct.Struct("<dI")
+
+
+def _douglas_peucker(x: np.ndarray, y: np.ndarray, tolerance: float) -> np.ndarray:
+    """Return the indices of a planar polyline kept by Douglas-Peucker.
+
+    Each split measures the distance of a whole span to its chord in one
+    vectorized step.
+    """
+    count = len(x)
+    if count < 3:
+        return np.arange(count)
+    keep = np.zeros(count, dtype=bool)
+    keep[0] = keep[-1] = True
+    stack = [(0, count - 1)]
+    while stack:
+        first, last = stack.pop()
+        if last - first < 2:
+            continue
+        dx = x[last] - x[first]
+        dy = y[last] - y[first]
+        px = x[first + 1 : last] - x[first]
+        py = y[first + 1 : last] - y[first]
+        length = np.hypot(dx, dy)
+        if length == 0:
+            # Closed loop, fall back to the distance from the start point
+            distances = np.hypot(px, py)
+        else:
+            distances = np.abs(px * dy - py * dx) / length
+        index = int(np.argmax(distances))
+        if distances[index] > tolerance:
+            split = first + 1 + index
+            keep[split] = True
+            stack.append((first, split))
+            stack.append((split, last))
+    return np.flatnonzero(keep)
+
+
+def simplify(lat: np.ndarray, lon: np.ndarray, tolerance: float) -> np.ndarray:
+    """Return the indices of the route kept within ``tolerance`` metres.
+
+    Points are projected to a local equirectangular plane, which is accurate
+    enough over the extent of a car trip.
+    """
+    y = np.radians(lat) * EARTH_RADIUS
+    x = np.radians(lon) * EARTH_RADIUS * np.cos(np.radians(np.mean(lat)))
+    return _douglas_peucker(x, y, tolerance)
+
+
+def elevation_change(
+    distance: np.ndarray, altitude: np.ndarray, tolerance: float, smoothing: int = 1
+) -> tuple[float, float]:
+    """Return the cumulative climb and descent in metres.
+
+    The elevation profile is smoothed with a moving average and simplified
+    first, so noise smaller than ``tolerance`` does not add up over a long trip.
+    """
+    valid = ~np.isnan(altitude)
+    distance, altitude = distance[valid], altitude[valid]
+    if smoothing > 1 and len(altitude) > smoothing:
+        altitude = np.convolve(altitude, np.ones(smoothing) / smoothing, mode="valid")
+        distance = distance[smoothing // 2 : smoothing // 2 + len(altitude)]
+    if len(altitude) < 2:
+        return 0.0, 0.0
+    kept = _douglas_peucker(distance, altitude, tolerance)
+    steps = np.diff(altitude[kept])
+    return float(steps[steps > 0].sum()), float(-steps[steps < 0].sum())
+
+
+def _segment_lengths(lat: np.ndarray, lon: np.ndarray) -> np.ndarray:
+    """Return the haversine length of every segment in metres."""
+    phi = np.radians(lat)
+    dphi = np.diff(phi)
+    dlambda = np.radians(np.diff(lon))
+    a = (
+        np.sin(dphi / 2) ** 2
+        + np.cos(phi[:-1]) * np.cos(phi[1:]) * np.sin(dlambda / 2) ** 2
+    )
+    return 2 * EARTH_RADIUS * np.arcsin(np.sqrt(np.minimum(a, 1.0)))
+
+
+def compute_route(
+    latitudes,
+    longitudes,
+    altitudes,
+    elevation_lookup: Callable[[float, float], float | None] | None = None,
+    tolerance: float = ROUTE_SIMPLIFY_TOLERANCE,
+) -> tuple[dict, np.ndarray]:
+    """Compute route length, climb and descent in one pass over the samples.
+
+    Takes the sampled columns and returns the trip attributes and the
+    simplified polyline as an (n, 2) float32 array. When ``elevation_lookup``
+    is given (a local DEM), it replaces the noisier GPS altitude.
+    """
+    lat = np.asarray(latitudes, dtype=np.float64)
+    lon = np.asarray(longitudes, dtype=np.float64)
+    alt = np.asarray(altitudes, dtype=np.float64)
+    valid = ~(np.isnan(lat) | np.isnan(lon))
+    lat, lon, alt = lat[valid], lon[valid], alt[valid]
+    if len(lat) > 1:
+        # Drop samples where the car did not move
+        moved = np.concatenate(([True], (np.diff(lat) != 0) | (np.diff(lon) != 0)))
+        lat, lon, alt = lat[moved], lon[moved], alt[moved]
+    if len(lat) < 2:
+        return {}, np.empty((0, 2), dtype=np.float32)
+
+    distance = np.concatenate(([0.0], np.cumsum(_segment_lengths(lat, lon))))
+    attributes = {ATTR_ROUTE_DISTANCE: round(float(distance[-1]) / 1000, 2)}
+
+    altitude_tolerance = GPS_ALTITUDE_TOLERANCE
+    smoothing = GPS_ALTITUDE_SMOOTHING
+    if elevation_lookup is not None:
+        elevations = np.fromiter(
+            (elevation_lookup(a, b) for a, b in zip(lat, lon)),
+            dtype=np.float64,
+            count=len(lat),
+        )
+        if not np.isnan(elevations).all():
+            alt = elevations
+            altitude_tolerance = DEM_ALTITUDE_TOLERANCE
+            smoothing = 1
+    if not np.isnan(alt).all():
+        gain, loss = elevation_change(distance, alt, altitude_tolerance, smoothing)
+        attributes[ATTR_ELEVATION_GAIN] = round(gain, 1)
+        attributes[ATTR_ELEVATION_LOSS] = round(loss, 1)
+
+    kept = simplify(lat, lon, tolerance)
+    polyline = np.column_stack((lat[kept], lon[kept])).astype(np.float32)
+    return attributes, polyline
+
+
+class RouteStore(OffsetStore):
+    """Append-only file of simplified route polylines, keyed by trip start.
+
+    Routes vary in length, so they live next to the fixed-width trip history
+    rather than in it. Only the offset of every route is kept in memory.
+    """
+
+    def __init__(self, hass: HomeAssistant, entry_id: str) -> None:
+        super().__init__(
+            hass,
+            hass.config.path(STORAGE_DIR, f"{DOMAIN}.{entry_id}.routes"),
+            "routes",
+            _ROUTE_HEADER,
+            item_size=8,
+        )
+
+    @callback
+    def async_append(self, start_time: str, polyline: np.ndarray) -> None:
+        """Queue a route for writing."""
+        self._async_append(
+            start_time, len(polyline), polyline.astype("<f4").tobytes(order="C")
+        )
+
+    async def async_get(self, start_time: str) -> list[list[float]] | None:
+        """Return the route of the trip that started at ``start_time``."""
+        if start_time not in self:
+            return None
+        await self.async_flush()
+        points = await self.hass.async_add_executor_job(self.read, start_time)
+        # float32 holds about five decimals of a coordinate, about a metre
+        return np.round(points.astype(np.float64), 5).tolist()
+
+    def read(self, start_time: str) -> np.ndarray | None:
+        """Return the route of a trip as an (n, 2) float32 array of lat, lon.
+
+        Blocking; run it in the executor after ``async_flush``.
+        """
+        data = self._read(start_time)
+        if data is None:
+            return None
+        return np.frombuffer(data, dtype="<f4").reshape(-1, 2)
@@ -0,0 +1,292 @@
+"""Bounded in-trip telemetry sampling."""
+
+import logging
+import math
+import time
+from array import array
+from collections.abc import Callable
+
+from homeassistant.core import HomeAssistant, callback
+
+from .const import (
+    CONF_ODOMETER_SENSOR,
+    CONF_BATTERY_SENSOR,
+    CONF_LOCATION_TRACKER,
+    CONF_TEMPERATURE_SENSOR,
+    CONF_POWER_SENSOR,
+    CONF_BATTERY_ENERGY_SENSOR,
+    CONF_TEMPERATURE_CACHE_TTL,
+    DEFAULT_TEMPERATURE_CACHE_TTL,
+    CONF_WEATHER_API_URL,
+    DEFAULT_WEATHER_API_URL,
+    CONF_WEATHER_MODE,
+    WEATHER_MODE_TRIP,
+    SAMPLE_CAPACITY,
+    SAMPLE_MIN_INTERVAL,
+)
+from .coordinator import async_get_coordinator
+from .location import TEMPERATURE_PRECISION, async_get_location_client, geohash_encode
+
+_LOGGER = logging.getLogger(__name__)
+
+COLUMN_TIME = "time"
+COLUMN_ODOMETER = "odometer"
+COLUMN_BATTERY = "battery"
+COLUMN_LATITUDE = "latitude"
+COLUMN_LONGITUDE = "longitude"
+COLUMN_TEMPERATURE = "temperature"
+COLUMN_ALTITUDE = "altitude"
+COLUMN_POWER = "power"
+COLUMN_BATTERY_ENERGY = "battery_energy"
+
+COLUMNS = (
+    COLUMN_TIME,
+    COLUMN_ODOMETER,
+    COLUMN_BATTERY,
+    COLUMN_LATITUDE,
+    COLUMN_LONGITUDE,
+    COLUMN_TEMPERATURE,
+    COLUMN_ALTITUDE,
+    COLUMN_POWER,
+    COLUMN_BATTERY_ENERGY,
+)
+
+# Stored in kW and kWh
+_UNIT_SCALE = {"W": 0.001, "Wh": 0.001, "kW": 1.0, "kWh": 1.0}
+
+
+def _to_float(value) -> float:
+    """Convert a state value to float, NaN if unavailable."""
+    try:
+        return float(value)
+    except (TypeError, ValueError):
+        return math.nan
+
+
+def sample_entities(config: dict) -> dict[str, str]:
+    """Return the sampled entities of a vehicle and the column each feeds."""
+    entities = {
+        config[CONF_ODOMETER_SENSOR]: COLUMN_ODOMETER,
+        config[CONF_BATTERY_SENSOR]: COLUMN_BATTERY,
+        config[CONF_LOCATION_TRACKER]: COLUMN_LATITUDE,
+    }
+    if temperature_sensor := config.get(CONF_TEMPERATURE_SENSOR):
+        entities[temperature_sensor] = COLUMN_TEMPERATURE
+    if power_sensor := config.get(CONF_POWER_SENSOR):
+        entities[power_sensor] = COLUMN_POWER
+    if battery_energy_sensor := config.get(CONF_BATTERY_ENERGY_SENSOR):
+        entities[battery_energy_sensor] = COLUMN_BATTERY_ENERGY
+    return entities
+
+
+def read_state(current: dict, column: str, state) -> None:
+    """Update the current sample values from the state of a sampled entity."""
+    if column == COLUMN_LATITUDE:
+        current[COLUMN_LATITUDE] = _to_float(state.attributes.get("latitude"))
+        current[COLUMN_LONGITUDE] = _to_float(state.attributes.get("longitude"))
+        current[COLUMN_ALTITUDE] = _to_float(state.attributes.get("altitude"))
+    elif column in (COLUMN_POWER, COLUMN_BATTERY_ENERGY):
+        current[column] = _to_float(state.state) * _UNIT_SCALE.get(
+            state.attributes.get("unit_of_measurement"), 1.0
+        )
+    else:
+        current[column] = _to_float(state.state)
+
+
+class SampleBuffer:
+    """Fixed-capacity columnar buffer of trip samples.
+
+    Every column is a preallocated ``array('d')``, so memory is fixed at
+    ``capacity * len(columns) * 8`` bytes. Unlike a ring buffer that drops the
+    oldest samples, the buffer halves its resolution when full: every other
+    sample is dropped and the minimum interval between samples doubles. A long
+    trip therefore keeps evenly spread samples from start to end.
+    """
+
+    def __init__(
+        self,
+        columns: tuple[str, ...] = COLUMNS,
+        capacity: int = SAMPLE_CAPACITY,
+        min_interval: float = SAMPLE_MIN_INTERVAL,
+    ) -> None:
+        self.capacity = capacity
+        self.min_interval = min_interval
+        self._columns = {name: array("d", bytes(8 * capacity)) for name in columns}
+        self._length = 0
+
+    def __len__(self) -> int:
+        return self._length
+
+    def column(self, name: str) -> array:
+        """Return a copy of the filled part of a column."""
+        return self._columns[name][: self._length]
+
+    def add(self, timestamp: float, values: dict) -> None:
+        """Add a sample, merging it into the previous one if too close."""
+        times = self._columns[COLUMN_TIME]
+        # The newest sample keeps sliding forward until it is far enough from
+        # the one before it, so the buffer always ends with the latest values
+        if (
+            self._length >= 2
+            and timestamp - times[self._length - 2] < self.min_interval
+        ):
+            index = self._length - 1
+        else:
+            if self._length == self.capacity:
+                self._decimate()
+            index = self._length
+            self._length += 1
+
+        times[index] = timestamp
+        for name, column in self._columns.items():
+            if name != COLUMN_TIME:
+                column[index] = values.get(name, math.nan)
+
+    def _decimate(self) -> None:
+        """Drop every other sample, keeping the last, and halve the rate."""
+        keep = list(range(0, self._length - 1, 2))
+        keep.append(self._length - 1)
+        for column in self._columns.values():
+            for new, old in enumerate(keep):
+                column[new] = column[old]
+        self._length = len(keep)
+        self.min_interval = max(self.min_interval * 2, 1.0)
+        _LOGGER.debug(
+            "Sample buffer full, keeping one sample per %s seconds", self.min_interval
+        )
+
+    def time_weighted_mean(
+        self,
+        name: str,
+        first: tuple[float, float | None] | None = None,
+        last: tuple[float, float | None] | None = None,
+    ) -> float | None:
+        """Return the trapezoidal time-weighted mean of a column.
+
+        ``first`` and ``last`` are optional (timestamp, value) points added
+        before and after the buffered samples.
+        """
+        points = []
+        if first and first[1] is not None:
+            points.append(first)
+        times = self._columns[COLUMN_TIME]
+        values = self._columns[name]
+        points.extend(
+            (times[i], values[i])
+            for i in range(self._length)
+            if not math.isnan(values[i])
+        )
+        if last and last[1] is not None:
+            points.append(last)
+
+        if not points:
+            return None
+        area = 0.0
+        span = 0.0
+        for (t0, v0), (t1, v1) in zip(points, points[1:]):
+            dt = t1 - t0
+            if dt > 0:
+                area += (v0 + v1) / 2 * dt
+                span += dt
+        if span == 0:
+            return sum(value for _, value in points) / len(points)
+        return area / span
+
+
+class TripSampler:
+    """Sample odometer, battery, location and temperature during a trip."""
+
+    def __init__(
+        self,
+        hass: HomeAssistant,
+        config: dict,
+        on_sample: Callable[[dict], None] | None = None,
+        weather: bool = True,
+    ) -> None:
+        self.hass = hass
+        self._config = config
+        self._on_sample = on_sample
+        self._weather = weather
+        self.buffer = SampleBuffer()
+        self._current = dict.fromkeys(COLUMNS[1:], math.nan)
+        self._entities = sample_entities(config)
+        self._unsub = None
+        self._temperature_cell = None
+        self._temperature_task = None
+
+    @callback
+    def async_start(self) -> None:
+        """Seed the buffer with the current states and start listening."""
+        now = time.time()
+        for entity_id in self._entities:
+            if state := self.hass.states.get(entity_id):
+                self._update(entity_id, state, now)
+        self._unsub = async_get_coordinator(self.hass).async_track(
+            list(self._entities), self._handle_state_change
+        )
+
+    @callback
+    def async_stop(self) -> SampleBuffer:
+        """Stop listening and return the collected samples."""
+        if self._unsub:
+            self._unsub()
+            self._unsub = None
+        if self._temperature_task:
+            self._temperature_task.cancel()
+            self._temperature_task = None
+        return self.buffer
+
+    @callback
+    def _handle_state_change(self, event) -> None:
+        """Record a sample for a tracked entity."""
+        new_state = event.data.get("new_state")
+        if new_state is None:
+            return
+        self._update(event.data["entity_id"], new_state)
+
+    @callback
+    def _update(self, entity_id: str, state, timestamp: float | None = None) -> None:
+        """Update the current values and append a sample."""
+        column = self._entities[entity_id]
+        read_state(self._current, column, state)
+        if column == COLUMN_LATITUDE and not (
+            not self._weather
+            or COLUMN_TEMPERATURE in self._entities.values()
+            or self._config.get(CONF_WEATHER_MODE) == WEATHER_MODE_TRIP
+            or math.isnan(self._current[COLUMN_LATITUDE])
+            or math.isnan(self._current[COLUMN_LONGITUDE])
+        ):
+            self._sample_weather(
+                self._current[COLUMN_LATITUDE], self._current[COLUMN_LONGITUDE]
+            )
+        self.buffer.add(timestamp or state.last_updated.timestamp(), self._current)
+        if self._on_sample:
+            self._on_sample(self._current)
+
+    @callback
+    def _sample_weather(self, lat: float, lon: float) -> None:
+        """Look up the temperature when the car enters a new weather cell."""
+        cell = geohash_encode(lat, lon, TEMPERATURE_PRECISION)
+        if cell == self._temperature_cell or self._temperature_task:
+            return
+        self._temperature_cell = cell
+        self._temperature_task = self.hass.async_create_background_task(
+            self._async_sample_weather(lat, lon), f"{__name__}_temperature"
+        )
+
+    async def _async_sample_weather(self, lat: float, lon: float) -> None:
+        """Fetch the temperature for the current cell and record it."""
+        try:
+            data = await async_get_location_client(self.hass).async_get(
+                lat,
+                lon,
+                self._config.get(
+                    CONF_TEMPERATURE_CACHE_TTL, DEFAULT_TEMPERATURE_CACHE_TTL
+                ),
+                url=self._config.get(CONF_WEATHER_API_URL, DEFAULT_WEATHER_API_URL),
+            )
+        finally:
+            self._temperature_task = None
+        if data.get("temperature") is not None and self._unsub:
+            self._current[COLUMN_TEMPERATURE] = data["temperature"]
+            self.buffer.add(time.time(), self._current)
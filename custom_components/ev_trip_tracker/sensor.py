@@ -1,13 +1,31 @@
+import asyncio
 import logging
-from datetime import datetime
+import math
+import time
+from abc import ABC, abstractmethod
+from datetime import datetime, timedelta, timezone
 from homeassistant.components.sensor import SensorEntity
 from homeassistant.config_entries import ConfigEntry
-from homeassistant.core import HomeAssistant, callback
+from homeassistant.const import (
+    MATCH_ALL,
+    STATE_UNAVAILABLE,
+    STATE_UNKNOWN,
+    EntityCategory,
+)
+from homeassistant.core import HomeAssistant, State, callback
+from homeassistant.exceptions import HomeAssistantError
+from homeassistant.helpers.dispatcher import (
+    async_dispatcher_connect,
+    async_dispatcher_send,
+)
 from homeassistant.helpers.entity_platform import AddEntitiesCallback
-from homeassistant.helpers.event import async_track_state_change_event
-from homeassistant.helpers.aiohttp_client import async_get_clientsession
+from homeassistant.helpers.restore_state import RestoreEntity
+from homeassistant.helpers.storage import Store
+from homeassistant.util import dt as dt_util
 from homeassistant.helpers.event import async_call_later
 from .const import (
+    DRIVING_STATES,
+    CHARGING_STATES,
     DOMAIN,
     CONF_ODOMETER_SENSOR,
     CONF_BATTERY_SENSOR,
@@ -16,11 +34,45 @@ from .const import (
     CONF_DRIVING_STATE_SENSOR,
     CONF_BATTERY_CAPACITY,
     CONF_TRIP_END_DELAY,
+    CONF_LOCK_SENSOR,
+    CONF_PLUG_SENSOR,
+    CONF_ADAPTIVE_TRIP_END,
     CONF_MIN_TRIP_DISTANCE,
     DEFAULT_MIN_TRIP_DISTANCE,
     CONF_MIN_TRIP_DURATION,
     DEFAULT_MIN_TRIP_DURATION,
     DEFAULT_TRIP_END_DELAY,
+    CONF_TEMPERATURE_CACHE_TTL,
+    DEFAULT_TEMPERATURE_CACHE_TTL,
+    CONF_WEATHER_API_URL,
+    DEFAULT_WEATHER_API_URL,
+    ENRICHMENT_DEADLINE,
+    FRESH_READING_TIMEOUT,
+    FRESH_READING_CORRECTION,
+    FRESH_READING_GRACE,
+    EVENT_TRIP_COMPLETED,
+    EVENT_TRIP_ENRICHED,
+    SIGNAL_LAST_TRIP_UPDATED,
+    SIGNAL_STATISTICS_UPDATED,
+    SIGNAL_FLEET_UPDATED,
+    SIGNAL_MODEL_UPDATED,
+    SIGNAL_PLACES_UPDATED,
+    SIGNAL_ENTRY_LOADED,
+    PLACE_ROUTES_SHOWN,
+    CHECKPOINT_STORAGE_KEY,
+    CHECKPOINT_SAVE_DELAY,
+    CONF_COMPACT_ATTRIBUTES,
+    CONF_DIAGNOSTICS,
+    CONF_WEATHER_MODE,
+    CONF_TEMPERATURE_SENSOR,
+    DEFAULT_WEATHER_MODE,
+    WEATHER_MODE_TRIP,
+    CONF_DEM_PATH,
+    PUBLISH_INTERVAL,
+    PERIOD_DAY,
+    PERIOD_WEEK,
+    PERIOD_MONTH,
+    PERIOD_LIFETIME,
     ATTR_START_TIME,
     ATTR_END_TIME,
     ATTR_START_ODOMETER,
@@ -41,11 +93,99 @@ from .const import (
     ATTR_END_TEMPERATURE,
     ATTR_AVG_TEMPERATURE,
     ATTR_START_TEMPERATURE,
+    ATTR_SAMPLE_COUNT,
+    ATTR_LATITUDE,
+    ATTR_LONGITUDE,
+    ATTR_ENERGY_ADDED,
+    EVENT_CHARGING_COMPLETED,
+    MIN_CHARGING_DURATION,
+)
+from .barrier import async_wait_fresh, is_fresh
+from .coordinator import async_get_coordinator
+from .end_detector import TripEndDetector, in_zone, is_locked, is_plugged, stop_cell
+from .location import async_get_location_client
+from .metrics import (
+    COUNTER_CHARGING_ENDS,
+    COUNTER_DEADLINE_EXCEEDED,
+    COUNTER_DISCARDED_DISTANCE,
+    COUNTER_DISCARDED_DURATION,
+    COUNTER_END_CANCELLED,
+    COUNTER_RESTORED,
+    COUNTER_STALE_READINGS,
+    COUNTER_TRIPS_CORRECTED,
+    COUNTER_TRIPS_COMPLETED,
+    COUNTER_TRIPS_STARTED,
+    METRIC_CHARGING_HANDLER,
+    METRIC_DRIVING_HANDLER,
+    METRIC_END_DELAY,
+    METRIC_END_TRIP,
+    METRIC_ENRICHMENT,
+    METRIC_START_TRIP,
+    METRIC_TIME_TO_ENRICHED,
+    timed,
+)
+from .publisher import ThrottledPublisher
+from .sampler import (
+    COLUMNS,
+    COLUMN_ALTITUDE,
+    COLUMN_BATTERY,
+    COLUMN_LATITUDE,
+    COLUMN_LONGITUDE,
+    COLUMN_ODOMETER,
+    SampleBuffer,
+    TripSampler,
 )
 
 _LOGGER = logging.getLogger(__name__)
 
 
+# Raw readings and derived values; the full trip is kept in the trip history
+UNRECORDED_TRIP_ATTRIBUTES = frozenset(
+    {
+        ATTR_START_ODOMETER,
+        ATTR_END_ODOMETER,
+        ATTR_START_BATTERY,
+        ATTR_END_BATTERY,
+        ATTR_START_ELEVATION,
+        ATTR_END_ELEVATION,
+        ATTR_START_TEMPERATURE,
+        ATTR_END_TEMPERATURE,
+        ATTR_DURATION_FORMATTED,
+        ATTR_SAMPLE_COUNT,
+    }
+)
+
+# Attributes published in compact mode
+COMPACT_TRIP_ATTRIBUTES = (
+    ATTR_START_TIME,
+    ATTR_END_TIME,
+    ATTR_DISTANCE,
+    ATTR_ENERGY_USED,
+    ATTR_ENERGY_CONSUMPTION,
+    ATTR_DURATION,
+    ATTR_AVG_SPEED,
+    ATTR_ELEVATION_DIFF,
+    ATTR_AVG_TEMPERATURE,
+)
+
+
+def trip_attributes(trip: dict, compact: bool) -> dict:
+    """Return the public state attributes for a trip."""
+    if compact:
+        return {name: trip[name] for name in COMPACT_TRIP_ATTRIBUTES if name in trip}
+    return {name: value for name, value in trip.items() if not name.startswith("_")}
+
+
+def state_value(state: State | None) -> float | None:
+    """Return a numeric sensor state, None while it is missing or not a number."""
+    if state is None:
+        return None
+    try:
+        return float(state.state)
+    except ValueError:
+        return None
+
+
 async def async_setup_entry(
     hass: HomeAssistant,
     entry: ConfigEntry,
@@ -55,14 +195,44 @@ async def async_setup_entry(
     config = entry.data
 
     current_trip_sensor = EVCurrentTripSensor(hass, entry, config)
+    # Read by the diagnostics download
+    hass.data[DOMAIN][entry.entry_id]["current_trip_sensor"] = current_trip_sensor
     last_trip_sensor = EVLastTripSensor(hass, entry)
+    statistics_sensors = [
+        EVTripStatisticsSensor(hass, entry, period)
+        for period in (PERIOD_DAY, PERIOD_WEEK, PERIOD_MONTH, PERIOD_LIFETIME)
+    ]
+
+    async_add_entities(
+        [
+            current_trip_sensor,
+            last_trip_sensor,
+            EVChargingSessionSensor(hass, entry),
+            EVPredictedConsumptionSensor(hass, entry),
+            EVPredictedRangeSensor(hass, entry),
+            EVPlacesSensor(hass, entry),
+            *statistics_sensors,
+            EVTripDiagnosticsSensor(hass, entry),
+        ]
+    )
 
-    async_add_entities([current_trip_sensor, last_trip_sensor])
+    # One of the entries hosts the fleet sensors once there are several vehicles
+    async_get_coordinator(hass).async_add_fleet_platform(
+        entry.entry_id,
+        lambda: async_add_entities(
+            [
+                EVFleetActiveTripsSensor(hass),
+                *(EVFleetStatisticsSensor(hass, period) for period in STATISTICS_NAMES),
+            ]
+        ),
+    )
 
 
 class EVCurrentTripSensor(SensorEntity):
     """Sensor for current/active trip."""
 
+    _unrecorded_attributes = UNRECORDED_TRIP_ATTRIBUTES | {ATTR_DISTANCE}
+
     def __init__(self, hass: HomeAssistant, entry: ConfigEntry, config: dict) -> None:
         self.hass = hass
         self._entry = entry
@@ -74,35 +244,64 @@ class EVCurrentTripSensor(SensorEntity):
         self._unsub = None
         self._unsub_charging = None
         self._end_trip_timer = None
-        self._temperature_readings = []
+        self._sampler = None
+        self._start_enrichment = None
+        self._enrichment_tasks = set()
+        self._coordinator = async_get_coordinator(hass)
+        self._end_due = None
+        self._end_detector = TripEndDetector(
+            self._config.get(CONF_TRIP_END_DELAY, DEFAULT_TRIP_END_DELAY)
+        )
+        # (timestamp, distance, place) of the stop the pending end is for
+        self._stop = None
+        # (timestamp, place) where the last trip ended early
+        self._last_stop = None
+        # When driving stopped, and when the last trip ended and started
+        self._stopped_at = None
+        self._last_end = None
+        self._last_start = None
+        # Trips that ended but wait for the stores or their end readings
+        self._ended: list[dict] = []
+        self._unsub_parked = None
+        self._checkpoint = Store(hass, 1, CHECKPOINT_STORAGE_KEY.format(entry.entry_id))
+        self._publisher = ThrottledPublisher(hass, self, PUBLISH_INTERVAL)
+        self.metrics = hass.data[DOMAIN][entry.entry_id]["metrics"]
+        self._stores_loaded = hass.data[DOMAIN][entry.entry_id]["loaded"]
 
     async def async_added_to_hass(self) -> None:
         """Start tracking state changes."""
-        self._unsub = async_track_state_change_event(
-            self.hass,
+        self._unsub = self._coordinator.async_track(
             [self._config[CONF_DRIVING_STATE_SENSOR]],
             self._handle_driving_state_change,
         )
 
         charging_sensor = self._config.get(CONF_CHARGING_STATE_SENSOR)
         if charging_sensor:
-            self._unsub_charging = async_track_state_change_event(
-                self.hass,
+            self._unsub_charging = self._coordinator.async_track(
                 [charging_sensor],
                 self._handle_charging_state_change,
             )
+        self._async_track_parked()
 
         # Listen for options updates
         self.async_on_remove(
             self._entry.add_update_listener(self._async_options_updated)
         )
 
+        # Restore in the background so setup is not delayed
+        self._entry.async_create_background_task(
+            self.hass,
+            self._async_restore_checkpoint(),
+            f"{DOMAIN}_restore_checkpoint_{self._entry.entry_id}",
+        )
+
     async def _async_options_updated(
         self, hass: HomeAssistant, entry: ConfigEntry
     ) -> None:
         """Handle options update."""
         self._config = {**entry.data, **entry.options}
         _LOGGER.debug("Options updated: %s", self._config)
+        self.metrics.enabled = self._config.get(CONF_DIAGNOSTICS, False)
         # Re-subscribe charging sensor in case it changed
         if self._unsub_charging:
             self._unsub_charging()
@@ -110,244 +309,847 @@ class EVCurrentTripSensor(SensorEntity):
 
         charging_sensor = self._config.get(CONF_CHARGING_STATE_SENSOR)
         if charging_sensor:
-            self._unsub_charging = async_track_state_change_event(
-                self.hass,
+            self._unsub_charging = self._coordinator.async_track(
                 [charging_sensor],
                 self._handle_charging_state_change,
             )
+        self._end_detector.max_delay = self._config.get(
+            CONF_TRIP_END_DELAY, DEFAULT_TRIP_END_DELAY
+        )
+        self._async_track_parked()
+        self.hass.data[DOMAIN][self._entry.entry_id]["backlog"].async_set_url(
+            self._weather_api_url
+        )
+
+    @callback
+    def _async_track_parked(self) -> None:
+        """(Re)subscribe the lock and plug sensors."""
+        if self._unsub_parked:
+            self._unsub_parked()
+        self._unsub_parked = self._coordinator.async_track(
+            [self._config.get(CONF_LOCK_SENSOR), self._config.get(CONF_PLUG_SENSOR)],
+            self._handle_parked_state_change,
+        )
 
     async def async_will_remove_from_hass(self) -> None:
         """Clean up."""
+        # Write the checkpoint now rather than after the debounce delay
+        await self._checkpoint.async_save(self._checkpoint_data())
         if self._unsub:
             self._unsub()
         if self._end_trip_timer:
             self._end_trip_timer()
         if self._unsub_charging:
             self._unsub_charging()
+        if self._unsub_parked:
+            self._unsub_parked()
+        for task in self._enrichment_tasks:
+            task.cancel()
+        self._publisher.async_cancel()
+        if self._sampler:
+            self._sampler.async_stop()
+        self._coordinator.async_set_trip_active(self._entry.entry_id, False)
 
     @callback
+    @timed(METRIC_DRIVING_HANDLER)
     def _handle_driving_state_change(self, event) -> None:
         """Handle driving state changes."""
         new_state = event.data.get("new_state")
         if new_state is None:
             return
 
-        is_driving = new_state.state in ["on", "driving", "true", "True", True]
+        is_driving = new_state.state in DRIVING_STATES
 
         if is_driving and self._state == "idle":
             # Cancel any pending trip end
             if self._end_trip_timer:
                 self._end_trip_timer()
                 self._end_trip_timer = None
-            self.hass.async_create_task(self._start_trip())
+            self._start_trip(new_state.last_changed)
 
         elif is_driving and self._state == "active":
             # Resumed driving, cancel pending trip end
             if self._end_trip_timer:
                 self._end_trip_timer()
                 self._end_trip_timer = None
+                self._end_due = None
+                if self._stop:
+                    # Wait longer after stopping here next time
+                    self._end_detector.learn(self._stop[2], time.time() - self._stop[0])
+                    self._stop = None
+                self._async_checkpoint()
                 _LOGGER.debug("Trip end cancelled - driving resumed")
+                self.metrics.increment(COUNTER_END_CANCELLED)
 
         elif not is_driving and self._state == "active":
             self._trip_data["_actual_end_time"] = datetime.now().isoformat()
+            self._stopped_at = new_state.last_changed
+            lat, lon = self._location()
+            self._stop = (
+                time.time(),
+                self._trip_data.get(ATTR_DISTANCE),
+                stop_cell(lat, lon),
+            )
+            self._async_plan_end()
 
-            # Start delayed trip end
-            delay = self._config.get(CONF_TRIP_END_DELAY, DEFAULT_TRIP_END_DELAY)
-            _LOGGER.debug("Trip end scheduled in %s seconds", delay)
-
-            if self._end_trip_timer:
-                self._end_trip_timer()
+    @callback
+    def _handle_parked_state_change(self, event) -> None:
+        """Re-plan a pending trip end when the car is locked or plugged in."""
+        if self._stop and self._end_trip_timer:
+            self._async_plan_end()
 
-            self._end_trip_timer = async_call_later(
-                self.hass, delay, self._delayed_end_trip
+    @callback
+    def _async_plan_end(self) -> None:
+        """Schedule the trip end from the evidence that the car is parked."""
+        stopped, distance, cell = self._stop
+        if self._config.get(CONF_ADAPTIVE_TRIP_END, True):
+            current = self._trip_data.get(ATTR_DISTANCE)
+            delay = self._end_detector.delay(
+                cell,
+                plugged=is_plugged(self._config_state(CONF_PLUG_SENSOR)),
+                locked=is_locked(self._config_state(CONF_LOCK_SENSOR)),
+                zone=in_zone(self._config_state(CONF_LOCATION_TRACKER)),
+                moving=None not in (distance, current) and current > distance,
             )
+        else:
+            delay = self._end_detector.max_delay
+        due = stopped + delay
+        if self._end_due is None or abs(due - self._end_due) >= 1:
+            self._schedule_end_trip(max(0, due - time.time()))
 
     @callback
+    def _config_state(self, key: str):
+        entity_id = self._config.get(key)
+        return self.hass.states.get(entity_id) if entity_id else None
+
+    @callback
+    @timed(METRIC_CHARGING_HANDLER)
     def _handle_charging_state_change(self, event) -> None:
         """Handle charging state changes."""
         new_state = event.data.get("new_state")
         if new_state is None:
             return
 
-        is_charging = new_state.state in [
-            "on",
-            "charging",
-            "Charging",
-            "ac",
-            "dc",
-            "true",
-            "True",
-            True,
-        ]
+        is_charging = new_state.state in CHARGING_STATES
 
         if is_charging and self._state == "active":
             _LOGGER.info("Charging detected - ending trip immediately")
+            self.metrics.increment(COUNTER_CHARGING_ENDS)
 
             # Cancel any pending delayed trip end
             if self._end_trip_timer:
                 self._end_trip_timer()
                 self._end_trip_timer = None
+                self._end_due = None
 
             # Set actual end time now
             self._trip_data["_actual_end_time"] = datetime.now().isoformat()
-            self.hass.async_create_task(self._end_trip())
+            self._stopped_at = new_state.last_changed
+            self._stop = None
+            self._end_trip()
+
+    @callback
+    def _schedule_end_trip(self, delay: float) -> None:
+        """End the trip after ``delay`` seconds unless driving resumes."""
+        _LOGGER.debug("Trip end scheduled in %s seconds", delay)
+
+        if self._end_trip_timer:
+            self._end_trip_timer()
+
+        self._end_due = time.time() + delay
+        self._end_trip_timer = async_call_later(
+            self.hass, delay, self._delayed_end_trip
+        )
+        self._async_checkpoint()
 
     @callback
     def _delayed_end_trip(self, _now) -> None:
         """End trip after delay."""
         self._end_trip_timer = None
-        self.hass.async_create_task(self._end_trip())
+        self._end_due = None
+        self._end_trip()
 
-    async def _start_trip(self) -> None:
-        """Start a new trip."""
-        _LOGGER.info("Trip started")
+    @callback
+    def _async_checkpoint(self) -> None:
+        """Schedule a debounced save of the trip state machine."""
+        self._checkpoint.async_delay_save(self._checkpoint_data, CHECKPOINT_SAVE_DELAY)
+
+    @callback
+    def _checkpoint_data(self) -> dict:
+        """Return the state machine as stored in the checkpoint."""
+        if self._state != "active":
+            return {
+                "state": "idle",
+                "ended": self._ended,
+                "stops": self._end_detector.as_dict(),
+            }
+        return {
+            "state": self._state,
+            "trip": self._trip_data,
+            "end_due": self._end_due,
+            "stop": self._stop,
+            "ended": self._ended,
+            "stops": self._end_detector.as_dict(),
+        }
+
+    async def _async_restore_checkpoint(self) -> None:
+        """Resume or close a trip that was active before a restart.
+
+        Trips that ended but were not finished are finished again.
+        """
+        data = await self._checkpoint.async_load()
+        if data:
+            self._end_detector.load(data.get("stops", {}))
+            for trip in data.get("ended", []):
+                self._ended.append(trip)
+                since = datetime.fromisoformat(trip[ATTR_END_TIME]).astimezone(
+                    timezone.utc
+                ) - timedelta(seconds=FRESH_READING_GRACE)
+                position = tuple(trip.get("_end_position") or (None, None))
+                self._async_create_enrichment_task(
+                    self._async_finish_trip(trip, None, None, since, position)
+                )
+        if not data or data.get("state") != "active" or self._state != "idle":
+            return
+
+        trip = data["trip"]
+        end_due = data.get("end_due")
+        driving = self.hass.states.get(self._config[CONF_DRIVING_STATE_SENSOR])
+        is_driving = driving is not None and driving.state in DRIVING_STATES
+        start_time = datetime.fromisoformat(trip[ATTR_START_TIME])
+
+        if (
+            end_due is None
+            and not is_driving
+            and driving is not None
+            and driving.state not in (STATE_UNAVAILABLE, STATE_UNKNOWN)
+        ):
+            # Stopped while Home Assistant was down
+            stopped = dt_util.as_local(driving.last_changed).replace(tzinfo=None)
+            trip["_actual_end_time"] = max(stopped, start_time).isoformat()
+            self._stopped_at = driving.last_changed
+            end_due = datetime.fromisoformat(trip["_actual_end_time"]).timestamp()
+            end_due += self._config.get(CONF_TRIP_END_DELAY, DEFAULT_TRIP_END_DELAY)
+
+        _LOGGER.info("Restoring trip started at %s", trip[ATTR_START_TIME])
+        self.metrics.increment(COUNTER_RESTORED)
         self._state = "active"
+        self._coordinator.async_set_trip_active(self._entry.entry_id, True)
+        self._trip_data = trip
+        if end_due is not None and not is_driving and data.get("stop"):
+            self._stop = tuple(data["stop"])
+        self._sampler = TripSampler(self.hass, self._config, self._handle_sample)
+        self._sampler.async_start()
 
+        if is_driving:
+            trip.pop("_actual_end_time", None)
+            self._async_checkpoint()
+            self._publisher.async_publish(force=True)
+        elif end_due is not None and end_due <= time.time():
+            self._end_trip()
+        elif end_due is not None:
+            self._schedule_end_trip(end_due - time.time())
+            self._publisher.async_publish(force=True)
+        else:
+            # Driving state not known yet, wait for it to report
+            self._publisher.async_publish(force=True)
+
+    @callback
+    def _snapshot(self) -> tuple:
+        """Read odometer, battery and location from the state machine."""
         odometer = self.hass.states.get(self._config[CONF_ODOMETER_SENSOR])
         battery = self.hass.states.get(self._config[CONF_BATTERY_SENSOR])
+        return (state_value(odometer), state_value(battery), *self._location())
+
+    @callback
+    def _location(self) -> tuple:
+        """Read the latitude and longitude of the location tracker."""
         location = self.hass.states.get(self._config[CONF_LOCATION_TRACKER])
+        if location is None:
+            return None, None
+        return location.attributes.get("latitude"), location.attributes.get("longitude")
 
-        lat = location.attributes.get("latitude") if location else None
-        lon = location.attributes.get("longitude") if location else None
+    @callback
+    @timed(METRIC_START_TRIP)
+    def _start_trip(self, started: datetime) -> None:
+        """Start a new trip, ``started`` being when driving was reported."""
+        _LOGGER.info("Trip started")
+        self.metrics.increment(COUNTER_TRIPS_STARTED)
+        odometer, battery, lat, lon = self._snapshot()
+        self._state = "active"
+        self._coordinator.async_set_trip_active(self._entry.entry_id, True)
 
-        location_data = await self._get_location_data(lat, lon) if lat and lon else {}
+        if self._last_stop:
+            # Driving resumed where the last trip ended early
+            ended, cell = self._last_stop
+            if cell is not None and stop_cell(lat, lon) == cell:
+                self._end_detector.learn(cell, time.time() - ended)
+            self._last_stop = None
 
+        places = self.hass.data[DOMAIN][self._entry.entry_id]["places"]
         self._trip_data = {
             ATTR_START_TIME: datetime.now().isoformat(),
-            ATTR_START_ODOMETER: float(odometer.state) if odometer else None,
-            ATTR_START_BATTERY: float(battery.state) if battery else None,
-            ATTR_START_ELEVATION: location_data.get("elevation"),
-            ATTR_START_TEMPERATURE: location_data.get("temperature"),
+            ATTR_START_ODOMETER: odometer,
+            ATTR_START_BATTERY: battery,
+            ATTR_START_ELEVATION: None,
+            ATTR_START_TEMPERATURE: None,
+            ATTR_START_LOCATION: places.async_label((lat, lon)),
+            "_start_position": (lat, lon),
         }
-        self.async_write_ha_state()
+        self._last_start = started
+        # Readings not reported since the last trip ended may still be from
+        # before it ended
+        settled = (
+            self._last_end - timedelta(seconds=FRESH_READING_GRACE)
+            if self._last_end
+            else dt_util.utc_from_timestamp(0)
+        )
+        if stale := [
+            entity_id
+            for entity_id in self._readings(ATTR_START_ODOMETER, ATTR_START_BATTERY)
+            if not is_fresh(self.hass.states.get(entity_id), settled)
+        ]:
+            self.metrics.increment(COUNTER_STALE_READINGS)
+            self._async_create_enrichment_task(
+                self._async_settle_start(
+                    self._trip_data,
+                    stale,
+                    started - timedelta(seconds=FRESH_READING_GRACE),
+                )
+            )
+        self._publisher.async_publish(force=True)
+        self._async_checkpoint()
+
+        self._sampler = TripSampler(self.hass, self._config, self._handle_sample)
+        self._sampler.async_start()
+
+        # With trip weather, all weather is fetched in one request at the end
+        if self._weather_mode != WEATHER_MODE_TRIP:
+            self._start_enrichment = self._async_create_enrichment_task(
+                self._async_enrich_start(self._trip_data, lat, lon)
+            )
 
-    async def _end_trip(self) -> None:
+    @callback
+    def _readings(self, odometer_attribute: str, battery_attribute: str) -> dict:
+        """Map the odometer and battery sensors to the trip attributes they fill."""
+        return {
+            self._config[CONF_ODOMETER_SENSOR]: odometer_attribute,
+            self._config[CONF_BATTERY_SENSOR]: battery_attribute,
+        }
+
+    @callback
+    def _before_next_trip(self, states: dict[str, State], since: datetime) -> dict:
+        """Drop readings reported after the next trip started."""
+        if self._last_start is None or self._last_start <= since:
+            return states
+        return {
+            entity_id: state
+            for entity_id, state in states.items()
+            if state.last_updated <= self._last_start
+        }
+
+    async def _async_settle_start(
+        self, trip: dict, stale: list[str], since: datetime
+    ) -> None:
+        """Take the start readings from the first report after the trip started."""
+        states = await async_wait_fresh(self.hass, stale, since, FRESH_READING_TIMEOUT)
+        if trip is not self._trip_data or not states:
+            return
+        readings = self._readings(ATTR_START_ODOMETER, ATTR_START_BATTERY)
+        for entity_id, state in states.items():
+            trip[readings[entity_id]] = state_value(state)
+        _LOGGER.debug("Start readings settled: %s", list(states))
+        self._async_checkpoint()
+        self._publisher.async_publish()
+
+    @callback
+    @timed(METRIC_END_TRIP)
+    def _end_trip(self) -> None:
         """End the current trip."""
         _LOGGER.info("Trip ended")
 
-        odometer = self.hass.states.get(self._config[CONF_ODOMETER_SENSOR])
-        battery = self.hass.states.get(self._config[CONF_BATTERY_SENSOR])
-        location = self.hass.states.get(self._config[CONF_LOCATION_TRACKER])
+        trip = self._trip_data
+        # Use actual end time (when driving stopped), not now
+        now = datetime.now()
+        trip[ATTR_END_TIME] = trip.pop("_actual_end_time", now.isoformat())
+        self.metrics.observe(
+            METRIC_END_DELAY,
+            (now - datetime.fromisoformat(trip[ATTR_END_TIME])).total_seconds(),
+        )
 
-        lat = location.attributes.get("latitude") if location else None
-        lon = location.attributes.get("longitude") if location else None
+        samples = self._sampler.async_stop() if self._sampler else None
+        self._sampler = None
+        # Where the car stopped, the trip may only be finished much later
+        position = self._location()
+        self._last_stop = self._stop and (self._stop[0], self._stop[2])
+        self._stop = None
+        start_enrichment = self._start_enrichment
+        self._start_enrichment = None
 
-        location_data = await self._get_location_data(lat, lon) if lat and lon else {}
+        # Cloud polled cars often report the odometer and battery a poll after
+        # they stopped, so the trip is closed with the first readings after it
+        stopped = self._stopped_at or datetime.fromisoformat(
+            trip[ATTR_END_TIME]
+        ).astimezone(timezone.utc)
+        self._stopped_at = None
+        self._last_end = stopped
+        since = stopped - timedelta(seconds=FRESH_READING_GRACE)
+        stale = [
+            entity_id
+            for entity_id in self._readings(ATTR_END_ODOMETER, ATTR_END_BATTERY)
+            if not is_fresh(self.hass.states.get(entity_id), since)
+        ]
+        if stale:
+            self.metrics.increment(COUNTER_STALE_READINGS)
+        # The route is computed in the executor before the trip is filtered
+        if stale or samples or not self._stores_loaded.is_set():
+            # Kept with the trip for the checkpoint
+            trip["_end_position"] = position
+            self._ended.append(trip)
+            self._async_create_enrichment_task(
+                self._async_finish_trip(
+                    trip, samples, start_enrichment, since, position
+                )
+            )
+        else:
+            self._finish_trip(trip, samples, start_enrichment, position)
 
-        # Use actual end time (when driving stopped), not now
-        self._trip_data[ATTR_END_TIME] = self._trip_data.pop(
-            "_actual_end_time", datetime.now().isoformat()
+        self._state = "idle"
+        self._coordinator.async_set_trip_active(self._entry.entry_id, False)
+        self._trip_data = {}
+        self._async_checkpoint()
+        self._publisher.async_publish(force=True)
+
+    async def _async_finish_trip(
+        self,
+        trip: dict,
+        samples: SampleBuffer | None,
+        start_enrichment: asyncio.Task | None,
+        since: datetime,
+        position: tuple,
+    ) -> None:
+        """Finish a trip once its end readings are in.
+
+        Readings not reported within FRESH_READING_TIMEOUT are taken as they
+        are, and the trip is stored and published with them. If they are
+        reported up to FRESH_READING_CORRECTION later, the stored trip and
+        the statistics are corrected. The route is derived from the samples
+        first, so it can refine the distance the trip is filtered and counted
+        with. A trip that ends right after a restart also waits for the
+        stores, and stays in the checkpoint if they failed to load, to be
+        finished once the entry is reloaded.
+        """
+        from .loader import async_wait_loaded
+
+        try:
+            await async_wait_loaded(self.hass, [self._entry.entry_id])
+        except HomeAssistantError as err:
+            _LOGGER.error(
+                "Trip ended at %s is kept until the entry is reloaded: %s",
+                trip[ATTR_END_TIME],
+                err,
+            )
+            return
+        polyline = await self._async_calculate_route(trip, samples) if samples else None
+        stale = [
+            entity_id
+            for entity_id in self._readings(ATTR_END_ODOMETER, ATTR_END_BATTERY)
+            if not is_fresh(self.hass.states.get(entity_id), since)
+        ]
+        fresh = await async_wait_fresh(self.hass, stale, since, FRESH_READING_TIMEOUT)
+        late = [entity_id for entity_id in stale if entity_id not in fresh]
+        self._ended.remove(trip)
+        self._async_checkpoint()
+        # The model only learns the trip once late readings can no longer
+        # correct it
+        settled = asyncio.Event() if late else None
+        record = self._finish_trip(
+            trip,
+            samples,
+            start_enrichment,
+            position,
+            self._end_states(fresh, since),
+            final=not late,
+            polyline=polyline,
+            settled=settled,
         )
-        self._trip_data[ATTR_END_ODOMETER] = float(odometer.state) if odometer else None
-        self._trip_data[ATTR_END_BATTERY] = float(battery.state) if battery else None
-        self._trip_data[ATTR_END_ELEVATION] = location_data.get("elevation")
-        self._trip_data[ATTR_END_TEMPERATURE] = location_data.get("temperature")
+        if not late:
+            return
+        _LOGGER.debug("End readings of %s not reported yet", late)
+        counted = trip.copy()
+        try:
+            corrected = self._before_next_trip(
+                await async_wait_fresh(
+                    self.hass, late, since, FRESH_READING_CORRECTION
+                ),
+                since,
+            )
+            if record is None:
+                # Too short with the readings so far, the late ones decide
+                fresh.update(corrected)
+                self._finish_trip(
+                    trip,
+                    samples,
+                    start_enrichment,
+                    position,
+                    self._end_states(fresh, since),
+                    polyline=polyline,
+                )
+                return
+            if not corrected:
+                return
+            readings = self._readings(ATTR_END_ODOMETER, ATTR_END_BATTERY)
+            for entity_id, state in corrected.items():
+                trip[readings[entity_id]] = state_value(state)
+            from .energy import calculate_trip_metrics
 
-        self._calculate_trip_metrics()
+            calculate_trip_metrics(trip, self._config, samples)
+            entry_data = self.hass.data[DOMAIN][self._entry.entry_id]
+            entry_data["history"].async_update(record, trip)
+            entry_data["statistics"].async_replace_trip(counted, trip)
+            _LOGGER.info("Trip corrected with late readings of %s", list(corrected))
+            self.metrics.increment(COUNTER_TRIPS_CORRECTED)
+            async_dispatcher_send(
+                self.hass, SIGNAL_LAST_TRIP_UPDATED.format(self._entry.entry_id)
+            )
+        finally:
+            settled.set()
+
+    @callback
+    def _end_states(self, fresh: dict[str, State], since: datetime) -> dict:
+        """Return the end readings, the fresh ones or else the last ones.
+
+        Readings reported after the next trip started are left out.
+        """
+        states = {
+            entity_id: state
+            for entity_id in self._readings(ATTR_END_ODOMETER, ATTR_END_BATTERY)
+            if (state := self.hass.states.get(entity_id)) is not None
+        }
+        states.update(fresh)
+        return self._before_next_trip(states, since)
+
+    @callback
+    def _finish_trip(
+        self,
+        trip: dict,
+        samples: SampleBuffer | None,
+        start_enrichment: asyncio.Task | None,
+        position: tuple,
+        states: dict[str, State] | None = None,
+        final: bool = True,
+        polyline=None,
+        settled: asyncio.Event | None = None,
+    ) -> int | None:
+        """Store a trip with its end readings, unless it is too short.
 
-        start_time = datetime.fromisoformat(self._trip_data[ATTR_START_TIME])
-        end_time = datetime.fromisoformat(self._trip_data[ATTR_END_TIME])
+        ``position`` is where the car stopped. ``states`` holds the end
+        readings, the current ones by default; a missing or invalid reading
+        is stored as None. Returns the history record of the trip. A trip
+        that is too short while readings are still outstanding (not
+        ``final``) is left to be finished again. ``polyline`` is the
+        simplified route, stored with the trip. The consumption model learns
+        the trip once ``settled`` is set.
+        """
+        readings = self._readings(ATTR_END_ODOMETER, ATTR_END_BATTERY)
+        if states is None:
+            states = {
+                entity_id: self.hass.states.get(entity_id) for entity_id in readings
+            }
+        for entity_id, attribute in readings.items():
+            trip[attribute] = state_value(states.get(entity_id))
+        lat, lon = position
+        trip[ATTR_END_ELEVATION] = None
+        trip[ATTR_END_TEMPERATURE] = None
+        trip[ATTR_SAMPLE_COUNT] = len(samples) if samples else 0
+
+        # Built on numpy, which the entry loader has already imported in the
+        # executor
+        from .energy import calculate_trip_metrics
+
+        calculate_trip_metrics(trip, self._config, samples)
+
+        start_time = datetime.fromisoformat(trip[ATTR_START_TIME])
+        end_time = datetime.fromisoformat(trip[ATTR_END_TIME])
         duration = end_time - start_time
 
-        if self._trip_data[ATTR_DISTANCE] < self._config.get(
+        too_short = trip.get(ATTR_DISTANCE, 0) < self._config.get(
             CONF_MIN_TRIP_DISTANCE, DEFAULT_MIN_TRIP_DISTANCE
-        ):
+        )
+        too_brief = duration.total_seconds() < self._config.get(
+            CONF_MIN_TRIP_DURATION, DEFAULT_MIN_TRIP_DURATION
+        )
+        if (too_short or too_brief) and not final:
+            return None
+        if too_short:
             _LOGGER.info(
                 "Trip with distance of %s is too short, min trip distance is %s",
-                self._trip_data[ATTR_DISTANCE],
+                trip.get(ATTR_DISTANCE),
                 self._config.get(CONF_MIN_TRIP_DISTANCE, DEFAULT_MIN_TRIP_DISTANCE),
             )
-        elif duration.total_seconds() < self._config.get(
-            CONF_MIN_TRIP_DURATION, DEFAULT_MIN_TRIP_DURATION
-        ):
+            self.metrics.increment(COUNTER_DISCARDED_DISTANCE)
+            if start_enrichment:
+                start_enrichment.cancel()
+            return None
+        if too_brief:
             _LOGGER.info(
                 "Trip with duration of %s is too short, min trip duration is %s",
-                self._trip_data[ATTR_DURATION],
+                trip[ATTR_DURATION],
                 self._config.get(CONF_MIN_TRIP_DURATION, DEFAULT_MIN_TRIP_DURATION),
             )
-        else:
-            self.hass.data[DOMAIN][self._entry.entry_id]["last_trip"] = (
-                self._trip_data.copy()
+            self.metrics.increment(COUNTER_DISCARDED_DURATION)
+            if start_enrichment:
+                start_enrichment.cancel()
+            return None
+
+        start_position = trip.pop("_start_position", None)
+        trip.pop("_end_position", None)
+        self.metrics.increment(COUNTER_TRIPS_COMPLETED)
+        entry_data = self.hass.data[DOMAIN][self._entry.entry_id]
+        entry_data["last_trip"] = trip
+        entry_data["places"].async_add_trip(trip, start_position, (lat, lon))
+        record = entry_data["history"].async_append(trip)
+        entry_data["statistics"].async_add_trip(trip)
+        self.hass.bus.async_fire(EVENT_TRIP_COMPLETED, trip.copy())
+        async_dispatcher_send(
+            self.hass, SIGNAL_LAST_TRIP_UPDATED.format(self._entry.entry_id)
+        )
+        self._async_create_enrichment_task(
+            self._async_enrich_end(
+                trip,
+                record,
+                samples,
+                polyline,
+                start_enrichment,
+                lat,
+                lon,
+                time.monotonic(),
+                settled,
             )
-            self.hass.bus.async_fire(f"{DOMAIN}_trip_completed", self._trip_data)
+        )
+        return record
 
-        self._state = "idle"
-        self._trip_data = {}
-        self.async_write_ha_state()
+    @callback
+    def _async_create_enrichment_task(self, coro) -> asyncio.Task:
+        """Run an enrichment coroutine in the background."""
+        task = self.hass.async_create_background_task(
+            coro, f"{DOMAIN}_enrichment_{self._entry.entry_id}"
+        )
+        self._enrichment_tasks.add(task)
+        task.add_done_callback(self._enrichment_tasks.discard)
+        return task
 
-    def _calculate_trip_metrics(self) -> None:
-        """Calculate distance, energy, avg speed."""
-        start_odo = self._trip_data.get(ATTR_START_ODOMETER)
-        end_odo = self._trip_data.get(ATTR_END_ODOMETER)
-        start_bat = self._trip_data.get(ATTR_START_BATTERY)
-        end_bat = self._trip_data.get(ATTR_END_BATTERY)
-        start_time = datetime.fromisoformat(self._trip_data[ATTR_START_TIME])
-        end_time = datetime.fromisoformat(self._trip_data[ATTR_END_TIME])
-
-        # Distance
-        if start_odo and end_odo:
-            self._trip_data[ATTR_DISTANCE] = round(end_odo - start_odo, 2)
-
-        # Energy used (kWh)
-        if start_bat and end_bat:
-            battery_capacity = self._config[CONF_BATTERY_CAPACITY]
-            energy = (start_bat - end_bat) / 100 * battery_capacity
-            self._trip_data[ATTR_ENERGY_USED] = round(energy, 2)
-
-        if start_bat and end_bat and start_odo and end_odo:
-            self._trip_data[ATTR_ENERGY_CONSUMPTION] = round(
-                (
-                    (self._trip_data[ATTR_ENERGY_USED] / self._trip_data[ATTR_DISTANCE])
-                    * 100
-                ),
-                2,
+    async def _async_enrich_start(self, trip: dict, lat, lon) -> None:
+        """Backfill start elevation and temperature."""
+        if not (lat and lon):
+            return
+        location_data = await self._async_get_location_data_with_deadline(lat, lon)
+        trip[ATTR_START_ELEVATION] = location_data.get("elevation")
+        trip[ATTR_START_TEMPERATURE] = location_data.get("temperature")
+        if trip is self._trip_data:
+            self._publisher.async_publish()
+
+    @callback
+    def _handle_sample(self, values: dict) -> None:
+        """Update the distance driven so far from a new sample."""
+        start_odometer = self._trip_data.get(ATTR_START_ODOMETER)
+        odometer = values[COLUMN_ODOMETER]
+        if start_odometer is not None and not math.isnan(odometer):
+            self._trip_data[ATTR_DISTANCE] = round(odometer - start_odometer, 2)
+            self._publisher.async_publish()
+        if self._stop and self._end_trip_timer:
+            self._async_plan_end()
+
+    async def _async_enrich_end(
+        self,
+        trip: dict,
+        record: int,
+        samples: SampleBuffer | None,
+        polyline,
+        start_enrichment: asyncio.Task | None,
+        lat,
+        lon,
+        ended: float,
+        settled: asyncio.Event | None = None,
+    ) -> None:
+        """Backfill end elevation and temperature, then publish the trip again.
+
+        The consumption model learns the trip once ``settled`` is set.
+        """
+        if start_enrichment:
+            await asyncio.wait({start_enrichment})
+        weather = {}
+        if self._weather_mode == WEATHER_MODE_TRIP:
+            weather = await self._async_get_trip_weather(trip, samples, lat, lon)
+            trip.update(weather)
+        elif lat and lon:
+            location_data = await self._async_get_location_data_with_deadline(lat, lon)
+            trip[ATTR_END_ELEVATION] = location_data.get("elevation")
+            trip[ATTR_END_TEMPERATURE] = location_data.get("temperature")
+        if samples:
+            await self._async_store_samples(trip, samples, polyline)
+
+        from .energy import calculate_trip_metrics
+
+        calculate_trip_metrics(trip, self._config, samples)
+        # The sampled temperature sensor beats the weather grid
+        if weather.get(ATTR_AVG_TEMPERATURE) is not None and not self._config.get(
+            CONF_TEMPERATURE_SENSOR
+        ):
+            trip[ATTR_AVG_TEMPERATURE] = weather[ATTR_AVG_TEMPERATURE]
+        entry_data = self.hass.data[DOMAIN][self._entry.entry_id]
+        entry_data["history"].async_update(record, trip)
+        if (
+            lat
+            and lon
+            and None
+            in (
+                trip.get(ATTR_START_TEMPERATURE),
+                trip.get(ATTR_END_TEMPERATURE),
             )
+        ):
+            # Looked up again, with others, once the API answers
+            entry_data["backlog"].async_add(record)
+        self.hass.bus.async_fire(EVENT_TRIP_ENRICHED, trip.copy())
+        self.metrics.observe(METRIC_TIME_TO_ENRICHED, time.monotonic() - ended)
+        async_dispatcher_send(
+            self.hass, SIGNAL_LAST_TRIP_UPDATED.format(self._entry.entry_id)
+        )
+        if settled is not None:
+            await settled.wait()
+        # Trained on the enriched and corrected trip, which has its
+        # temperature, climb and final readings
+        entry_data["model"].async_add_trips([trip])
 
-        # Duration
-        duration = end_time - start_time
-        self._trip_data[ATTR_DURATION] = round(duration.total_seconds() / 60, 2)
+    async def _async_calculate_route(self, trip: dict, samples: SampleBuffer):
+        """Derive route length, climb and descent from the location samples.
+
+        Returns the simplified route.
+        """
+        from .route import compute_route
 
-        seconds = duration.total_seconds()
-        hours, remainder = divmod(seconds, 3600)
-        minutes, seconds = divmod(remainder, 60)
-        self._trip_data[ATTR_DURATION_FORMATTED] = (
-            f"{int(hours)}:{int(minutes):02d}:{int(seconds):02d}"
+        dem_directory = self._dem_directory()
+        elevation_lookup = (
+            async_get_location_client(self.hass).get_dem(dem_directory).elevation
+            if dem_directory
+            else None
+        )
+        attributes, polyline = await self.hass.async_add_executor_job(
+            compute_route,
+            samples.column(COLUMN_LATITUDE),
+            samples.column(COLUMN_LONGITUDE),
+            samples.column(COLUMN_ALTITUDE),
+            elevation_lookup,
         )
+        trip.update(attributes)
+        return polyline
 
-        # Average speed
-        if self._trip_data.get(ATTR_DISTANCE) and duration.total_seconds() > 0:
-            hours = duration.total_seconds() / 3600
-            self._trip_data[ATTR_AVG_SPEED] = round(
-                self._trip_data[ATTR_DISTANCE] / hours, 1
-            )
+    async def _async_store_samples(
+        self, trip: dict, samples: SampleBuffer, polyline
+    ) -> None:
+        """Store the route and the encoded samples of a trip."""
+        from .codec import encode_samples
+
+        entry_data = self.hass.data[DOMAIN][self._entry.entry_id]
+        if polyline is not None and len(polyline):
+            entry_data["routes"].async_append(trip[ATTR_START_TIME], polyline)
+        entry_data["samples"].async_append(
+            trip[ATTR_START_TIME],
+            await self.hass.async_add_executor_job(
+                encode_samples, {name: samples.column(name) for name in COLUMNS}
+            ),
+        )
 
-        # Elevation diff
-        start_elev = self._trip_data.get(ATTR_START_ELEVATION)
-        end_elev = self._trip_data.get(ATTR_END_ELEVATION)
-        if start_elev is not None and end_elev is not None:
-            self._trip_data[ATTR_ELEVATION_DIFF] = round(end_elev - start_elev, 1)
-
-        start_temp = self._trip_data.get(ATTR_START_TEMPERATURE)
-        end_temp = self._trip_data.get(ATTR_END_TEMPERATURE)
-        if start_temp is not None and end_temp is not None:
-            self._trip_data[ATTR_AVG_TEMPERATURE] = round(
-                ((start_temp + end_temp) / 2), 1
+    async def _async_get_location_data_with_deadline(self, lat, lon) -> dict:
+        """Fetch location data, giving up after the enrichment deadline."""
+        start = time.perf_counter()
+        try:
+            async with asyncio.timeout(ENRICHMENT_DEADLINE):
+                return await self._get_location_data(lat, lon)
+        except TimeoutError:
+            _LOGGER.warning(
+                "Location data not available within %s seconds", ENRICHMENT_DEADLINE
+            )
+            self.metrics.increment(COUNTER_DEADLINE_EXCEEDED)
+            return {"elevation": None, "temperature": None}
+        finally:
+            self.metrics.observe(
+                METRIC_ENRICHMENT, (time.perf_counter() - start) * 1000
             )
 
     async def _get_location_data(self, lat: float, lon: float) -> dict:
-        """Fetch elevation and temperature from Open-Meteo API."""
+        """Fetch elevation and temperature, served from cache where possible."""
+        client = async_get_location_client(self.hass)
+        return await client.async_get(
+            lat,
+            lon,
+            self._config.get(CONF_TEMPERATURE_CACHE_TTL, DEFAULT_TEMPERATURE_CACHE_TTL),
+            self._dem_directory(),
+            self._weather_api_url,
+        )
+
+    async def _async_get_trip_weather(
+        self, trip: dict, samples: SampleBuffer | None, lat, lon
+    ) -> dict:
+        """Fetch the weather along the trip in one request.
+
+        Returns start, end and average temperature, precipitation, average
+        wind and the start and end elevation, or an empty dict on failure.
+        """
+        from .weather import HOURLY_VARIABLES, summarize, trip_points
+
+        end_ts = datetime.fromisoformat(trip[ATTR_END_TIME]).timestamp()
+        points = trip_points(samples, (end_ts, lat, lon))
+        if not points:
+            return {}
+        client = async_get_location_client(self.hass)
+        start = time.perf_counter()
         try:
-            session = async_get_clientsession(self.hass)
-            url = f"https://api.open-meteo.com/v1/forecast?latitude={lat}&longitude={lon}&current_weather=true"
-            async with session.get(url) as response:
-                data = await response.json()
-                return {
-                    "elevation": data.get("elevation"),
-                    "temperature": data.get("current_weather", {}).get("temperature"),
-                }
-        except Exception as e:
-            _LOGGER.warning("Failed to fetch location data: %s", e)
-            return {"elevation": None, "temperature": None}
+            async with asyncio.timeout(ENRICHMENT_DEADLINE):
+                locations = await client.async_get_hourly(
+                    points, HOURLY_VARIABLES, self._weather_api_url
+                )
+        except TimeoutError:
+            _LOGGER.warning(
+                "Trip weather not available within %s seconds", ENRICHMENT_DEADLINE
+            )
+            self.metrics.increment(COUNTER_DEADLINE_EXCEEDED)
+            return {}
+        finally:
+            self.metrics.observe(
+                METRIC_ENRICHMENT, (time.perf_counter() - start) * 1000
+            )
+        if locations is None:
+            return {}
+
+        weather = summarize(points, locations)
+        dem_directory = self._dem_directory()
+        for name, (_, point_lat, point_lon) in (
+            (ATTR_START_ELEVATION, points[0]),
+            (ATTR_END_ELEVATION, points[-1]),
+        ):
+            elevation = None
+            if dem_directory:
+                elevation = await self.hass.async_add_executor_job(
+                    client.get_dem(dem_directory).elevation, point_lat, point_lon
+                )
+            if elevation is None:
+                elevation = client.cached_elevation(point_lat, point_lon)
+            weather[name] = elevation
+        return weather
+
+    @property
+    def _weather_mode(self) -> str:
+        return self._config.get(CONF_WEATHER_MODE, DEFAULT_WEATHER_MODE)
+
+    @property
+    def _weather_api_url(self) -> str:
+        return self._config.get(CONF_WEATHER_API_URL, DEFAULT_WEATHER_API_URL)
+
+    def _dem_directory(self) -> str | None:
+        """Return the DEM tile directory, relative to the config directory."""
+        dem_path = self._config.get(CONF_DEM_PATH)
+        return self.hass.config.path(dem_path) if dem_path else None
 
     @property
     def state(self):
@@ -355,24 +1157,615 @@ class EVCurrentTripSensor(SensorEntity):
 
     @property
     def extra_state_attributes(self):
+        return trip_attributes(
+            self._trip_data, self._config.get(CONF_COMPACT_ATTRIBUTES, False)
+        )
+
+    @property
+    def trip_data(self) -> dict:
+        """Return the active trip, with the values kept for its end."""
         return self._trip_data
 
 
-class EVLastTripSensor(SensorEntity):
+class EVStoredDataSensor(RestoreEntity, SensorEntity, ABC):
+    """Base for the sensors showing a vehicle's stored data.
+
+    The stores are loaded in the background after setup, until then these
+    sensors show their state from before the restart. Subclasses provide
+    ``stored_state`` and optionally ``stored_attributes``.
+    """
+
+    _restored: State | None = None
+    _waiting = False
+
+    def _loaded(self) -> bool:
+        return self.hass.data[DOMAIN][self._entry.entry_id]["loaded"].is_set()
+
+    def _failed(self) -> bool:
+        return self.hass.data[DOMAIN][self._entry.entry_id].get("load_failed", False)
+
+    def _loaded_signal(self) -> str:
+        return SIGNAL_ENTRY_LOADED.format(self._entry.entry_id)
+
+    async def async_added_to_hass(self) -> None:
+        """Restore the last state while the stores are loading."""
+        if self._loaded():
+            return
+        self._waiting = True
+        self.async_on_remove(
+            async_dispatcher_connect(
+                self.hass, self._loaded_signal(), self._async_handle_loaded
+            )
+        )
+        self._restored = await self.async_get_last_state()
+
+    @callback
+    def _async_handle_loaded(self) -> None:
+        if self._waiting and (self._loaded() or self._failed()):
+            self._waiting = False
+            self._restored = None
+            self.async_write_ha_state()
+
+    @property
+    def available(self) -> bool:
+        """Unavailable once the stores failed to load."""
+        return not self._failed()
+
+    @property
+    def state(self):
+        if self._waiting:
+            return self._restored and self._restored.state
+        return self.stored_state
+
+    @property
+    def extra_state_attributes(self):
+        if self._waiting:
+            return self._restored and dict(self._restored.attributes)
+        return self.stored_attributes
+
+    @property
+    @abstractmethod
+    def stored_state(self):
+        """Return the state computed from the loaded stores."""
+
+    @property
+    def stored_attributes(self) -> dict | None:
+        return None
+
+
+class EVLastTripSensor(EVStoredDataSensor):
     """Sensor for last completed trip."""
 
+    _unrecorded_attributes = UNRECORDED_TRIP_ATTRIBUTES
+
     def __init__(self, hass: HomeAssistant, entry: ConfigEntry) -> None:
         self.hass = hass
         self._entry = entry
         self._attr_name = "EV Last Trip"
         self._attr_unique_id = f"{entry.entry_id}_last_trip"
         self._attr_native_unit_of_measurement = "km"
+        self._attr_should_poll = False
+        self._publisher = ThrottledPublisher(hass, self, 0)
+
+    async def async_added_to_hass(self) -> None:
+        """Refresh whenever a trip is completed or enriched."""
+        await super().async_added_to_hass()
+        self.async_on_remove(
+            async_dispatcher_connect(
+                self.hass,
+                SIGNAL_LAST_TRIP_UPDATED.format(self._entry.entry_id),
+                self._publisher.async_publish,
+            )
+        )
 
     @property
-    def state(self):
+    def stored_state(self):
         last_trip = self.hass.data[DOMAIN][self._entry.entry_id].get("last_trip", {})
         return last_trip.get(ATTR_DISTANCE)
 
+    @property
+    def stored_attributes(self):
+        entry_config = {**self._entry.data, **self._entry.options}
+        return trip_attributes(
+            self.hass.data[DOMAIN][self._entry.entry_id].get("last_trip", {}),
+            entry_config.get(CONF_COMPACT_ATTRIBUTES, False),
+        )
+
+
+class EVChargingSessionSensor(EVStoredDataSensor):
+    """Sensor recording charging sessions.
+
+    It listens to the charging sensor through the same coordinator routes as
+    the trip sensor, samples power, battery energy and level while charging,
+    and stores each session in the trip history as a charging record.
+    """
+
+    _unrecorded_attributes = frozenset(
+        {ATTR_START_ODOMETER, ATTR_END_ODOMETER, ATTR_LATITUDE, ATTR_LONGITUDE}
+    )
+
+    def __init__(self, hass: HomeAssistant, entry: ConfigEntry) -> None:
+        self.hass = hass
+        self._entry = entry
+        self._config = {**entry.data, **entry.options}
+        self._attr_name = "EV Charging Session"
+        self._attr_unique_id = f"{entry.entry_id}_charging_session"
+        self._attr_should_poll = False
+        self._coordinator = async_get_coordinator(hass)
+        self._session = None
+        self._state_at_start = None
+        self._sampler = None
+        self._unsub = None
+
+    async def async_added_to_hass(self) -> None:
+        """Start tracking the charging sensor once the history is loaded."""
+        await super().async_added_to_hass()
+        if not self._waiting:
+            self._async_track()
+        self.async_on_remove(
+            self._entry.add_update_listener(self._async_options_updated)
+        )
+
+    async def _async_options_updated(
+        self, hass: HomeAssistant, entry: ConfigEntry
+    ) -> None:
+        """Follow a changed charging sensor."""
+        self._config = {**entry.data, **entry.options}
+        self._async_track()
+
+    @callback
+    def _async_handle_loaded(self) -> None:
+        if self._waiting and self._loaded():
+            self._async_track()
+        super()._async_handle_loaded()
+
+    @callback
+    def _async_track(self) -> None:
+        if self._unsub:
+            self._unsub()
+            self._unsub = None
+        charging_sensor = self._config.get(CONF_CHARGING_STATE_SENSOR)
+        if not charging_sensor:
+            return
+        self._unsub = self._coordinator.async_track(
+            [charging_sensor], self._handle_charging_state_change
+        )
+        # A session already running is recorded from now on
+        state = self.hass.states.get(charging_sensor)
+        if self._session is None and state and state.state in CHARGING_STATES:
+            self._start_session(state.state)
+
+    async def async_will_remove_from_hass(self) -> None:
+        """Clean up."""
+        if self._unsub:
+            self._unsub()
+        if self._sampler:
+            self._sampler.async_stop()
+
+    @callback
+    def _handle_charging_state_change(self, event) -> None:
+        """Start or end a session."""
+        new_state = event.data.get("new_state")
+        if new_state is None:
+            return
+        is_charging = new_state.state in CHARGING_STATES
+        if is_charging and self._session is None:
+            self._start_session(new_state.state)
+        elif not is_charging and self._session is not None:
+            if new_state.state not in (STATE_UNAVAILABLE, STATE_UNKNOWN):
+                self._end_session()
+
+    @callback
+    def _snapshot(self) -> dict:
+        """Read the odometer, battery and location for a session."""
+        return {
+            column: state_value(self.hass.states.get(self._config[key]))
+            for key, column in (
+                (CONF_ODOMETER_SENSOR, COLUMN_ODOMETER),
+                (CONF_BATTERY_SENSOR, COLUMN_BATTERY),
+            )
+        }
+
+    @callback
+    def _start_session(self, state: str) -> None:
+        _LOGGER.info("Charging session started")
+        values = self._snapshot()
+        location = self.hass.states.get(self._config[CONF_LOCATION_TRACKER])
+        self._state_at_start = state
+        self._session = {
+            ATTR_START_TIME: datetime.now().isoformat(),
+            ATTR_START_ODOMETER: values[COLUMN_ODOMETER],
+            ATTR_START_BATTERY: values[COLUMN_BATTERY],
+            ATTR_LATITUDE: location.attributes.get("latitude") if location else None,
+            ATTR_LONGITUDE: location.attributes.get("longitude") if location else None,
+        }
+        self._sampler = TripSampler(self.hass, self._config, weather=False)
+        self._sampler.async_start()
+        self.async_write_ha_state()
+
+    @callback
+    def _end_session(self) -> None:
+        from .charging import calculate_session_metrics
+        from .history import RECORD_KIND_CHARGING
+
+        session, self._session = self._session, None
+        samples = self._sampler.async_stop()
+        self._sampler = None
+        values = self._snapshot()
+        session[ATTR_END_TIME] = datetime.now().isoformat()
+        session[ATTR_END_ODOMETER] = values[COLUMN_ODOMETER]
+        session[ATTR_END_BATTERY] = values[COLUMN_BATTERY]
+        calculate_session_metrics(session, self._config, samples, self._state_at_start)
+
+        if not session[ATTR_ENERGY_ADDED] and (
+            session[ATTR_DURATION] * 60 < MIN_CHARGING_DURATION
+        ):
+            _LOGGER.info("Charging session without energy added, not stored")
+        else:
+            _LOGGER.info(
+                "Charging session ended, %s kWh added", session[ATTR_ENERGY_ADDED]
+            )
+            entry_data = self.hass.data[DOMAIN][self._entry.entry_id]
+            entry_data["last_charge"] = session
+            entry_data["history"].async_append(session, RECORD_KIND_CHARGING)
+            self.hass.bus.async_fire(EVENT_CHARGING_COMPLETED, session.copy())
+        self.async_write_ha_state()
+
+    @property
+    def stored_state(self):
+        return "charging" if self._session is not None else "idle"
+
+    @property
+    def stored_attributes(self):
+        if self._session is not None:
+            return self._session
+        return self.hass.data[DOMAIN][self._entry.entry_id].get("last_charge", {})
+
+
+class EVPredictionSensor(EVStoredDataSensor):
+    """Base for the sensors served by the consumption model.
+
+    Predictions are for the current temperature, the usual speed and a flat
+    road, and cost a dot product of the learned coefficients.
+    """
+
+    _attr_should_poll = False
+
+    def __init__(self, hass: HomeAssistant, entry: ConfigEntry) -> None:
+        self.hass = hass
+        self._entry = entry
+        self._config = {**entry.data, **entry.options}
+
+    async def async_added_to_hass(self) -> None:
+        """Refresh when the model learns or the inputs change."""
+        await super().async_added_to_hass()
+        self.async_on_remove(
+            async_dispatcher_connect(
+                self.hass,
+                SIGNAL_MODEL_UPDATED.format(self._entry.entry_id),
+                self.async_write_ha_state,
+            )
+        )
+        self.async_on_remove(
+            async_get_coordinator(self.hass).async_track(
+                [
+                    self._config.get(CONF_TEMPERATURE_SENSOR),
+                    self._config[CONF_BATTERY_SENSOR],
+                ],
+                self._handle_state_change,
+            )
+        )
+
+    @callback
+    def _handle_state_change(self, event) -> None:
+        self.async_write_ha_state()
+
+    def _temperature(self) -> float | None:
+        """Return the temperature sensor reading, else the last trip's."""
+        if entity_id := self._config.get(CONF_TEMPERATURE_SENSOR):
+            state = self.hass.states.get(entity_id)
+            try:
+                return float(state.state)
+            except (AttributeError, ValueError):
+                pass
+        last_trip = self.hass.data[DOMAIN][self._entry.entry_id].get("last_trip", {})
+        return last_trip.get(ATTR_AVG_TEMPERATURE)
+
+    def _predicted_consumption(self) -> float | None:
+        return self.hass.data[DOMAIN][self._entry.entry_id]["model"].predict(
+            self._temperature()
+        )
+
+    @property
+    def stored_attributes(self):
+        model = self.hass.data[DOMAIN][self._entry.entry_id]["model"]
+        return {"temperature": self._temperature(), **model.as_attributes()}
+
+
+class EVPredictedConsumptionSensor(EVPredictionSensor):
+    """Sensor for the expected consumption under the current conditions."""
+
+    def __init__(self, hass: HomeAssistant, entry: ConfigEntry) -> None:
+        super().__init__(hass, entry)
+        self._attr_name = "EV Predicted Consumption"
+        self._attr_unique_id = f"{entry.entry_id}_predicted_consumption"
+        self._attr_native_unit_of_measurement = "kWh/100km"
+
+    @property
+    def stored_state(self):
+        consumption = self._predicted_consumption()
+        return round(consumption, 1) if consumption is not None else None
+
+
+class EVPredictedRangeSensor(EVPredictionSensor):
+    """Sensor for the range left at the predicted consumption."""
+
+    def __init__(self, hass: HomeAssistant, entry: ConfigEntry) -> None:
+        super().__init__(hass, entry)
+        self._attr_name = "EV Predicted Range"
+        self._attr_unique_id = f"{entry.entry_id}_predicted_range"
+        self._attr_native_unit_of_measurement = "km"
+
+    @property
+    def stored_state(self):
+        consumption = self._predicted_consumption()
+        battery = self.hass.states.get(self._config[CONF_BATTERY_SENSOR])
+        try:
+            level = float(battery.state)
+        except (AttributeError, ValueError):
+            return None
+        if consumption is None:
+            return None
+        return round(level * self._config[CONF_BATTERY_CAPACITY] / consumption)
+
+
+class EVPlacesSensor(EVStoredDataSensor):
+    """Sensor for the discovered places and the statistics per route."""
+
+    _attr_should_poll = False
+    _unrecorded_attributes = frozenset({MATCH_ALL})
+
+    def __init__(self, hass: HomeAssistant, entry: ConfigEntry) -> None:
+        self.hass = hass
+        self._entry = entry
+        self._attr_name = "EV Places"
+        self._attr_unique_id = f"{entry.entry_id}_places"
+        self._publisher = ThrottledPublisher(hass, self, PUBLISH_INTERVAL)
+
+    async def async_added_to_hass(self) -> None:
+        """Refresh whenever a trip is labelled."""
+        await super().async_added_to_hass()
+        self.async_on_remove(
+            async_dispatcher_connect(
+                self.hass,
+                SIGNAL_PLACES_UPDATED.format(self._entry.entry_id),
+                self._publisher.async_publish,
+            )
+        )
+        self.async_on_remove(self._publisher.async_cancel)
+
+    def _places(self):
+        return self.hass.data[DOMAIN][self._entry.entry_id]["places"]
+
+    @property
+    def stored_state(self):
+        return len(self._places().index.places)
+
+    @property
+    def stored_attributes(self):
+        places = self._places()
+        return {
+            "places": {
+                place.name: {
+                    "latitude": round(place.latitude, 5),
+                    "longitude": round(place.longitude, 5),
+                    "radius": round(place.radius),
+                    "visits": place.visits,
+                }
+                for place in places.index.places
+            },
+            "routes": places.route_attributes(PLACE_ROUTES_SHOWN),
+        }
+
+
+STATISTICS_NAMES = {
+    PERIOD_DAY: "EV Trips Today",
+    PERIOD_WEEK: "EV Trips This Week",
+    PERIOD_MONTH: "EV Trips This Month",
+    PERIOD_LIFETIME: "EV Trips Lifetime",
+}
+
+
+class EVTripStatisticsSensor(EVStoredDataSensor):
+    """Sensor for distance and averages over a day, week, month or lifetime."""
+
+    def __init__(self, hass: HomeAssistant, entry: ConfigEntry, period: str) -> None:
+        self.hass = hass
+        self._entry = entry
+        self._period = period
+        self._attr_name = STATISTICS_NAMES[period]
+        self._attr_unique_id = f"{entry.entry_id}_statistics_{period}"
+        self._attr_native_unit_of_measurement = "km"
+        self._attr_should_poll = False
+
+    async def async_added_to_hass(self) -> None:
+        """Refresh whenever a trip is added or a window rolls over."""
+        await super().async_added_to_hass()
+        self.async_on_remove(
+            async_dispatcher_connect(
+                self.hass,
+                SIGNAL_STATISTICS_UPDATED.format(self._entry.entry_id),
+                self.async_write_ha_state,
+            )
+        )
+
+    @property
+    def _window(self):
+        statistics = self.hass.data[DOMAIN][self._entry.entry_id]["statistics"]
+        return statistics.periods[self._period]
+
+    @property
+    def stored_state(self):
+        return round(self._window.distance, 2)
+
+    @property
+    def stored_attributes(self):
+        return self._window.as_attributes()
+
+
+class EVFleetActiveTripsSensor(SensorEntity):
+    """Sensor for the number of vehicles currently on a trip."""
+
+    def __init__(self, hass: HomeAssistant) -> None:
+        self.hass = hass
+        self._attr_name = "EV Fleet Active Trips"
+        self._attr_unique_id = f"{DOMAIN}_fleet_active_trips"
+        self._attr_should_poll = False
+        self._coordinator = async_get_coordinator(hass)
+
+    async def async_added_to_hass(self) -> None:
+        """Refresh whenever a vehicle starts or ends a trip."""
+        self.async_on_remove(
+            async_dispatcher_connect(
+                self.hass, SIGNAL_FLEET_UPDATED, self.async_write_ha_state
+            )
+        )
+
+    @property
+    def state(self):
+        return len(self._coordinator.active_trips)
+
+    @property
+    def extra_state_attributes(self):
+        return {"vehicles": len(self._coordinator.vehicles)}
+
+
+class EVFleetStatisticsSensor(EVStoredDataSensor):
+    """Sensor for the combined distance of all vehicles over a period."""
+
+    def __init__(self, hass: HomeAssistant, period: str) -> None:
+        self.hass = hass
+        self._period = period
+        self._attr_name = STATISTICS_NAMES[period].replace("EV", "EV Fleet", 1)
+        self._attr_unique_id = f"{DOMAIN}_fleet_statistics_{period}"
+        self._attr_native_unit_of_measurement = "km"
+        self._attr_should_poll = False
+        self._coordinator = async_get_coordinator(hass)
+
+    def _loaded(self) -> bool:
+        entries = self.hass.data[DOMAIN]
+        return all(
+            entries[entry_id]["loaded"].is_set()
+            for entry_id in self._coordinator.vehicles
+            if entry_id in entries
+        )
+
+    def _failed(self) -> bool:
+        entries = self.hass.data[DOMAIN]
+        return any(
+            entries[entry_id].get("load_failed", False)
+            for entry_id in self._coordinator.vehicles
+            if entry_id in entries
+        )
+
+    def _loaded_signal(self) -> str:
+        return SIGNAL_FLEET_UPDATED
+
+    async def async_added_to_hass(self) -> None:
+        """Refresh whenever any vehicle's statistics change."""
+        await super().async_added_to_hass()
+        self.async_on_remove(
+            async_dispatcher_connect(
+                self.hass, SIGNAL_FLEET_UPDATED, self.async_write_ha_state
+            )
+        )
+
+    def _windows(self):
+        entries = self.hass.data[DOMAIN]
+        return [
+            entries[entry_id]["statistics"].periods[self._period]
+            for entry_id in self._coordinator.vehicles
+            if entry_id in entries
+        ]
+
+    @property
+    def stored_state(self):
+        return round(sum(window.distance for window in self._windows()), 2)
+
+    @property
+    def stored_attributes(self):
+        windows = self._windows()
+        distance = sum(window.distance for window in windows)
+        energy = sum(window.energy for window in windows)
+        metered_distance = sum(window.metered_distance for window in windows)
+        return {
+            "period": self._period,
+            "vehicles": len(windows),
+            "trips": sum(window.trips for window in windows),
+            ATTR_DISTANCE: round(distance, 2),
+            ATTR_ENERGY_USED: round(energy, 2),
+            ATTR_ENERGY_CONSUMPTION: (
+                round(energy / metered_distance * 100, 2) if metered_distance else None
+            ),
+            "driving_time_minutes": round(
+                sum(window.driving_seconds for window in windows) / 60, 1
+            ),
+        }
+
+
+class EVTripDiagnosticsSensor(SensorEntity):
+    """Counters and timings of the trip state machine and the location API."""
+
+    _attr_entity_category = EntityCategory.DIAGNOSTIC
+    _attr_should_poll = False
+    _unrecorded_attributes = frozenset({MATCH_ALL})
+
+    def __init__(self, hass: HomeAssistant, entry: ConfigEntry) -> None:
+        self.hass = hass
+        self._entry = entry
+        self._metrics = hass.data[DOMAIN][entry.entry_id]["metrics"]
+        self._attr_name = "EV Trip Diagnostics"
+        self._attr_unique_id = f"{entry.entry_id}_diagnostics"
+        # Metrics change on every handled state, so writes are throttled
+        self._publisher = ThrottledPublisher(hass, self, PUBLISH_INTERVAL)
+
+    async def async_added_to_hass(self) -> None:
+        """Publish whenever the trip or location API metrics change."""
+        await super().async_added_to_hass()
+        self.async_on_remove(self._metrics.add_listener(self._publisher.async_publish))
+        self.async_on_remove(
+            async_get_location_client(self.hass).metrics.add_listener(
+                self._async_location_metrics_changed
+            )
+        )
+        self.async_on_remove(
+            self._entry.add_update_listener(self._async_options_updated)
+        )
+        self.async_on_remove(self._publisher.async_cancel)
+
+    @callback
+    def _async_location_metrics_changed(self) -> None:
+        # The location API metrics are always collected, and shared by all vehicles
+        if self._metrics.enabled:
+            self._publisher.async_publish()
+
+    async def _async_options_updated(
+        self, hass: HomeAssistant, entry: ConfigEntry
+    ) -> None:
+        """Show diagnostics being switched on or off."""
+        self._publisher.async_publish(force=True)
+
+    @property
+    def state(self):
+        return "collecting" if self._metrics.enabled else "disabled"
+
     @property
     def extra_state_attributes(self):
-        return self.hass.data[DOMAIN][self._entry.entry_id].get("last_trip", {})
+        if not self._metrics.enabled:
+            return {}
+        metrics = self._metrics.as_dict()
+        return {
+            **metrics["counters"],
+            **metrics["histograms"],
+            "location_api": async_get_location_client(self.hass).metrics.as_dict(),
+        }
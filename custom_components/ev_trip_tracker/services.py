@@ -0,0 +1,154 @@
+"""Services of EV Trip Tracker."""
+
+import logging
+from datetime import timedelta
+
+import voluptuous as vol
+from homeassistant.core import (
+    HomeAssistant,
+    ServiceCall,
+    ServiceResponse,
+    SupportsResponse,
+    callback,
+)
+from homeassistant.exceptions import HomeAssistantError
+import homeassistant.helpers.config_validation as cv
+from homeassistant.util import dt as dt_util
+
+from .const import (
+    DOMAIN,
+    SERVICE_BACKFILL,
+    ATTR_CONFIG_ENTRY_ID,
+    ATTR_START,
+    ATTR_END,
+    DEFAULT_BACKFILL_DAYS,
+    SERVICE_EXPORT,
+    ATTR_FORMAT,
+    ATTR_FILENAME,
+    EXPORT_FORMAT_CSV,
+    EXPORT_FORMATS,
+)
+from .loader import async_wait_loaded
+
+_LOGGER = logging.getLogger(__name__)
+
+BACKFILL_SCHEMA = vol.Schema(
+    {
+        vol.Optional(ATTR_CONFIG_ENTRY_ID): cv.string,
+        vol.Optional(ATTR_START): cv.datetime,
+        vol.Optional(ATTR_END): cv.datetime,
+    }
+)
+
+EXPORT_SCHEMA = vol.Schema(
+    {
+        vol.Optional(ATTR_CONFIG_ENTRY_ID): cv.string,
+        vol.Optional(ATTR_START): cv.datetime,
+        vol.Optional(ATTR_END): cv.datetime,
+        vol.Optional(ATTR_FORMAT, default=EXPORT_FORMAT_CSV): vol.In(EXPORT_FORMATS),
+        vol.Optional(ATTR_FILENAME): cv.string,
+    }
+)
+
+
+@callback
+def _async_entry_ids(hass: HomeAssistant, call: ServiceCall) -> list[str]:
+    """Return the vehicles a service call is for, all of them by default."""
+    entry_ids = list(hass.data.get(DOMAIN, {}))
+    if entry_id := call.data.get(ATTR_CONFIG_ENTRY_ID):
+        if entry_id not in entry_ids:
+            raise HomeAssistantError(f"Unknown vehicle {entry_id}")
+        entry_ids = [entry_id]
+    return entry_ids
+
+
+@callback
+def async_setup_services(hass: HomeAssistant) -> None:
+    """Register the integration services."""
+
+    async def _async_backfill(call: ServiceCall) -> None:
+        """Start a backfill for one or all vehicles."""
+        if "recorder" not in hass.config.components:
+            raise HomeAssistantError("Backfilling trips needs the recorder")
+        # Imported here, the recorder is only needed when a backfill runs
+        from .backfill import async_backfill
+
+        entry_ids = _async_entry_ids(hass, call)
+        await async_wait_loaded(hass, entry_ids)
+        for entry_id in entry_ids:
+            entry = hass.config_entries.async_get_entry(entry_id)
+            data = hass.data[DOMAIN][entry_id]
+            if data.get("backfill") and not data["backfill"].done():
+                raise HomeAssistantError(f"A backfill of {entry.title} is running")
+
+            history = data["history"]
+            end = call.data.get(ATTR_END)
+            end = (
+                dt_util.as_utc(end)
+                if end
+                else history.first_start() or dt_util.utcnow()
+            )
+            start = call.data.get(ATTR_START)
+            start = (
+                dt_util.as_utc(start)
+                if start
+                else end - timedelta(days=DEFAULT_BACKFILL_DAYS)
+            )
+            if start >= end:
+                raise HomeAssistantError("The backfill must start before it ends")
+
+            # Cancelled when the entry unloads
+            data["backfill"] = entry.async_create_background_task(
+                hass,
+                async_backfill(hass, entry, start, end),
+                f"{DOMAIN}_backfill_{entry_id}",
+            )
+
+    hass.services.async_register(
+        DOMAIN, SERVICE_BACKFILL, _async_backfill, schema=BACKFILL_SCHEMA
+    )
+
+    async def _async_export(call: ServiceCall) -> ServiceResponse:
+        """Write the stored trips of one or all vehicles to a file."""
+        from .export import default_path, export_trips
+
+        export_format = call.data[ATTR_FORMAT]
+        if filename := call.data.get(ATTR_FILENAME):
+            path = hass.config.path(filename)
+            if not hass.config.is_allowed_path(path):
+                raise HomeAssistantError(f"Writing to {path} is not allowed")
+        else:
+            path = default_path(hass, export_format)
+
+        start = call.data.get(ATTR_START)
+        end = call.data.get(ATTR_END)
+        vehicles = []
+        entry_ids = _async_entry_ids(hass, call)
+        await async_wait_loaded(hass, entry_ids)
+        for entry_id in entry_ids:
+            data = hass.data[DOMAIN][entry_id]
+            await data["history"].async_flush()
+            await data["routes"].async_flush()
+            vehicles.append(
+                (
+                    hass.config_entries.async_get_entry(entry_id).title,
+                    data["history"],
+                    data["routes"],
+                    data["history"].positions(
+                        start and dt_util.as_utc(start), end and dt_util.as_utc(end)
+                    ),
+                )
+            )
+
+        count = await hass.async_add_executor_job(
+            export_trips, path, export_format, vehicles
+        )
+        return {"path": path, "trips": count}
+
+    hass.services.async_register(
+        DOMAIN,
+        SERVICE_EXPORT,
+        _async_export,
+        schema=EXPORT_SCHEMA,
+        supports_response=SupportsResponse.OPTIONAL,
+    )
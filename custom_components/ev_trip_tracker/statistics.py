@@ -0,0 +1,293 @@
+"""Incremental trip statistics per day, week, month and lifetime."""
+
+import logging
+import math
+from datetime import date, datetime, timedelta
+
+from homeassistant.core import HomeAssistant, callback
+from homeassistant.helpers.dispatcher import async_dispatcher_send
+from homeassistant.helpers.event import async_track_time_change
+from homeassistant.helpers.storage import Store
+from homeassistant.util import dt as dt_util
+
+from .const import (
+    DOMAIN,
+    ATTR_END_TIME,
+    ATTR_DISTANCE,
+    ATTR_ENERGY_USED,
+    ATTR_ENERGY_CONSUMPTION,
+    ATTR_AVG_SPEED,
+    ATTR_DURATION,
+    PERIOD_DAY,
+    PERIOD_WEEK,
+    PERIOD_MONTH,
+    PERIODS,
+    SIGNAL_STATISTICS_UPDATED,
+    SIGNAL_FLEET_UPDATED,
+    STATISTICS_SAVE_DELAY,
+)
+
+_LOGGER = logging.getLogger(__name__)
+
+STORAGE_VERSION = 1
+
+# Per-trip values that get a running mean and variance
+TRACKED = (ATTR_DISTANCE, ATTR_ENERGY_USED, ATTR_ENERGY_CONSUMPTION, ATTR_AVG_SPEED)
+
+
+def period_start(period: str, day: date) -> date | None:
+    """Return the first day of the period that contains ``day``."""
+    if period == PERIOD_DAY:
+        return day
+    if period == PERIOD_WEEK:
+        return day - timedelta(days=day.weekday())
+    if period == PERIOD_MONTH:
+        return day.replace(day=1)
+    return None
+
+
+class RunningStats:
+    """Running count, sum, mean and variance (Welford's algorithm)."""
+
+    __slots__ = ("count", "total", "mean", "m2")
+
+    def __init__(
+        self, count: int = 0, total: float = 0.0, mean: float = 0.0, m2: float = 0.0
+    ) -> None:
+        self.count = count
+        self.total = total
+        self.mean = mean
+        self.m2 = m2
+
+    def add(self, value: float) -> None:
+        """Add one observation in O(1)."""
+        self.count += 1
+        self.total += value
+        delta = value - self.mean
+        self.mean += delta / self.count
+        self.m2 += delta * (value - self.mean)
+
+    def remove(self, value: float) -> None:
+        """Take back an observation that was added before, in O(1)."""
+        if self.count <= 1:
+            self.count, self.total, self.mean, self.m2 = 0, 0.0, 0.0, 0.0
+            return
+        self.count -= 1
+        self.total -= value
+        mean = self.mean
+        self.mean -= (value - mean) / self.count
+        self.m2 = max(0.0, self.m2 - (value - mean) * (value - self.mean))
+
+    @property
+    def variance(self) -> float | None:
+        """Sample variance, None with fewer than two observations."""
+        if self.count < 2:
+            return None
+        return self.m2 / (self.count - 1)
+
+    @property
+    def stddev(self) -> float | None:
+        variance = self.variance
+        return None if variance is None else math.sqrt(variance)
+
+    def as_list(self) -> list:
+        return [self.count, self.total, self.mean, self.m2]
+
+
+class PeriodStatistics:
+    """Totals and running statistics for one window."""
+
+    def __init__(self, period: str, start: date | None) -> None:
+        self.period = period
+        self.start = start
+        self.trips = 0
+        self.driving_seconds = 0.0
+        # Distance of trips with a known energy use, for the weighted consumption
+        self.metered_distance = 0.0
+        self.values = {name: RunningStats() for name in TRACKED}
+
+    def add_trip(self, trip: dict) -> None:
+        """Fold a completed trip into the window."""
+        self.trips += 1
+        if trip.get(ATTR_DURATION) is not None:
+            self.driving_seconds += trip[ATTR_DURATION] * 60
+        if trip.get(ATTR_ENERGY_USED) is not None and trip.get(ATTR_DISTANCE):
+            self.metered_distance += trip[ATTR_DISTANCE]
+        for name, stats in self.values.items():
+            value = trip.get(name)
+            if value is not None:
+                stats.add(value)
+
+    def remove_trip(self, trip: dict) -> None:
+        """Take a trip that was folded in back out of the window."""
+        self.trips -= 1
+        if trip.get(ATTR_DURATION) is not None:
+            self.driving_seconds -= trip[ATTR_DURATION] * 60
+        if trip.get(ATTR_ENERGY_USED) is not None and trip.get(ATTR_DISTANCE):
+            self.metered_distance -= trip[ATTR_DISTANCE]
+        for name, stats in self.values.items():
+            value = trip.get(name)
+            if value is not None:
+                stats.remove(value)
+
+    @property
+    def distance(self) -> float:
+        return self.values[ATTR_DISTANCE].total
+
+    @property
+    def energy(self) -> float:
+        return self.values[ATTR_ENERGY_USED].total
+
+    def as_attributes(self) -> dict:
+        """Return the window as state attributes."""
+        distance = self.distance
+        energy = self.energy
+        consumption = self.values[ATTR_ENERGY_CONSUMPTION]
+        hours = self.driving_seconds / 3600
+        return {
+            "period": self.period,
+            "period_start": self.start.isoformat() if self.start else None,
+            "trips": self.trips,
+            ATTR_DISTANCE: round(distance, 2),
+            ATTR_ENERGY_USED: round(energy, 2),
+            # Distance weighted, the way the car itself would report it
+            ATTR_ENERGY_CONSUMPTION: (
+                round(energy / self.metered_distance * 100, 2)
+                if self.metered_distance
+                else None
+            ),
+            "consumption_mean": (
+                round(consumption.mean, 2) if consumption.count else None
+            ),
+            "consumption_stddev": (
+                round(consumption.stddev, 2) if consumption.stddev is not None else None
+            ),
+            "driving_time_minutes": round(self.driving_seconds / 60, 1),
+            ATTR_AVG_SPEED: round(distance / hours, 1) if hours else None,
+        }
+
+    def as_dict(self) -> dict:
+        return {
+            "start": self.start.isoformat() if self.start else None,
+            "trips": self.trips,
+            "driving_seconds": self.driving_seconds,
+            "metered_distance": self.metered_distance,
+            "values": {name: stats.as_list() for name, stats in self.values.items()},
+        }
+
+    @classmethod
+    def from_dict(cls, period: str, data: dict) -> "PeriodStatistics":
+        start = data.get("start")
+        window = cls(period, date.fromisoformat(start) if start else None)
+        window.trips = data.get("trips", 0)
+        window.driving_seconds = data.get("driving_seconds", 0.0)
+        window.metered_distance = data.get("metered_distance", 0.0)
+        for name, values in data.get("values", {}).items():
+            if name in window.values:
+                window.values[name] = RunningStats(*values)
+        return window
+
+
+class TripStatistics:
+    """Per-entry rolling statistics, updated in O(1) per completed trip.
+
+    Windows roll over at local midnight and the state is persisted with a
+    debounced save, so nothing is ever recomputed from the trip history.
+    """
+
+    def __init__(self, hass: HomeAssistant, entry_id: str) -> None:
+        self.hass = hass
+        self.entry_id = entry_id
+        self._store = Store(hass, STORAGE_VERSION, f"{DOMAIN}.{entry_id}.statistics")
+        self.periods: dict[str, PeriodStatistics] = {}
+        self._unsub_midnight = None
+
+    async def async_load(self) -> None:
+        """Restore the windows and start rolling them over at midnight."""
+        data = await self._store.async_load() or {}
+        today = dt_util.now().date()
+        for period in PERIODS:
+            if period in data:
+                self.periods[period] = PeriodStatistics.from_dict(period, data[period])
+            else:
+                self.periods[period] = PeriodStatistics(
+                    period, period_start(period, today)
+                )
+        self._roll_over(today)
+        self._unsub_midnight = async_track_time_change(
+            self.hass, self._async_midnight, hour=0, minute=0, second=0
+        )
+
+    @callback
+    def async_unload(self) -> None:
+        """Stop the midnight roll-over."""
+        if self._unsub_midnight:
+            self._unsub_midnight()
+            self._unsub_midnight = None
+
+    async def async_remove(self) -> None:
+        """Delete the persisted statistics."""
+        await self._store.async_remove()
+
+    @callback
+    def async_add_trip(self, trip: dict) -> None:
+        """Add a completed trip to every window."""
+        self.async_add_trips([trip])
+
+    @callback
+    def async_add_trips(self, trips: list[dict]) -> None:
+        """Add completed trips, e.g. from a backfill, and save once."""
+        for trip in trips:
+            day = datetime.fromisoformat(trip[ATTR_END_TIME]).date()
+            self._roll_over(day)
+            for window in self._windows(day):
+                window.add_trip(trip)
+        self._async_changed()
+
+    @callback
+    def async_replace_trip(self, old: dict, new: dict) -> None:
+        """Replace a trip added before with its corrected figures.
+
+        Windows that have rolled over since the trip was added are left alone.
+        """
+        day = datetime.fromisoformat(old[ATTR_END_TIME]).date()
+        for window in self._windows(day):
+            window.remove_trip(old)
+            window.add_trip(new)
+        self._async_changed()
+
+    def _windows(self, day: date) -> list[PeriodStatistics]:
+        """Return the current windows that contain ``day``."""
+        return [
+            window
+            for window in self.periods.values()
+            if window.start is None or window.start == period_start(window.period, day)
+        ]
+
+    @callback
+    def _async_midnight(self, now: datetime) -> None:
+        """Roll windows over at the start of a new day."""
+        if self._roll_over(now.date()):
+            self._async_changed()
+
+    def _roll_over(self, day: date) -> bool:
+        """Start new windows for periods that no longer contain ``day``."""
+        rolled = False
+        for period in (PERIOD_DAY, PERIOD_WEEK, PERIOD_MONTH):
+            start = period_start(period, day)
+            window = self.periods[period]
+            if window.start is None or start > window.start:
+                self.periods[period] = PeriodStatistics(period, start)
+                rolled = True
+        return rolled
+
+    @callback
+    def _async_changed(self) -> None:
+        self._store.async_delay_save(self._data_to_save, STATISTICS_SAVE_DELAY)
+        async_dispatcher_send(
+            self.hass, SIGNAL_STATISTICS_UPDATED.format(self.entry_id)
+        )
+        async_dispatcher_send(self.hass, SIGNAL_FLEET_UPDATED)
+
+    def _data_to_save(self) -> dict:
+        return {period: window.as_dict() for period, window in self.periods.items()}
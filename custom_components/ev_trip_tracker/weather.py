@@ -0,0 +1,119 @@
+"""Weather along a trip, interpolated from Open-Meteo hourly data."""
+
+import math
+
+import numpy as np
+
+from .const import (
+    ATTR_START_TEMPERATURE,
+    ATTR_END_TEMPERATURE,
+    ATTR_AVG_TEMPERATURE,
+    ATTR_PRECIPITATION,
+    ATTR_AVG_WIND_SPEED,
+    WEATHER_MAX_POINTS,
+)
+from .location import TEMPERATURE_PRECISION, geohash_encode
+from .sampler import COLUMN_LATITUDE, COLUMN_LONGITUDE, COLUMN_TIME, SampleBuffer
+
+HOURLY_TEMPERATURE = "temperature_2m"
+HOURLY_PRECIPITATION = "precipitation"
+HOURLY_WIND_SPEED = "wind_speed_10m"
+HOURLY_VARIABLES = (HOURLY_TEMPERATURE, HOURLY_PRECIPITATION, HOURLY_WIND_SPEED)
+
+
+def trip_points(
+    samples: SampleBuffer | None,
+    end: tuple[float, float | None, float | None],
+    max_points: int = WEATHER_MAX_POINTS,
+) -> list[tuple[float, float, float]]:
+    """Pick (timestamp, lat, lon) points along a trip for one weather request.
+
+    The first and last located sample are always kept, and points in between
+    are spread evenly in time. Consecutive points in the same ~5 km weather
+    cell are merged, since they would get the same grid values.
+    """
+    points = []
+    if samples:
+        times = np.asarray(samples.column(COLUMN_TIME))
+        lats = np.asarray(samples.column(COLUMN_LATITUDE))
+        lons = np.asarray(samples.column(COLUMN_LONGITUDE))
+        located = np.flatnonzero(~(np.isnan(lats) | np.isnan(lons)))
+        if len(located):
+            picks = np.unique(
+                np.linspace(0, len(located) - 1, max_points - 1).round().astype(int)
+            )
+            points = [
+                (float(times[i]), float(lats[i]), float(lons[i]))
+                for i in located[picks]
+            ]
+    end_ts, end_lat, end_lon = end
+    if end_lat is not None and end_lon is not None:
+        points.append((end_ts, end_lat, end_lon))
+
+    merged = []
+    last_cell = None
+    for index, point in enumerate(points):
+        cell = geohash_encode(point[1], point[2], TEMPERATURE_PRECISION)
+        # Always keep the end, so the end temperature is taken at the end
+        if cell != last_cell or index == len(points) - 1:
+            if len(merged) > 1 and cell == last_cell:
+                merged.pop()
+            merged.append(point)
+            last_cell = cell
+    return merged
+
+
+def _interpolate(hourly: dict, variable: str, timestamp: float) -> float | None:
+    times = hourly.get("time")
+    values = hourly.get(variable)
+    if not times or not values:
+        return None
+    series = np.array([np.nan if v is None else v for v in values], dtype=np.float64)
+    valid = ~np.isnan(series)
+    if not valid.any():
+        return None
+    return float(np.interp(timestamp, np.asarray(times)[valid], series[valid]))
+
+
+def _time_weighted(times: list[float], values: list[float | None]) -> float | None:
+    """Return the trapezoidal mean of values over time, skipping gaps."""
+    points = [(t, v) for t, v in zip(times, values) if v is not None]
+    if not points:
+        return None
+    span = points[-1][0] - points[0][0]
+    if span <= 0:
+        return sum(v for _, v in points) / len(points)
+    t = np.array([p[0] for p in points])
+    v = np.array([p[1] for p in points])
+    return float(np.sum((v[1:] + v[:-1]) / 2 * np.diff(t)) / span)
+
+
+def summarize(points: list[tuple[float, float, float]], locations: list[dict]) -> dict:
+    """Return trip weather attributes from one hourly result per point.
+
+    Temperature and wind are time-weighted over the trip. Precipitation is
+    an hourly rate, so its mean times the duration gives the total in mm.
+    """
+    times = [point[0] for point in points]
+    series = {
+        variable: [
+            _interpolate(location.get("hourly", {}), variable, timestamp)
+            for timestamp, location in zip(times, locations)
+        ]
+        for variable in HOURLY_VARIABLES
+    }
+    temperatures = series[HOURLY_TEMPERATURE]
+    attributes = {
+        ATTR_START_TEMPERATURE: temperatures[0],
+        ATTR_END_TEMPERATURE: temperatures[-1],
+        ATTR_AVG_TEMPERATURE: _time_weighted(times, temperatures),
+        ATTR_AVG_WIND_SPEED: _time_weighted(times, series[HOURLY_WIND_SPEED]),
+    }
+    rate = _time_weighted(times, series[HOURLY_PRECIPITATION])
+    attributes[ATTR_PRECIPITATION] = (
+        None if rate is None else rate * (times[-1] - times[0]) / 3600
+    )
+    return {
+        name: None if value is None or math.isnan(value) else round(value, 1)
+        for name, value in attributes.items()
+    }
@@ -0,0 +1,412 @@
+"""Websocket commands to page through, aggregate and replay the stored trips."""
+
+import heapq
+import logging
+from bisect import bisect_right
+from collections import OrderedDict
+from datetime import datetime
+from itertools import islice
+
+import voluptuous as vol
+from homeassistant.components import websocket_api
+from homeassistant.core import HomeAssistant, callback
+from homeassistant.exceptions import HomeAssistantError
+import homeassistant.helpers.config_validation as cv
+from homeassistant.helpers.json import json_bytes
+from homeassistant.util import dt as dt_util
+from homeassistant.util.location import distance
+
+from .const import (
+    DOMAIN,
+    DATA_WEBSOCKET_CACHE,
+    WS_TYPE_TRIPS_LIST,
+    WS_TYPE_TRIPS_AGGREGATE,
+    WS_TYPE_TRIP_SAMPLES,
+    ATTR_CONFIG_ENTRY_ID,
+    ATTR_START,
+    ATTR_END,
+    ATTR_PLACE,
+    ATTR_CURSOR,
+    ATTR_LIMIT,
+    ATTR_GROUP_BY,
+    ATTR_COLUMNS,
+    ATTR_START_TIME,
+    ATTR_START_LOCATION,
+    ATTR_END_LOCATION,
+    ATTR_START_LATITUDE,
+    ATTR_START_LONGITUDE,
+    ATTR_END_LATITUDE,
+    ATTR_END_LONGITUDE,
+    ATTR_DISTANCE,
+    ATTR_ENERGY_USED,
+    ATTR_ENERGY_CONSUMPTION,
+    ATTR_AVG_SPEED,
+    ATTR_DURATION,
+    PERIOD_DAY,
+    PERIOD_WEEK,
+    PERIOD_MONTH,
+    WEBSOCKET_PAGE_SIZE,
+    WEBSOCKET_MAX_PAGE_SIZE,
+    WEBSOCKET_SCAN_CHUNK,
+    WEBSOCKET_CACHE_SIZE,
+)
+from .loader import async_wait_loaded
+from .statistics import period_start
+
+_LOGGER = logging.getLogger(__name__)
+
+FILTER_SCHEMA = {
+    vol.Optional(ATTR_CONFIG_ENTRY_ID): cv.string,
+    vol.Optional(ATTR_START): cv.datetime,
+    vol.Optional(ATTR_END): cv.datetime,
+    vol.Optional(ATTR_PLACE): cv.string,
+}
+
+# Summed per group by the aggregate command
+AGGREGATED = (ATTR_DISTANCE, ATTR_ENERGY_USED, ATTR_DURATION)
+
+# Only used to match places, the labels are sent instead
+_COORDINATES = (
+    ATTR_START_LATITUDE,
+    ATTR_START_LONGITUDE,
+    ATTR_END_LATITUDE,
+    ATTR_END_LONGITUDE,
+)
+
+
+class QueryError(Exception):
+    """A query names an unknown vehicle or place."""
+
+
+@callback
+def async_setup_websocket(hass: HomeAssistant) -> None:
+    """Register the websocket commands."""
+    websocket_api.async_register_command(hass, ws_list_trips)
+    websocket_api.async_register_command(hass, ws_aggregate_trips)
+    websocket_api.async_register_command(hass, ws_trip_samples)
+
+
+def _in_area(trip: dict, area: tuple[float, float, float] | None) -> bool:
+    """Return whether a trip started or ended inside the area."""
+    if area is None:
+        return True
+    lat, lon, radius = area
+    for trip_lat, trip_lon in (
+        (trip.get(ATTR_START_LATITUDE), trip.get(ATTR_START_LONGITUDE)),
+        (trip.get(ATTR_END_LATITUDE), trip.get(ATTR_END_LONGITUDE)),
+    ):
+        if trip_lat is not None and distance(lat, lon, trip_lat, trip_lon) <= radius:
+            return True
+    return False
+
+
+@callback
+def _async_query(hass: HomeAssistant, msg: dict) -> dict:
+    """Return the entry data of the queried vehicles."""
+    vehicles = hass.data.get(DOMAIN, {})
+    if entry_id := msg.get(ATTR_CONFIG_ENTRY_ID):
+        if entry_id not in vehicles:
+            raise QueryError(f"Unknown vehicle {entry_id}")
+        return {entry_id: vehicles[entry_id]}
+    # A vehicle that failed to load does not hold up the others
+    return {
+        entry_id: data
+        for entry_id, data in vehicles.items()
+        if not data.get("load_failed")
+    }
+
+
+@callback
+def _async_area(vehicles: dict, msg: dict) -> tuple[float, float, float] | None:
+    """Return the area of the queried place, once the places are loaded."""
+    if not (place := msg.get(ATTR_PLACE)):
+        return None
+    # Zones are shared, discovered places are looked up per vehicle
+    for data in vehicles.values():
+        if (area := data["places"].async_area(place)) is not None:
+            return area
+    raise QueryError(f"Unknown place {place}")
+
+
+def _time_range(msg: dict) -> tuple[datetime | None, datetime | None]:
+    start = msg.get(ATTR_START)
+    end = msg.get(ATTR_END)
+    return start and dt_util.as_utc(start), end and dt_util.as_utc(end)
+
+
+async def _async_cached(hass: HomeAssistant, vehicles: dict, msg: dict, build) -> bytes:
+    """Return the encoded result of a query, built once per history change.
+
+    A cached result is used until a trip of one of the vehicles is written,
+    or its places change and with them the labels.
+    """
+    cache: OrderedDict = hass.data.setdefault(DATA_WEBSOCKET_CACHE, OrderedDict())
+    key = tuple(sorted((name, value) for name, value in msg.items() if name != "id"))
+    # The stores themselves are part of the stamp, so a reloaded vehicle
+    # never matches a result cached before the reload
+    stamp = tuple(
+        (
+            entry_id,
+            data["history"],
+            data["history"].generation,
+            data["places"],
+            data["places"].generation,
+        )
+        for entry_id, data in vehicles.items()
+    )
+    if (cached := cache.get(key)) is not None and cached[0] == stamp:
+        cache.move_to_end(key)
+        return cached[1]
+
+    payload = json_bytes(await build())
+    cache[key] = (stamp, payload)
+    while len(cache) > WEBSOCKET_CACHE_SIZE:
+        cache.popitem(last=False)
+    return payload
+
+
+async def _async_send_cached(hass: HomeAssistant, connection, msg: dict, build) -> None:
+    """Run a query through the response cache and send its result."""
+    try:
+        vehicles = _async_query(hass, msg)
+        # Right after a restart, queries wait for the stored trips of the
+        # queried vehicles to be loaded
+        try:
+            await async_wait_loaded(hass, vehicles)
+        except HomeAssistantError:
+            if ATTR_CONFIG_ENTRY_ID in msg:
+                raise
+            # Leave out the vehicles that failed while the query waited
+            vehicles = _async_query(hass, msg)
+        area = _async_area(vehicles, msg)
+    except QueryError as err:
+        connection.send_error(msg["id"], websocket_api.ERR_NOT_FOUND, str(err))
+        return
+    payload = await _async_cached(
+        hass, vehicles, msg, lambda: build(hass, vehicles, area, msg)
+    )
+    connection.send_message(
+        websocket_api.messages.construct_result_message(msg["id"], payload)
+    )
+
+
+def _cursor(value: str) -> tuple[float, str, int]:
+    """Validate a cursor returned by a previous page."""
+    try:
+        start_ts, entry_id, position = value.split("|")
+        return float(start_ts), entry_id, int(position)
+    except ValueError as err:
+        raise vol.Invalid("Invalid cursor") from err
+
+
+def _start_time(value: str) -> str:
+    """Validate the start time of a trip as returned by the list command."""
+    try:
+        datetime.fromisoformat(value)
+    except ValueError as err:
+        raise vol.Invalid("Invalid start_time") from err
+    return value
+
+
+def _iter_newest(entry_id: str, times, positions, high: int):
+    for index in range(high - 1, -1, -1):
+        yield times[index], entry_id, positions[index]
+
+
+def _iter_keys(vehicles: dict, start, end, cursor):
+    """Yield (start timestamp, entry id, record) keys newest first.
+
+    The per vehicle indexes are already sorted, so they are merged lazily and
+    only the keys of the requested page are ever built.
+    """
+    streams = []
+    for entry_id, data in vehicles.items():
+        times, positions = data["history"].entries(start, end)
+        high = len(times) if cursor is None else bisect_right(times, cursor[0])
+        streams.append(_iter_newest(entry_id, times, positions, high))
+    for key in heapq.merge(*streams, reverse=True):
+        if cursor is None or key < cursor:
+            yield key
+
+
+async def _async_list(hass: HomeAssistant, vehicles: dict, area, msg: dict) -> dict:
+    """Return one page of trips, newest first, and the cursor of the next."""
+    limit = msg[ATTR_LIMIT]
+    start, end = _time_range(msg)
+    keys = _iter_keys(vehicles, start, end, msg.get(ATTR_CURSOR))
+
+    # One more than the page, to know whether there is a next page
+    page = []
+    while len(page) <= limit:
+        wanted = limit + 1 - len(page)
+        batch = list(
+            islice(keys, wanted if area is None else max(wanted, WEBSOCKET_SCAN_CHUNK))
+        )
+        if not batch:
+            break
+        by_vehicle: dict[str, list] = {}
+        for _, entry_id, position in batch:
+            by_vehicle.setdefault(entry_id, []).append(position)
+        read = {
+            entry_id: iter(await vehicles[entry_id]["history"].async_read(positions))
+            for entry_id, positions in by_vehicle.items()
+        }
+        for key in batch:
+            trip = next(read[key[1]], None)
+            if trip is not None and _in_area(trip, area):
+                page.append((key, trip))
+
+    trips = []
+    for (_, entry_id, _), trip in page[:limit]:
+        places = vehicles[entry_id]["places"]
+        trip[ATTR_START_LOCATION] = places.async_label(
+            (trip[ATTR_START_LATITUDE], trip[ATTR_START_LONGITUDE])
+        )
+        trip[ATTR_END_LOCATION] = places.async_label(
+            (trip[ATTR_END_LATITUDE], trip[ATTR_END_LONGITUDE])
+        )
+        for name in _COORDINATES:
+            del trip[name]
+        trip[ATTR_CONFIG_ENTRY_ID] = entry_id
+        trips.append(trip)
+
+    cursor = None
+    if len(page) > limit:
+        start_ts, entry_id, position = page[limit - 1][0]
+        cursor = f"{start_ts!r}|{entry_id}|{position}"
+    return {"trips": trips, ATTR_CURSOR: cursor}
+
+
+def _aggregate(history, positions, group_by: str, area) -> dict[str, list]:
+    """Sum the trips at ``positions`` per period. Runs in the executor."""
+    groups: dict[str, list] = {}
+    for chunk in history.iter_chunks(positions):
+        for trip in chunk:
+            if not _in_area(trip, area):
+                continue
+            day = datetime.fromisoformat(trip[ATTR_START_TIME]).date()
+            sums = groups.setdefault(
+                period_start(group_by, day).isoformat(), [0] * (len(AGGREGATED) + 2)
+            )
+            sums[0] += 1
+            for index, name in enumerate(AGGREGATED, 1):
+                sums[index] += trip.get(name) or 0
+            # Distance of trips with a known energy use, for the consumption
+            if trip.get(ATTR_ENERGY_USED) is not None and trip.get(ATTR_DISTANCE):
+                sums[-1] += trip[ATTR_DISTANCE]
+    return groups
+
+
+async def _async_aggregate(
+    hass: HomeAssistant, vehicles: dict, area, msg: dict
+) -> dict:
+    """Return trip count and totals per day, week or month."""
+    start, end = _time_range(msg)
+    groups: dict[str, list] = {}
+    for data in vehicles.values():
+        history = data["history"]
+        await history.async_flush()
+        for period, sums in (
+            await hass.async_add_executor_job(
+                _aggregate,
+                history,
+                history.positions(start, end),
+                msg[ATTR_GROUP_BY],
+                area,
+            )
+        ).items():
+            total = groups.setdefault(period, [0] * len(sums))
+            for index, value in enumerate(sums):
+                total[index] += value
+
+    result = []
+    for period in sorted(groups):
+        trips, distance_sum, energy, duration, metered_distance = groups[period]
+        result.append(
+            {
+                "period": period,
+                "trips": trips,
+                ATTR_DISTANCE: round(distance_sum, 2),
+                ATTR_ENERGY_USED: round(energy, 2),
+                ATTR_DURATION: round(duration, 2),
+                # Weighted by the distance with a known energy use, like the
+                # statistics sensors
+                ATTR_ENERGY_CONSUMPTION: (
+                    round(energy / metered_distance * 100, 2)
+                    if metered_distance
+                    else None
+                ),
+                ATTR_AVG_SPEED: (
+                    round(distance_sum / duration * 60, 1) if duration else None
+                ),
+            }
+        )
+    return {ATTR_GROUP_BY: msg[ATTR_GROUP_BY], "groups": result}
+
+
+@websocket_api.websocket_command(
+    {
+        vol.Required("type"): WS_TYPE_TRIPS_LIST,
+        **FILTER_SCHEMA,
+        vol.Optional(ATTR_CURSOR): vol.All(cv.string, _cursor),
+        vol.Optional(ATTR_LIMIT, default=WEBSOCKET_PAGE_SIZE): vol.All(
+            vol.Coerce(int), vol.Range(min=1, max=WEBSOCKET_MAX_PAGE_SIZE)
+        ),
+    }
+)
+@websocket_api.async_response
+async def ws_list_trips(hass: HomeAssistant, connection, msg: dict) -> None:
+    """Send a page of stored trips, newest first."""
+    await _async_send_cached(hass, connection, msg, _async_list)
+
+
+@websocket_api.websocket_command(
+    {
+        vol.Required("type"): WS_TYPE_TRIPS_AGGREGATE,
+        **FILTER_SCHEMA,
+        vol.Optional(ATTR_GROUP_BY, default=PERIOD_DAY): vol.In(
+            (PERIOD_DAY, PERIOD_WEEK, PERIOD_MONTH)
+        ),
+    }
+)
+@websocket_api.async_response
+async def ws_aggregate_trips(hass: HomeAssistant, connection, msg: dict) -> None:
+    """Send the stored trips summed per day, week or month."""
+    await _async_send_cached(hass, connection, msg, _async_aggregate)
+
+
+@websocket_api.websocket_command(
+    {
+        vol.Required("type"): WS_TYPE_TRIP_SAMPLES,
+        vol.Required(ATTR_CONFIG_ENTRY_ID): cv.string,
+        vol.Required(ATTR_START_TIME): vol.All(cv.string, _start_time),
+        vol.Optional(ATTR_COLUMNS): vol.All(cv.ensure_list, [cv.string]),
+    }
+)
+@websocket_api.async_response
+async def ws_trip_samples(hass: HomeAssistant, connection, msg: dict) -> None:
+    """Send the stored samples and route of one trip.
+
+    Only the requested sample columns are decoded, all of them by default.
+    """
+    entry_id = msg[ATTR_CONFIG_ENTRY_ID]
+    await async_wait_loaded(hass, [entry_id])
+    if (data := hass.data.get(DOMAIN, {}).get(entry_id)) is None:
+        connection.send_error(
+            msg["id"], websocket_api.ERR_NOT_FOUND, f"Unknown vehicle {entry_id}"
+        )
+        return
+    start_time = msg[ATTR_START_TIME]
+    samples = await data["samples"].async_get(start_time, msg.get(ATTR_COLUMNS))
+    routes = data.get("routes")
+    route = await routes.async_get(start_time) if routes is not None else None
+    if samples is None and route is None:
+        connection.send_error(
+            msg["id"],
+            websocket_api.ERR_NOT_FOUND,
+            f"No samples stored for the trip started at {start_time}",
+        )
+        return
+    connection.send_result(
+        msg["id"], {ATTR_START_TIME: start_time, "samples": samples, "route": route}
+    )
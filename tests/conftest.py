@@ -0,0 +1,18 @@
+"""Fixtures for EV Trip Tracker tests."""
+
+import pytest
+
+pytest_plugins = "pytest_homeassistant_custom_component"
+
+
+@pytest.fixture(autouse=True)
+def auto_enable_custom_integrations(enable_custom_integrations):
+    """Enable the integration in every test."""
+    yield
+
+
+@pytest.fixture
+def storage_hass(hass, tmp_path):
+    """Return hass with a config dir of its own, so store files start empty."""
+    hass.config.config_dir = str(tmp_path)
+    return hass
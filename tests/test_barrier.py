@@ -0,0 +1,226 @@
+"""Tests for the fresh-reading barrier."""
+
+import asyncio
+from datetime import timedelta
+
+import pytest
+from homeassistant.core import Event, State
+from homeassistant.util import dt as dt_util
+from pytest_homeassistant_custom_component.common import (
+    MockConfigEntry,
+    async_fire_time_changed,
+)
+
+from custom_components.ev_trip_tracker import coordinator
+from custom_components.ev_trip_tracker.barrier import async_wait_fresh, is_fresh
+from custom_components.ev_trip_tracker.const import (
+    ATTR_END_ODOMETER,
+    ATTR_ENERGY_CONSUMPTION,
+    CONF_BATTERY_CAPACITY,
+    CONF_BATTERY_SENSOR,
+    CONF_CHARGING_STATE_SENSOR,
+    CONF_DRIVING_STATE_SENSOR,
+    CONF_LOCATION_TRACKER,
+    CONF_ODOMETER_SENSOR,
+    DOMAIN,
+    FRESH_READING_TIMEOUT,
+)
+
+ODOMETER = "sensor.car_odometer"
+BATTERY = "sensor.car_battery"
+DRIVING = "binary_sensor.car_driving"
+CHARGING = "sensor.car_charging"
+TIMEOUT = 30
+
+
+@pytest.fixture
+def reports(monkeypatch) -> dict:
+    """Capture the state report listener, which older Home Assistant lacks."""
+    listeners = {}
+
+    def track_reports(hass, entity_ids, action):
+        listeners.update(dict.fromkeys(entity_ids, action))
+        return listeners.clear
+
+    monkeypatch.setattr(coordinator, "async_track_state_report_event", track_reports)
+    return listeners
+
+
+def _report(hass, listeners: dict, entity_id: str) -> None:
+    """Report an entity's unchanged state again, the way Home Assistant does."""
+    state = hass.states.get(entity_id)
+    reported = State(
+        state.entity_id,
+        state.state,
+        state.attributes,
+        last_changed=state.last_changed,
+        last_updated=state.last_updated,
+    )
+    reported.last_reported = dt_util.utcnow()
+    listeners[entity_id](
+        Event("state_reported", {"entity_id": entity_id, "new_state": reported})
+    )
+
+
+def _since(hass, freezer):
+    """Set the readings before the transition and return its time."""
+    hass.states.async_set(ODOMETER, "1000.0")
+    hass.states.async_set(BATTERY, "80")
+    freezer.tick(timedelta(seconds=1))
+    return dt_util.utcnow()
+
+
+async def _until(condition) -> None:
+    """Let the background tasks run until ``condition`` holds."""
+    async with asyncio.timeout(1):
+        while not condition():
+            await asyncio.sleep(0)
+
+
+def test_is_fresh() -> None:
+    """Only valid readings reported since the transition are fresh."""
+    state = State(ODOMETER, "1000.0")
+    since = state.last_updated
+    assert is_fresh(state, since)
+    assert not is_fresh(state, since + timedelta(seconds=1))
+    assert not is_fresh(State(ODOMETER, "unavailable"), since)
+    assert not is_fresh(State(ODOMETER, "unknown"), since)
+    assert not is_fresh(None, since)
+
+    # An unchanged report moves last_reported only
+    state.last_reported = since + timedelta(seconds=5)
+    assert is_fresh(state, since + timedelta(seconds=1))
+
+
+async def test_returns_at_once_when_fresh(hass) -> None:
+    """Readings already taken since the transition need no waiting."""
+    since = dt_util.utcnow()
+    hass.states.async_set(ODOMETER, "1000.0")
+    fresh = await async_wait_fresh(hass, [ODOMETER], since, TIMEOUT)
+    assert fresh[ODOMETER].state == "1000.0"
+
+
+async def test_waits_for_changed_readings(hass, freezer, reports) -> None:
+    """The barrier lifts when every entity reported a new reading."""
+    since = _since(hass, freezer)
+    task = asyncio.create_task(
+        async_wait_fresh(hass, [ODOMETER, BATTERY], since, TIMEOUT)
+    )
+    await hass.async_block_till_done()
+    assert not task.done()
+
+    hass.states.async_set(ODOMETER, "1012.5")
+    await hass.async_block_till_done()
+    assert not task.done()
+    hass.states.async_set(BATTERY, "77")
+    # A later reading may already belong to the next trip
+    hass.states.async_set(ODOMETER, "1013.0")
+    await hass.async_block_till_done()
+
+    fresh = await task
+    assert fresh[ODOMETER].state == "1012.5"
+    assert fresh[BATTERY].state == "77"
+    # Nothing is routed to the barrier any more
+    fleet = coordinator.async_get_coordinator(hass)
+    assert not fleet._routes
+    assert not fleet._report_routes
+
+
+async def test_unchanged_report_is_fresh(hass, freezer, reports) -> None:
+    """A sensor reporting the same value again counts as a fresh reading."""
+    since = _since(hass, freezer)
+    task = asyncio.create_task(
+        async_wait_fresh(hass, [ODOMETER, BATTERY], since, TIMEOUT)
+    )
+    await hass.async_block_till_done()
+    assert set(reports) == {ODOMETER, BATTERY}
+
+    # Parked: the odometer did not move, the battery did
+    _report(hass, reports, ODOMETER)
+    hass.states.async_set(BATTERY, "79")
+    await hass.async_block_till_done()
+
+    fresh = await task
+    assert fresh[ODOMETER].state == "1000.0"
+    assert fresh[ODOMETER].last_updated < since
+    assert fresh[BATTERY].state == "79"
+
+
+async def test_gives_up_after_timeout(hass, freezer, reports) -> None:
+    """Entities that do not report in time are left out."""
+    since = _since(hass, freezer)
+    task = asyncio.create_task(
+        async_wait_fresh(hass, [ODOMETER, BATTERY], since, TIMEOUT)
+    )
+    await hass.async_block_till_done()
+    hass.states.async_set(BATTERY, "unavailable")
+    hass.states.async_set(ODOMETER, "1012.5")
+    await hass.async_block_till_done()
+    assert not task.done()
+
+    freezer.tick(timedelta(seconds=TIMEOUT))
+    async_fire_time_changed(hass)
+    await hass.async_block_till_done()
+
+    fresh = await task
+    assert set(fresh) == {ODOMETER}
+
+
+async def test_model_learns_the_corrected_trip(
+    storage_hass, freezer, monkeypatch, reports
+) -> None:
+    """A trip corrected by late readings is learned with them, not before."""
+    hass = storage_hass
+    hass.states.async_set(DRIVING, "off")
+    hass.states.async_set(CHARGING, "disconnected")
+    hass.states.async_set(ODOMETER, "1000.0")
+    hass.states.async_set(BATTERY, "80")
+    entry = MockConfigEntry(
+        domain=DOMAIN,
+        data={
+            CONF_DRIVING_STATE_SENSOR: DRIVING,
+            CONF_CHARGING_STATE_SENSOR: CHARGING,
+            CONF_ODOMETER_SENSOR: ODOMETER,
+            CONF_BATTERY_SENSOR: BATTERY,
+            CONF_LOCATION_TRACKER: "device_tracker.car",
+            CONF_BATTERY_CAPACITY: 77,
+        },
+    )
+    entry.add_to_hass(hass)
+    assert await hass.config_entries.async_setup(entry.entry_id)
+    await hass.async_block_till_done()
+    data = hass.data[DOMAIN][entry.entry_id]
+    await data["loaded"].wait()
+
+    learned = []
+    monkeypatch.setattr(
+        data["model"], "async_add_trips", lambda trips: learned.extend(trips)
+    )
+
+    async def tick(minutes: float) -> None:
+        freezer.tick(timedelta(minutes=minutes))
+        async_fire_time_changed(hass)
+        await hass.async_block_till_done()
+
+    await tick(1)
+    hass.states.async_set(DRIVING, "on")
+    await tick(10)
+    hass.states.async_set(ODOMETER, "1020.0")
+    hass.states.async_set(BATTERY, "76")
+    await tick(10)
+    # Plugged in, while the car still has to report its last readings
+    hass.states.async_set(CHARGING, "charging")
+    # The route is derived in the executor before the barrier is raised
+    await _until(lambda: ODOMETER in reports)
+    await tick(FRESH_READING_TIMEOUT / 60)
+    (stored,) = await data["history"].async_get_last(1)
+    assert stored[ATTR_END_ODOMETER] == 1020.0
+    assert learned == []
+
+    hass.states.async_set(ODOMETER, "1030.0")
+    hass.states.async_set(BATTERY, "75")
+    await _until(lambda: learned)
+    assert [trip[ATTR_END_ODOMETER] for trip in learned] == [1030.0]
+    # 3.85 kWh over 30 km rather than the stale 3.08 kWh over 20 km
+    assert learned[0][ATTR_ENERGY_CONSUMPTION] == 12.83
+    await hass.config_entries.async_unload(entry.entry_id)
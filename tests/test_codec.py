@@ -0,0 +1,156 @@
+"""Tests for the columnar sample encoding and the sample store."""
+
+import math
+import os
+
+import pytest
+
+from custom_components.ev_trip_tracker.codec import (
+    ENCODING_MISSING,
+    ENCODING_SCALED,
+    ENCODING_XOR,
+    FLAG_BITMAP,
+    SampleReader,
+    SampleStore,
+    _SAMPLES_HEADER,
+    _encode_values,
+    encode_samples,
+)
+from custom_components.ev_trip_tracker.sampler import COLUMN_TIME
+
+START_TIME = "2024-03-01T08:00:00+00:00"
+
+
+def _same(decoded, values) -> bool:
+    """Compare bit for bit, so NaN matches NaN and -0.0 differs from 0.0."""
+    return len(decoded) == len(values) and all(
+        (math.isnan(a) and math.isnan(b))
+        or (a == b and math.copysign(1.0, a) == math.copysign(1.0, b))
+        for a, b in zip(decoded, values)
+    )
+
+
+def _round_trip(columns: dict) -> SampleReader:
+    reader = SampleReader(encode_samples(columns))
+    assert len(reader) == len(columns[COLUMN_TIME])
+    assert reader.names == list(columns)
+    return reader
+
+
+@pytest.mark.parametrize(
+    ("values", "kind"),
+    [
+        ([1.5, 1.25, 1.0, 0.75], ENCODING_SCALED),
+        (
+            [12345.6, math.nan, 12345.8, math.nan, 12346.0],
+            ENCODING_SCALED | FLAG_BITMAP,
+        ),
+        ([math.pi, math.e, 1 / 3, 2**0.5], ENCODING_XOR),
+        ([math.nan, math.pi, math.nan, 1 / 3], ENCODING_XOR | FLAG_BITMAP),
+        ([0.0, -0.0, 0.5], ENCODING_XOR),
+        ([1e300, -1e-300, 5e-324], ENCODING_XOR),
+        ([math.nan] * 4, ENCODING_MISSING),
+    ],
+)
+def test_value_columns_round_trip(values, kind) -> None:
+    """Value columns decode exactly, with the expected encoding."""
+    assert _encode_values(values)[0] == kind
+    times = [1_700_000_000.0 + index for index in range(len(values))]
+    reader = _round_trip({COLUMN_TIME: times, "value": values})
+    assert _same(reader.column("value"), values)
+
+
+def test_repeated_values_cost_one_byte() -> None:
+    """An unchanged float XORs to zero and is stored as a single byte."""
+    kind, payload = _encode_values([math.pi] * 100)
+    assert kind == ENCODING_XOR
+    assert len(payload) == 8 + 1 + 99
+
+
+def test_bitmap_spans_several_bytes() -> None:
+    """Presence bits beyond the first byte map to the right rows."""
+    values = [float(row) if row % 3 else math.nan for row in range(21)]
+    times = [float(row) for row in range(21)]
+    reader = _round_trip({COLUMN_TIME: times, "value": values})
+    assert _same(reader.column("value"), values)
+
+
+def test_time_delta_of_delta() -> None:
+    """Timestamps keep their milliseconds through irregular intervals."""
+    times = [
+        1_709_280_000.0,
+        1_709_280_001.0,
+        1_709_280_002.0,
+        1_709_280_002.25,
+        1_709_280_010.5,
+        1_709_280_010.501,
+        1_709_280_009.999,
+    ]
+    reader = _round_trip({COLUMN_TIME: times})
+    assert list(reader.column(COLUMN_TIME)) == times
+
+
+def test_time_steady_rate_is_compact() -> None:
+    """A steady sample rate costs one byte per sample after the first two."""
+    times = [1_709_280_000.0 + 5 * index for index in range(100)]
+    steady = encode_samples({COLUMN_TIME: times})
+    single = encode_samples({COLUMN_TIME: times[:1]})
+    assert len(steady) - len(single) <= 2 + 99
+
+
+def test_columns_decode_independently() -> None:
+    """Each column decodes on its own, and unknown data is rejected."""
+    times = [1_709_280_000.0, 1_709_280_005.0]
+    reader = _round_trip(
+        {COLUMN_TIME: times, "odometer": [100.1, 100.2], "power": [math.nan] * 2}
+    )
+    assert list(reader.column("odometer")) == [100.1, 100.2]
+    assert all(math.isnan(value) for value in reader.column("power"))
+    with pytest.raises(ValueError):
+        SampleReader(b"JSON{}")
+
+
+async def test_store_ignores_truncated_tail(storage_hass) -> None:
+    """A partially written last series is left out of the index."""
+    store = SampleStore(storage_hass, "entry")
+    data = encode_samples({COLUMN_TIME: [1.0, 2.0], "odometer": [10.5, 10.75]})
+    store.async_append(START_TIME, data)
+    await store.async_flush()
+    complete = os.path.getsize(store.path)
+
+    with open(store.path, "ab") as file:
+        file.write(_SAMPLES_HEADER.pack(1_709_290_000.0, len(data)) + data[:-3])
+
+    reloaded = SampleStore(storage_hass, "entry")
+    await reloaded.async_load()
+    assert reloaded._size == complete
+    assert await reloaded.async_get(START_TIME, ["odometer"]) == {
+        "odometer": [10.5, 10.75]
+    }
+
+    # The next series overwrites the partial one
+    later = "2024-03-01T09:00:00+00:00"
+    reloaded.async_append(later, data)
+    await reloaded.async_flush()
+    assert os.path.getsize(reloaded.path) == 2 * complete
+    again = SampleStore(storage_hass, "entry")
+    await again.async_load()
+    assert await again.async_get(later) == {
+        COLUMN_TIME: [1.0, 2.0],
+        "odometer": [10.5, 10.75],
+    }
+
+
+async def test_store_ignores_truncated_header(storage_hass) -> None:
+    """A file cut inside the header of a series indexes the series before it."""
+    store = SampleStore(storage_hass, "entry")
+    store.async_append(START_TIME, encode_samples({COLUMN_TIME: [1.0]}))
+    await store.async_flush()
+    complete = os.path.getsize(store.path)
+    with open(store.path, "ab") as file:
+        file.write(b"\x00" * (_SAMPLES_HEADER.size - 1))
+
+    reloaded = SampleStore(storage_hass, "entry")
+    await reloaded.async_load()
+    assert reloaded._size == complete
+    assert await reloaded.async_get(START_TIME) == {COLUMN_TIME: [1.0]}
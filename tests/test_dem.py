@@ -0,0 +1,66 @@
+"""Tests for the offline elevation lookup from .hgt tiles."""
+
+import struct
+
+import pytest
+
+from custom_components.ev_trip_tracker.dem import VOID, ElevationTiles, tile_name
+
+
+def _write_tile(path, rows: list[list[int]]) -> None:
+    """Write samples as a tile, rows from north to south."""
+    values = [value for row in rows for value in row]
+    path.write_bytes(struct.pack(f">{len(values)}h", *values))
+
+
+@pytest.fixture
+def tiles(tmp_path):
+    """A 3x3 tile that rises 100 m per row south and 10 m per column east."""
+    _write_tile(
+        tmp_path / "N52E004.hgt",
+        [[100 * row + 10 * col for col in range(3)] for row in range(3)],
+    )
+    tiles = ElevationTiles(str(tmp_path))
+    yield tiles
+    tiles.close()
+
+
+def test_tile_names() -> None:
+    """Tiles are named after their south-west corner."""
+    assert tile_name(52.4, 4.9) == "N52E004.hgt"
+    assert tile_name(-33.9, -70.6) == "S34W071.hgt"
+    assert tile_name(0.5, -0.5) == "N00W001.hgt"
+
+
+def test_samples_at_grid_points(tiles) -> None:
+    """Coordinates on the grid return the sample itself."""
+    # The northern edge belongs to the tile above
+    assert tiles.elevation(53.0, 4.0) is None
+    assert tiles.elevation(52.0, 4.0) == 200
+    assert tiles.elevation(52.5, 4.5) == 110
+    assert tiles.elevation(52.0, 4.5) == 210
+
+
+def test_bilinear_between_samples(tiles) -> None:
+    """Between samples the elevation is interpolated in both directions."""
+    assert tiles.elevation(52.75, 4.25) == 55
+    assert tiles.elevation(52.25, 4.75) == 165
+    assert tiles.elevation(52.6, 4.1) == pytest.approx(82.0)
+
+
+def test_void_samples_are_left_out(tmp_path) -> None:
+    """Missing samples do not count, only an all-void cell has no elevation."""
+    _write_tile(tmp_path / "N52E004.hgt", [[VOID, 20, 0], [40, 60, 0], [0, 0, 0]])
+    tiles = ElevationTiles(str(tmp_path))
+    # The three valid corners, reweighted
+    assert tiles.elevation(52.75, 4.25) == 40
+    _write_tile(tmp_path / "N53E004.hgt", [[VOID] * 3] * 3)
+    assert tiles.elevation(53.75, 4.25) is None
+    tiles.close()
+
+
+def test_missing_and_invalid_tiles(tiles, tmp_path) -> None:
+    """Coordinates without a usable tile have no elevation."""
+    assert tiles.elevation(48.5, 2.5) is None
+    (tmp_path / "N48E003.hgt").write_bytes(b"\0" * 10)
+    assert tiles.elevation(48.5, 3.5) is None
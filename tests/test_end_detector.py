@@ -0,0 +1,107 @@
+"""Tests for the adaptive trip end delay."""
+
+import pytest
+from homeassistant.core import State
+
+from custom_components.ev_trip_tracker.const import (
+    END_DELAY_LEARNED_MIN,
+    END_DELAY_LOCKED,
+    END_DELAY_ZONE,
+    END_LEARNED_MARGIN,
+    END_LEARNED_PLACES,
+)
+from custom_components.ev_trip_tracker.end_detector import (
+    TripEndDetector,
+    in_zone,
+    is_locked,
+    is_plugged,
+    stop_cell,
+)
+
+MAX_DELAY = 1800
+CELL = stop_cell(52.0, 4.0)
+
+
+@pytest.mark.parametrize(
+    ("evidence", "expected"),
+    [
+        ({}, MAX_DELAY),
+        ({"plugged": True}, 0),
+        ({"plugged": True, "moving": True}, 0),
+        ({"locked": True}, END_DELAY_LOCKED),
+        ({"zone": True}, END_DELAY_ZONE),
+        ({"locked": True, "zone": True}, END_DELAY_LOCKED),
+        ({"locked": True, "moving": True}, MAX_DELAY),
+        ({"zone": True, "moving": True}, MAX_DELAY),
+    ],
+)
+def test_delay_from_evidence(evidence: dict, expected: float) -> None:
+    """Plugged ends at once, locked and zone end early unless still moving."""
+    assert TripEndDetector(MAX_DELAY).delay(CELL, **evidence) == expected
+
+
+def test_delay_never_exceeds_configured() -> None:
+    """The configured delay caps the locked, zone and learned delays."""
+    detector = TripEndDetector(10)
+    assert detector.delay(CELL, locked=True) == 10
+    assert detector.delay(CELL, zone=True) == 10
+    detector.learn(CELL, 8)
+    assert detector.delay(CELL, locked=True) == 10
+
+
+def test_learned_stops_hold_the_trip_open() -> None:
+    """Where driving resumed before, the trip waits longer than that stop."""
+    detector = TripEndDetector(MAX_DELAY)
+    detector.learn(CELL, 20)
+    # Never shorter than the learned minimum, even when locked
+    assert detector.delay(CELL, locked=True) == END_DELAY_LEARNED_MIN
+
+    detector.learn(CELL, 300)
+    detector.learn(CELL, 100)
+    assert detector.delay(CELL, zone=True) == 300 * END_LEARNED_MARGIN
+    # Other places and plugged cars are unaffected
+    assert detector.delay(stop_cell(48.0, 2.0), locked=True) == END_DELAY_LOCKED
+    assert detector.delay(CELL, plugged=True) == 0
+    assert detector.delay(None, locked=True) == END_DELAY_LOCKED
+
+
+def test_learn_ignores_long_stops_and_forgets_oldest() -> None:
+    """Stops beyond the configured delay are not learned, and memory is bounded."""
+    detector = TripEndDetector(MAX_DELAY)
+    detector.learn(CELL, MAX_DELAY + 1)
+    detector.learn(None, 10)
+    assert detector.as_dict() == {}
+
+    for i in range(END_LEARNED_PLACES + 1):
+        detector.learn(f"cell{i}", 10)
+    assert len(detector.as_dict()) == END_LEARNED_PLACES
+    assert "cell0" not in detector.as_dict()
+
+    restored = TripEndDetector(MAX_DELAY)
+    restored.load(detector.as_dict())
+    assert restored.delay("cell1") == END_DELAY_LEARNED_MIN
+
+
+def test_parked_evidence_from_states() -> None:
+    """Lock, plug and zone states are read the way integrations report them."""
+    assert is_locked(State("lock.car", "locked"))
+    assert not is_locked(State("lock.car", "unlocked"))
+    # A lock binary sensor is on when unlocked
+    assert is_locked(State("binary_sensor.car_lock", "off", {"device_class": "lock"}))
+    assert not is_locked(
+        State("binary_sensor.car_lock", "on", {"device_class": "lock"})
+    )
+    assert is_locked(State("binary_sensor.car_locked", "on"))
+    assert not is_locked(None)
+
+    assert is_plugged(State("binary_sensor.car_plug", "on"))
+    assert not is_plugged(State("binary_sensor.car_plug", "off"))
+    assert not is_plugged(None)
+
+    assert in_zone(State("device_tracker.car", "home"))
+    assert in_zone(State("device_tracker.car", "Work"))
+    assert not in_zone(State("device_tracker.car", "not_home"))
+    assert not in_zone(State("device_tracker.car", "unavailable"))
+
+    assert stop_cell(None, 4.0) is None
+    assert stop_cell(52.0, 4.0) == stop_cell(52.0001, 4.0001)
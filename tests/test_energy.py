@@ -0,0 +1,96 @@
+"""Tests for trip energy from power and battery energy samples."""
+
+import math
+
+import pytest
+
+from custom_components.ev_trip_tracker.const import (
+    ATTR_DISTANCE,
+    ATTR_END_BATTERY,
+    ATTR_END_ODOMETER,
+    ATTR_END_TIME,
+    ATTR_ENERGY_CONSUMPTION,
+    ATTR_ENERGY_REGENERATED,
+    ATTR_ENERGY_USED,
+    ATTR_START_BATTERY,
+    ATTR_START_ODOMETER,
+    ATTR_START_TIME,
+    CONF_BATTERY_CAPACITY,
+    CONF_POWER_SENSOR,
+)
+from custom_components.ev_trip_tracker.energy import (
+    calculate_trip_metrics,
+    energy_from_content,
+    integrate_power,
+)
+from custom_components.ev_trip_tracker.sampler import (
+    COLUMN_POWER,
+    SampleBuffer,
+)
+
+HOUR = 3600
+
+
+def test_constant_power() -> None:
+    """A constant draw integrates to power times time."""
+    times = range(0, HOUR + 1, 60)
+    assert integrate_power(times, [20.0] * len(times)) == pytest.approx((20.0, 0.0))
+    assert integrate_power(times, [-5.0] * len(times)) == pytest.approx((0.0, 5.0))
+
+
+def test_trapezoids_between_samples() -> None:
+    """Power changing linearly between samples is integrated exactly."""
+    assert integrate_power([0, HOUR], [10.0, 30.0]) == pytest.approx((20.0, 0.0))
+    # Missing samples are bridged
+    assert integrate_power(
+        [0, HOUR / 2, HOUR], [10.0, math.nan, 30.0]
+    ) == pytest.approx((20.0, 0.0))
+    assert integrate_power([0], [10.0]) is None
+
+
+def test_zero_crossing_is_split() -> None:
+    """Consumption and regeneration in one segment do not cancel out."""
+    consumed, regenerated = integrate_power([0, HOUR], [30.0, -10.0])
+    # Drawing for the first three quarters, regenerating for the rest
+    assert consumed == pytest.approx(30.0 * 0.75 / 2)
+    assert regenerated == pytest.approx(10.0 * 0.25 / 2)
+
+
+def test_energy_from_content() -> None:
+    """Drops in the battery energy are consumed, rises regenerated."""
+    assert energy_from_content([60.0, 59.0, math.nan, 59.5, 57.0]) == pytest.approx(
+        (3.5, 0.5)
+    )
+    assert energy_from_content([60.0]) is None
+
+
+def _trip() -> dict:
+    return {
+        ATTR_START_TIME: "2024-03-01T08:00:00+00:00",
+        ATTR_END_TIME: "2024-03-01T09:00:00+00:00",
+        ATTR_START_ODOMETER: 1000.0,
+        ATTR_END_ODOMETER: 1100.0,
+        ATTR_START_BATTERY: 80.0,
+        ATTR_END_BATTERY: 60.0,
+    }
+
+
+def test_trip_energy_prefers_power_samples() -> None:
+    """Sampled power replaces the coarse battery percentage."""
+    config = {CONF_BATTERY_CAPACITY: 77, CONF_POWER_SENSOR: "sensor.car_power"}
+    trip = _trip()
+    calculate_trip_metrics(trip, config)
+    assert trip[ATTR_DISTANCE] == 100.0
+    assert trip[ATTR_ENERGY_USED] == 15.4
+    assert trip[ATTR_ENERGY_CONSUMPTION] == 15.4
+
+    samples = SampleBuffer(capacity=8, min_interval=1)
+    for minute, power in ((0, 16.0), (30, 16.0), (45, -4.0), (60, 16.0)):
+        samples.add(minute * 60, {COLUMN_POWER: power})
+    trip = _trip()
+    calculate_trip_metrics(trip, config, samples)
+    # 8 kWh at constant power, then 1.6 kWh drawn and 0.1 kWh regenerated
+    # on either side of each zero crossing
+    assert trip[ATTR_ENERGY_USED] == 11.0
+    assert trip[ATTR_ENERGY_REGENERATED] == 0.2
+    assert trip[ATTR_ENERGY_CONSUMPTION] == 11.0
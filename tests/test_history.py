@@ -0,0 +1,180 @@
+"""Tests for the trip history store."""
+
+import math
+import os
+import struct
+from datetime import datetime
+
+import pytest
+
+from custom_components.ev_trip_tracker.const import (
+    ATTR_AVG_POWER,
+    ATTR_CHARGE_TYPE,
+    ATTR_DISTANCE,
+    ATTR_END_ODOMETER,
+    ATTR_END_TIME,
+    ATTR_ENERGY_ADDED,
+    ATTR_ENERGY_USED,
+    ATTR_START_ODOMETER,
+    ATTR_START_TIME,
+    CHARGE_TYPES,
+)
+from custom_components.ev_trip_tracker.history import (
+    MAGIC,
+    RECORD_KIND_CHARGING,
+    VERSION,
+    TripHistoryStore,
+    _FIELDS,
+    _HEADER,
+    _RECORD,
+    decode_trip,
+    encode_trip,
+)
+
+
+def _trip(hour: int, odometer: float = 1000.0) -> dict:
+    return {
+        ATTR_START_TIME: f"2024-03-01T{hour:02d}:00:00",
+        ATTR_END_TIME: f"2024-03-01T{hour:02d}:30:00",
+        ATTR_START_ODOMETER: odometer,
+        ATTR_END_ODOMETER: odometer + 12.34,
+        ATTR_DISTANCE: 12.34,
+        ATTR_ENERGY_USED: 2.1,
+    }
+
+
+async def _store_with_trips(hass, count: int) -> TripHistoryStore:
+    store = TripHistoryStore(hass, "entry")
+    await store.async_load()
+    for hour in range(count):
+        store.async_append(_trip(hour, 1000.0 + 20 * hour))
+    await store.async_flush()
+    return store
+
+
+def test_record_round_trip() -> None:
+    """Trips and charging sessions decode to what was encoded."""
+    trip = decode_trip(encode_trip(_trip(8)))
+    assert trip[ATTR_START_TIME] == "2024-03-01T08:00:00"
+    assert trip[ATTR_END_ODOMETER] == 1012.34
+    assert trip[ATTR_DISTANCE] == 12.34
+    assert ATTR_ENERGY_ADDED not in trip
+    assert ATTR_AVG_POWER not in trip
+
+    session = {
+        ATTR_START_TIME: "2024-03-01T18:00:00",
+        ATTR_END_TIME: "2024-03-01T20:00:00",
+        ATTR_ENERGY_ADDED: 22.5,
+        ATTR_CHARGE_TYPE: CHARGE_TYPES[-1],
+    }
+    charge = decode_trip(encode_trip(session, RECORD_KIND_CHARGING))
+    assert charge[ATTR_ENERGY_ADDED] == 22.5
+    assert charge[ATTR_CHARGE_TYPE] == CHARGE_TYPES[-1]
+    assert charge[ATTR_AVG_POWER] is None
+    assert ATTR_DISTANCE not in charge
+
+
+async def test_load_drops_truncated_tail(storage_hass) -> None:
+    """A partially written last record is not indexed."""
+    store = await _store_with_trips(storage_hass, 3)
+    with open(store.path, "ab") as file:
+        file.write(encode_trip(_trip(3))[: _RECORD.size // 2])
+
+    reloaded = TripHistoryStore(storage_hass, "entry")
+    await reloaded.async_load()
+    assert len(reloaded) == 3
+    trips = await reloaded.async_get_last(10)
+    assert [trip[ATTR_START_ODOMETER] for trip in trips] == [1040.0, 1020.0, 1000.0]
+
+    # The next trip overwrites the partial record
+    reloaded.async_append(_trip(4, 1080.0))
+    await reloaded.async_flush()
+    again = TripHistoryStore(storage_hass, "entry")
+    await again.async_load()
+    assert len(again) == 4
+    assert (await again.async_get_last(1))[0][ATTR_START_ODOMETER] == 1080.0
+
+
+async def test_read_raises_on_truncated_record(storage_hass) -> None:
+    """Reading a record cut off on disk raises instead of skipping it."""
+    store = await _store_with_trips(storage_hass, 2)
+    os.truncate(store.path, os.path.getsize(store.path) - 1)
+
+    assert store._read([0])[0][ATTR_START_ODOMETER] == 1000.0
+    with pytest.raises(ValueError, match="truncated"):
+        store._read([0, 1])
+    with pytest.raises(ValueError, match="truncated"):
+        list(store.iter_chunks([1]))
+
+
+async def test_migrate_older_layout(storage_hass) -> None:
+    """A file with fewer or reordered fields is rewritten to the current layout."""
+    old_names = [ATTR_END_ODOMETER, ATTR_START_ODOMETER, ATTR_DISTANCE, "retired"]
+    old_record = struct.Struct("<B3xdd" + "ddff")
+    names = ",".join(old_names).encode()
+    store = TripHistoryStore(storage_hass, "entry")
+    os.makedirs(os.path.dirname(store.path), exist_ok=True)
+    with open(store.path, "wb") as file:
+        file.write(_HEADER.pack(MAGIC, VERSION, old_record.size, len(names)) + names)
+        for hour in range(2):
+            start = 1_709_280_000.0 + 3600 * hour
+            file.write(
+                old_record.pack(0, start, start + 1800, 1012.5 + hour, 1000.0, 12.5, 1)
+            )
+        # Partially written trailing record
+        file.write(b"\x00" * (old_record.size - 4))
+
+    await store.async_load()
+    assert len(store) == 2
+    with open(store.path, "rb") as file:
+        magic, version, record_size, names_length = _HEADER.unpack(
+            file.read(_HEADER.size)
+        )
+        header_names = file.read(names_length).decode().split(",")
+    assert (magic, version, record_size) == (MAGIC, VERSION, _RECORD.size)
+    assert header_names == [name for name, _, _ in _FIELDS]
+    assert os.path.getsize(store.path) == _HEADER.size + names_length + 2 * _RECORD.size
+
+    trips = await store.async_get_range()
+    assert [trip[ATTR_END_ODOMETER] for trip in trips] == [1012.5, 1013.5]
+    assert all(trip[ATTR_START_ODOMETER] == 1000.0 for trip in trips)
+    assert all(trip[ATTR_DISTANCE] == 12.5 for trip in trips)
+    assert all(trip[ATTR_ENERGY_USED] is None for trip in trips)
+
+
+async def test_migrate_rejects_unknown_layout(storage_hass) -> None:
+    """A record size that does not match the field names is not guessed at."""
+    names = f"{ATTR_START_ODOMETER},{ATTR_DISTANCE}".encode()
+    store = TripHistoryStore(storage_hass, "entry")
+    os.makedirs(os.path.dirname(store.path), exist_ok=True)
+    with open(store.path, "wb") as file:
+        file.write(_HEADER.pack(MAGIC, VERSION, 99, len(names)) + names)
+
+    with pytest.raises(ValueError, match="unknown record layout"):
+        await store.async_load()
+
+
+async def test_nan_is_missing(storage_hass) -> None:
+    """Unknown values are stored as NaN and come back as None."""
+    store = await _store_with_trips(storage_hass, 0)
+    store.async_append({**_trip(9), ATTR_ENERGY_USED: None, ATTR_DISTANCE: math.nan})
+    trip = (await store.async_get_last(1))[0]
+    assert trip[ATTR_ENERGY_USED] is None
+    assert trip[ATTR_DISTANCE] is None
+
+
+async def test_has_trip_between_finds_overlaps(storage_hass) -> None:
+    """A trip that started before the window but reaches into it overlaps."""
+    store = await _store_with_trips(storage_hass, 2)
+
+    def at(hour: int, minute: int) -> datetime:
+        return datetime.fromisoformat(f"2024-03-01T{hour:02d}:{minute:02d}:00")
+
+    # Started within the window
+    assert store.has_trip_between(at(0, 50), at(1, 10))
+    # Started before the window and still running at its start
+    assert store.has_trip_between(at(1, 10), at(1, 50))
+    assert store.has_trip_between(at(0, 30), at(0, 45))
+    # Between the trips and after the last one
+    assert not store.has_trip_between(at(0, 40), at(0, 50))
+    assert not store.has_trip_between(at(1, 31), at(3, 0))
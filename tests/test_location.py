@@ -0,0 +1,228 @@
+"""Tests for the location client, its circuit breaker and the backlog."""
+
+import asyncio
+import time
+from types import SimpleNamespace
+
+import pytest
+
+from custom_components.ev_trip_tracker import location
+from custom_components.ev_trip_tracker.backlog import EnrichmentBacklog
+from custom_components.ev_trip_tracker.const import (
+    API_BACKOFF_MAX,
+    API_BACKOFF_MIN,
+    API_FAILURE_THRESHOLD,
+    LOCATION_REQUEST_TIMEOUT,
+)
+from custom_components.ev_trip_tracker.location import (
+    CircuitBreaker,
+    LocationDataClient,
+    LRUCache,
+    geohash_encode,
+    jittered_backoff,
+)
+from custom_components.ev_trip_tracker.metrics import (
+    COUNTER_API_REJECTED,
+    COUNTER_CACHE_HITS,
+    COUNTER_COALESCED,
+)
+
+URL = "https://weather.example/v1/forecast"
+POINTS = [(1_709_280_000.0, 52.0, 4.0)]
+
+
+@pytest.fixture
+def clock(monkeypatch) -> SimpleNamespace:
+    """Control the breaker's clock and take the longest jittered backoff."""
+    now = SimpleNamespace(value=1000.0)
+    monkeypatch.setattr(
+        location,
+        "time",
+        SimpleNamespace(monotonic=lambda: now.value, perf_counter=time.perf_counter),
+    )
+    monkeypatch.setattr(location, "random", SimpleNamespace(uniform=lambda a, b: b))
+    return now
+
+
+def _weather(temperature: float) -> dict:
+    return {"elevation": 3.0, "current_weather": {"temperature": temperature}}
+
+
+def _open(breaker: CircuitBreaker) -> None:
+    for _ in range(API_FAILURE_THRESHOLD - 1):
+        assert not breaker.record_failure()
+    assert breaker.record_failure()
+
+
+def test_geohash_cells() -> None:
+    """Nearby coordinates share a cell, and shorter hashes are coarser cells."""
+    assert geohash_encode(57.64911, 10.40744, 11) == "u4pruydqqvj"
+    assert geohash_encode(57.64911, 10.40744, 7) == "u4pruyd"
+    assert geohash_encode(57.64920, 10.40750, 7) == "u4pruyd"
+    assert geohash_encode(57.652, 10.40744, 7) != "u4pruyd"
+    assert geohash_encode(57.652, 10.40744, 5) == "u4pru"
+
+
+def test_lru_cache_evicts_least_recently_used() -> None:
+    """Reading an entry keeps it, the oldest untouched one is dropped."""
+    cache = LRUCache(2)
+    cache.set("a", 1)
+    cache.set("b", 2)
+    assert cache.get("a") == 1
+    cache.set("c", 3)
+    assert cache.get("b") is None
+    assert (cache.get("a"), cache.get("c"), len(cache)) == (1, 3, 2)
+
+
+def test_backoff_doubles_up_to_the_maximum(clock) -> None:
+    """Each retry waits twice as long, but never longer than the maximum."""
+    assert jittered_backoff(1) == API_BACKOFF_MIN
+    assert jittered_backoff(2) == 2 * API_BACKOFF_MIN
+    assert jittered_backoff(100) == API_BACKOFF_MAX
+
+
+def test_breaker_opens_after_failures_in_a_row(clock) -> None:
+    """Requests are refused once enough of them failed in a row."""
+    breaker = CircuitBreaker()
+    for _ in range(API_FAILURE_THRESHOLD - 1):
+        breaker.record_failure()
+    # A success in between starts the count over
+    breaker.record_success()
+    for _ in range(API_FAILURE_THRESHOLD - 1):
+        assert not breaker.record_failure()
+        assert breaker.allow()
+    assert breaker.record_failure()
+    assert breaker.is_open
+    assert not breaker.allow()
+    assert breaker.retry_in() == API_BACKOFF_MIN
+
+
+def test_breaker_half_open_probe(clock) -> None:
+    """After the backoff one probe goes out, and its failure doubles the wait."""
+    breaker = CircuitBreaker()
+    _open(breaker)
+
+    clock.value += API_BACKOFF_MIN - 1
+    assert not breaker.allow()
+    clock.value += 1
+    assert breaker.allow()
+    # Everything else waits for the probe
+    assert not breaker.allow()
+    assert breaker.retry_in() == LOCATION_REQUEST_TIMEOUT
+
+    assert breaker.record_failure()
+    assert breaker.is_open
+    assert breaker.retry_in() == 2 * API_BACKOFF_MIN
+
+
+def test_breaker_closes_on_probe_success(clock) -> None:
+    """A successful probe closes the circuit and tells the listeners once."""
+    breaker = CircuitBreaker()
+    calls = []
+    unsub = breaker.async_add_listener(lambda: calls.append(True))
+    breaker.record_success()
+    assert calls == []
+
+    _open(breaker)
+    clock.value += API_BACKOFF_MIN
+    assert breaker.allow()
+    breaker.record_success()
+    assert calls == [True]
+    assert not breaker.is_open
+    assert breaker.allow()
+    assert breaker.retry_in() == 0
+
+    unsub()
+    _open(breaker)
+    breaker.record_success()
+    assert calls == [True]
+
+
+async def test_client_caches_by_cell(hass, aioclient_mock, clock) -> None:
+    """A nearby coordinate is answered from the cache until the TTL expires."""
+    client = LocationDataClient(hass)
+    aioclient_mock.get(URL, json=_weather(12.5))
+    assert await client.async_get(52.0, 4.0, 600, url=URL) == {
+        "elevation": 3.0,
+        "temperature": 12.5,
+    }
+    assert await client.async_get(52.0001, 4.0001, 600, url=URL) == {
+        "elevation": 3.0,
+        "temperature": 12.5,
+    }
+    assert aioclient_mock.call_count == 1
+    assert client.metrics.counters[COUNTER_CACHE_HITS] == 1
+
+    clock.value += 600
+    await client.async_get(52.0, 4.0, 600, url=URL)
+    assert aioclient_mock.call_count == 2
+
+
+async def test_client_coalesces_requests(hass, aioclient_mock, clock) -> None:
+    """Concurrent lookups of a cell share one request to each API."""
+    client = LocationDataClient(hass)
+    aioclient_mock.get(URL, json=_weather(12.5))
+    aioclient_mock.get(URL + "/other", json=_weather(7.0))
+    results = await asyncio.gather(
+        client.async_get(52.0, 4.0, url=URL),
+        client.async_get(52.0001, 4.0001, url=URL),
+        client.async_get(52.0, 4.0, url=URL + "/other"),
+    )
+    assert [result["temperature"] for result in results] == [12.5, 12.5, 7.0]
+    assert aioclient_mock.call_count == 2
+    assert client.metrics.counters[COUNTER_COALESCED] == 1
+    assert not client._inflight
+
+
+async def test_client_fails_fast_while_open(hass, aioclient_mock, clock) -> None:
+    """An open circuit refuses requests until a probe gets through."""
+    client = LocationDataClient(hass)
+    recovered = []
+    client.breaker(URL).async_add_listener(lambda: recovered.append(True))
+
+    aioclient_mock.get(URL, status=500)
+    for _ in range(API_FAILURE_THRESHOLD + 2):
+        assert await client.async_get_hourly(POINTS, ("temperature_2m",), URL) is None
+    assert aioclient_mock.call_count == API_FAILURE_THRESHOLD
+    assert client.metrics.counters[COUNTER_API_REJECTED] == 2
+
+    aioclient_mock.clear_requests()
+    aioclient_mock.get(URL, json={"elevation": 3.0, "hourly": {}})
+    clock.value += API_BACKOFF_MIN
+    locations = await client.async_get_hourly(POINTS, ("temperature_2m",), URL)
+    assert locations == [{"elevation": 3.0, "hourly": {}}]
+    assert recovered == [True]
+    assert not client.breaker(URL).is_open
+    # Other URLs have breakers of their own
+    assert not client.breaker(URL + "/other").is_open
+
+
+async def test_backlog_flushes_when_circuit_closes(
+    storage_hass, clock, monkeypatch
+) -> None:
+    """Trips waiting for the weather are retried as soon as the API is back."""
+    breaker = location.async_get_location_client(storage_hass).breaker(URL)
+    _open(breaker)
+    backlog = EnrichmentBacklog(storage_hass, "entry", URL)
+    await backlog.async_load()
+
+    batches = []
+
+    async def flush_batch() -> bool:
+        batches.append(list(backlog.records))
+        backlog.records.clear()
+        return True
+
+    monkeypatch.setattr(backlog, "_async_flush_batch", flush_batch)
+    backlog.async_add(7)
+    await storage_hass.async_block_till_done()
+    # Waiting for the retry timer while the circuit is open
+    assert batches == []
+
+    clock.value += API_BACKOFF_MIN
+    assert breaker.allow()
+    breaker.record_success()
+    await storage_hass.async_block_till_done()
+    assert batches == [[7]]
+    assert backlog._unsub_retry is None
+    backlog.async_unload()
@@ -0,0 +1,135 @@
+"""Tests for the online consumption model."""
+
+import copy
+
+import numpy as np
+import pytest
+
+from custom_components.ev_trip_tracker import model as model_module
+from custom_components.ev_trip_tracker.const import (
+    ATTR_AVG_SPEED,
+    ATTR_AVG_TEMPERATURE,
+    ATTR_DISTANCE,
+    ATTR_ELEVATION_DIFF,
+    ATTR_ENERGY_CONSUMPTION,
+    MODEL_MIN_TRIPS,
+)
+from custom_components.ev_trip_tracker.model import (
+    ConsumptionModel,
+    RecursiveLeastSquares,
+    features,
+)
+
+# kWh/100 km: base, per 10 °C of heating and cooling, per 100 km/h, its
+# square, and per 10 m of climb per km
+THETA = np.array([12.0, 4.0, 2.0, 3.0, 6.0, 1.5])
+
+
+def _observations(count: int) -> list[np.ndarray]:
+    rng = np.random.default_rng(1)
+    return [
+        features(
+            float(rng.uniform(-10, 35)),
+            float(rng.uniform(20, 130)),
+            float(rng.uniform(-20, 20)),
+        )
+        for _ in range(count)
+    ]
+
+
+def _trained(count: int = 300, noise: float = 0.0) -> RecursiveLeastSquares:
+    rng = np.random.default_rng(2)
+    rls = RecursiveLeastSquares()
+    for x in _observations(count):
+        assert rls.update(x, float(x @ THETA + rng.normal(0, noise)))
+    return rls
+
+
+def test_converges_to_the_true_coefficients() -> None:
+    """Noisy trips from a linear model recover its coefficients."""
+    rls = _trained(noise=0.5)
+    assert rls.count == 300
+    assert rls.rejected == 0
+    np.testing.assert_allclose(rls.theta, THETA, atol=0.6)
+    x = features(0.0, 90.0, 0.0)
+    assert rls.predict(x) == pytest.approx(x @ THETA, abs=0.3)
+    # The residual scale settles near the noise, well below its start
+    assert rls.scale < 1.5
+
+
+def test_rejects_outliers() -> None:
+    """A reading far outside the residual scale is not learned."""
+    rls = _trained()
+    theta = rls.theta.copy()
+    x = features(15.0, 80.0, 0.0)
+
+    assert not rls.update(x, float(x @ THETA) + 100)
+    assert rls.rejected == 1
+    assert rls.count == 300
+    np.testing.assert_array_equal(rls.theta, theta)
+
+
+def test_no_rejection_before_min_trips() -> None:
+    """The first trips are always learned, however far off they are."""
+    rls = RecursiveLeastSquares()
+    for x in _observations(MODEL_MIN_TRIPS):
+        assert rls.update(x, 1000.0)
+    assert rls.rejected == 0
+
+
+def test_huber_down_weights_large_residuals(monkeypatch) -> None:
+    """A residual beyond the Huber limit moves the model less than in plain RLS."""
+    rls = _trained(noise=0.5)
+    plain = copy.deepcopy(rls)
+    x = features(15.0, 80.0, 0.0)
+    before = rls.predict(x)
+    target = before + 3 * rls.scale
+
+    rls.update(x, target)
+    monkeypatch.setattr(model_module, "MODEL_HUBER_K", 1e9)
+    plain.update(x, target)
+
+    assert 0 < rls.predict(x) - before < plain.predict(x) - before
+
+
+def test_serialization_round_trip() -> None:
+    """A restored model predicts the same, and a different layout starts over."""
+    rls = _trained(50)
+    restored = RecursiveLeastSquares.from_dict(rls.as_dict())
+    np.testing.assert_array_equal(restored.theta, rls.theta)
+    assert (restored.count, restored.scale) == (rls.count, rls.scale)
+
+    fresh = RecursiveLeastSquares.from_dict({**rls.as_dict(), "theta": [1.0]})
+    assert fresh.count == 0
+    assert not fresh.theta.any()
+
+
+async def test_consumption_model_learns_trips(storage_hass) -> None:
+    """Only trips long enough are learned, and predictions wait for enough."""
+    consumption = ConsumptionModel(storage_hass, "entry")
+    await consumption.async_load()
+
+    def trip(distance: float, temperature: float, speed: float) -> dict:
+        x = features(temperature, speed, 0.0)
+        return {
+            ATTR_DISTANCE: distance,
+            ATTR_ENERGY_CONSUMPTION: float(x @ THETA),
+            ATTR_AVG_SPEED: speed,
+            ATTR_AVG_TEMPERATURE: temperature,
+            ATTR_ELEVATION_DIFF: 0,
+        }
+
+    consumption.async_add_trips([trip(1.0, 10.0, 50.0)])
+    assert consumption.rls.count == 0
+
+    consumption.async_add_trips(
+        [trip(10.0, 5.0 * i, 40.0 + 10 * i) for i in range(MODEL_MIN_TRIPS - 1)]
+    )
+    assert not consumption.ready
+    assert consumption.predict(10.0) is None
+
+    consumption.async_add_trips([trip(10.0, 20.0, 60.0)])
+    assert consumption.ready
+    assert consumption.mean_speed is not None
+    assert consumption.predict(10.0) > 0
+    assert consumption.as_attributes()["trips_learned"] == MODEL_MIN_TRIPS
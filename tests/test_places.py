@@ -0,0 +1,109 @@
+"""Tests for the place clustering and lookup index."""
+
+import random
+
+from homeassistant.util.location import distance
+
+from custom_components.ev_trip_tracker.const import PLACE_CELL_SIZE, PLACE_MIN_VISITS
+from custom_components.ev_trip_tracker.places import PlaceIndex
+
+# The middle of a grid cell, so small jitter stays inside it
+HOME = (52.00125, 4.00125)
+WORK = (52.05125, 4.10125)
+
+
+def _near(center: tuple[float, float], rng: random.Random, spread: float):
+    return (
+        center[0] + rng.uniform(-spread, spread),
+        center[1] + rng.uniform(-spread, spread),
+    )
+
+
+def _signature(index: PlaceIndex) -> dict:
+    return {place.name: (place.visits, sorted(place.cells)) for place in index.places}
+
+
+def test_dense_endpoints_become_a_place() -> None:
+    """A place appears once a neighbourhood holds enough endpoints."""
+    rng = random.Random(1)
+    index = PlaceIndex()
+    for _ in range(PLACE_MIN_VISITS - 1):
+        assert not index.add(*_near(HOME, rng, PLACE_CELL_SIZE / 4))
+    assert index.places == []
+    assert index.lookup(*HOME) is None
+
+    assert index.add(*_near(HOME, rng, PLACE_CELL_SIZE / 4))
+    (place,) = index.places
+    assert place.name == "Place 1"
+    assert place.visits == PLACE_MIN_VISITS
+    assert index.lookup(*HOME) is place
+    assert index.lookup(HOME[0] + 0.01, HOME[1]) is None
+
+    # Another visit inside the place only counts
+    assert not index.add(*HOME)
+    assert place.visits == PLACE_MIN_VISITS + 1
+
+    # A lone endpoint elsewhere is noise
+    assert not index.add(*WORK)
+    assert index.lookup(*WORK) is None
+
+
+def test_border_cell_joins_the_place() -> None:
+    """An endpoint next to a place widens it without a core cell of its own."""
+    index = PlaceIndex()
+    # One core cell with two border cells west of it
+    for d_lat, d_lon in ((0, 0), (-1, -1), (1, -1)):
+        index.add(HOME[0] + d_lat * PLACE_CELL_SIZE, HOME[1] + d_lon * PLACE_CELL_SIZE)
+    (place,) = index.places
+    assert len(place.cells) == PLACE_MIN_VISITS
+
+    border = (HOME[0], HOME[1] + PLACE_CELL_SIZE)
+    assert index.add(*border)
+    (grown,) = index.places
+    assert grown.name == place.name
+    assert grown.visits == PLACE_MIN_VISITS + 1
+    assert len(grown.cells) == PLACE_MIN_VISITS + 1
+    assert index.lookup(*border) is grown
+
+
+def test_touching_places_merge() -> None:
+    """Endpoints that connect two places merge them under the larger name."""
+    index = PlaceIndex()
+    east = (HOME[0], HOME[1] + 4 * PLACE_CELL_SIZE)
+    for _ in range(PLACE_MIN_VISITS + 2):
+        index.add(*HOME)
+    for _ in range(PLACE_MIN_VISITS):
+        index.add(*east)
+    assert sorted(place.name for place in index.places) == ["Place 1", "Place 2"]
+
+    for step in (1, 2, 3):
+        for _ in range(PLACE_MIN_VISITS):
+            index.add(HOME[0], HOME[1] + step * PLACE_CELL_SIZE)
+    (place,) = index.places
+    assert place.name == "Place 1"
+    assert index.lookup(*east) is place
+
+
+def test_incremental_matches_full_rebuild() -> None:
+    """Adding endpoints one by one gives the places a full rebuild gives."""
+    rng = random.Random(7)
+    centers = [HOME, WORK, (52.02125, 3.95125)]
+    index = PlaceIndex()
+    for _ in range(400):
+        if rng.random() < 0.1:
+            point = _near(HOME, rng, 0.1)
+        else:
+            point = _near(rng.choice(centers), rng, 2 * PLACE_CELL_SIZE)
+        index.add(*point)
+    assert len(index.places) >= len(centers)
+
+    rebuilt = PlaceIndex.from_dict(index.as_dict())
+    assert _signature(rebuilt) == _signature(index)
+    for place in index.places:
+        other = rebuilt.lookup(place.latitude, place.longitude)
+        assert other is not None
+        assert other.name == place.name
+        assert (
+            distance(place.latitude, place.longitude, other.latitude, other.longitude)
+            < place.radius
+        )
@@ -0,0 +1,90 @@
+"""Tests for the route length, climb and simplified polyline of a trip."""
+
+import math
+
+import numpy as np
+import pytest
+
+from custom_components.ev_trip_tracker.const import (
+    ATTR_ELEVATION_GAIN,
+    ATTR_ELEVATION_LOSS,
+    ATTR_ROUTE_DISTANCE,
+)
+from custom_components.ev_trip_tracker.route import (
+    EARTH_RADIUS,
+    _segment_lengths,
+    compute_route,
+    elevation_change,
+    simplify,
+)
+
+
+def test_haversine_segment_lengths() -> None:
+    """Segments are measured along the great circle."""
+    lengths = _segment_lengths(
+        np.array([0.0, 1.0, 48.8566]), np.array([0.0, 0.0, 2.3522])
+    )
+    assert lengths[0] == pytest.approx(math.pi * EARTH_RADIUS / 180)
+
+    # Paris to London
+    (length,) = _segment_lengths(
+        np.array([48.8566, 51.5074]), np.array([2.3522, -0.1278])
+    )
+    assert length == pytest.approx(343_560, rel=1e-3)
+
+
+def test_straight_line_collapses_to_its_ends() -> None:
+    """Points on a straight line add nothing to the polyline."""
+    lat = np.linspace(52.0, 52.1, 50)
+    lon = np.linspace(4.0, 4.2, 50)
+    assert list(simplify(lat, lon, 10)) == [0, 49]
+
+
+def test_corners_are_kept() -> None:
+    """A turn further off the chord than the tolerance stays in the polyline."""
+    lat = np.concatenate((np.linspace(52.0, 52.01, 11), np.full(10, 52.01)))
+    lon = np.concatenate((np.full(11, 4.0), np.linspace(4.0015, 4.015, 10)))
+    assert list(simplify(lat, lon, 10)) == [0, 10, 20]
+
+    # A few metres of GPS jitter is dropped
+    jittered = lon.copy()
+    jittered[5] += 0.00005
+    assert list(simplify(lat, jittered, 10)) == [0, 10, 20]
+
+
+def test_elevation_noise_does_not_add_up() -> None:
+    """Climb and descent ignore wiggles smaller than the tolerance."""
+    distance = np.arange(0.0, 2000.0, 10.0)
+    climb = np.minimum(distance, 1000.0) * 0.05
+    altitude = climb - np.maximum(distance - 1000.0, 0.0) * 0.02
+    noisy = altitude + np.where(np.arange(len(distance)) % 2, 1.5, -1.5)
+    gain, loss = elevation_change(distance, noisy, 5.0)
+    assert gain == pytest.approx(50.0, abs=3.0)
+    assert loss == pytest.approx(20.0, abs=3.0)
+
+    assert elevation_change(distance[:1], altitude[:1], 5.0) == (0.0, 0.0)
+
+
+def test_compute_route() -> None:
+    """Missing and stationary samples are dropped before measuring."""
+    lat = [52.0, 52.0, math.nan, 52.005, 52.01]
+    lon = [4.0, 4.0, 4.0, 4.0, 4.0]
+    altitude = [math.nan] * 5
+    attributes, polyline = compute_route(lat, lon, altitude)
+    assert attributes == {ATTR_ROUTE_DISTANCE: 1.11}
+    assert polyline.dtype == np.float32
+    np.testing.assert_allclose(polyline, [[52.0, 4.0], [52.01, 4.0]])
+
+    # Elevations from a DEM replace the missing GPS altitudes
+    attributes, _ = compute_route(
+        lat, lon, altitude, lambda lat, lon: (lat - 52.0) * 10_000
+    )
+    assert attributes[ATTR_ELEVATION_GAIN] == pytest.approx(100.0)
+    assert attributes[ATTR_ELEVATION_LOSS] == 0.0
+
+
+def test_route_needs_two_positions() -> None:
+    """A car that never moved has no route."""
+    attributes, polyline = compute_route([52.0, 52.0], [4.0, 4.0], [1.0, 1.0])
+    assert attributes == {}
+    assert polyline.shape == (0, 2)
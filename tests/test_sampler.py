@@ -0,0 +1,64 @@
+"""Tests for the fixed-capacity trip sample buffer."""
+
+import pytest
+
+from custom_components.ev_trip_tracker.sampler import (
+    COLUMN_ODOMETER,
+    COLUMN_POWER,
+    COLUMN_TIME,
+    SampleBuffer,
+)
+
+COLUMNS = (COLUMN_TIME, COLUMN_ODOMETER, COLUMN_POWER)
+
+
+def test_close_samples_are_merged() -> None:
+    """A sample too close to the one before replaces the newest sample."""
+    buffer = SampleBuffer(COLUMNS, capacity=8, min_interval=5)
+    for second in range(4):
+        buffer.add(second, {COLUMN_ODOMETER: 1000.0 + second})
+    assert list(buffer.column(COLUMN_TIME)) == [0, 3]
+    assert list(buffer.column(COLUMN_ODOMETER)) == [1000.0, 1003.0]
+
+    buffer.add(6, {COLUMN_ODOMETER: 1006.0})
+    assert list(buffer.column(COLUMN_TIME)) == [0, 3, 6]
+    # The newest sample slides until it is far enough from the one before
+    buffer.add(7, {COLUMN_ODOMETER: 1007.0})
+    assert list(buffer.column(COLUMN_TIME)) == [0, 3, 7]
+    buffer.add(8, {COLUMN_ODOMETER: 1008.0})
+    assert list(buffer.column(COLUMN_TIME)) == [0, 3, 7, 8]
+
+
+def test_full_buffer_halves_its_resolution() -> None:
+    """A full buffer keeps every other sample and the latest one."""
+    buffer = SampleBuffer(COLUMNS, capacity=8, min_interval=1)
+    for second in range(8):
+        buffer.add(second, {COLUMN_ODOMETER: float(second)})
+    assert len(buffer) == 8
+
+    buffer.add(8, {COLUMN_ODOMETER: 8.0})
+    assert list(buffer.column(COLUMN_TIME)) == [0, 2, 4, 6, 7, 8]
+    assert buffer.min_interval == 2
+    assert list(buffer.column(COLUMN_ODOMETER)) == [0.0, 2.0, 4.0, 6.0, 7.0, 8.0]
+
+    # A long trip stays spread evenly from start to end
+    for second in range(9, 1000):
+        buffer.add(second, {COLUMN_ODOMETER: float(second)})
+    times = list(buffer.column(COLUMN_TIME))
+    assert len(times) <= buffer.capacity
+    assert (times[0], times[-1]) == (0, 999)
+    assert buffer.min_interval == 256
+    assert max(b - a for a, b in zip(times, times[1:])) <= 2 * buffer.min_interval
+
+
+def test_time_weighted_mean() -> None:
+    """Missing values are skipped and the end points weigh in."""
+    buffer = SampleBuffer(COLUMNS, capacity=8, min_interval=1)
+    buffer.add(0, {COLUMN_POWER: 10.0})
+    buffer.add(10, {})
+    buffer.add(20, {COLUMN_POWER: 30.0})
+    assert buffer.time_weighted_mean(COLUMN_POWER) == pytest.approx(20.0)
+    assert buffer.time_weighted_mean(COLUMN_POWER, last=(40, 30.0)) == pytest.approx(
+        25.0
+    )
+    assert buffer.time_weighted_mean(COLUMN_ODOMETER) is None
@@ -0,0 +1,150 @@
+"""Tests for the running trip statistics."""
+
+import statistics
+from datetime import datetime, timedelta
+
+import pytest
+from homeassistant.util import dt as dt_util
+from pytest_homeassistant_custom_component.common import async_fire_time_changed
+
+from custom_components.ev_trip_tracker.const import (
+    ATTR_AVG_SPEED,
+    ATTR_DISTANCE,
+    ATTR_DURATION,
+    ATTR_END_TIME,
+    ATTR_ENERGY_CONSUMPTION,
+    ATTR_ENERGY_USED,
+    PERIOD_DAY,
+    PERIOD_LIFETIME,
+    PERIOD_MONTH,
+    PERIOD_WEEK,
+)
+from custom_components.ev_trip_tracker.statistics import (
+    PeriodStatistics,
+    RunningStats,
+    TripStatistics,
+)
+
+VALUES = [12.5, 18.25, 9.0, 31.75, 15.5, 22.0]
+
+# A Saturday, so the next midnight rolls the day and the one after the week
+# and month as well
+SATURDAY = datetime(2024, 3, 30, 12, 0)
+
+
+def _trip(end: datetime, distance: float, energy: float | None = None) -> dict:
+    return {
+        ATTR_END_TIME: end.isoformat(),
+        ATTR_DISTANCE: distance,
+        ATTR_ENERGY_USED: energy,
+        ATTR_ENERGY_CONSUMPTION: energy / distance * 100 if energy else None,
+        ATTR_AVG_SPEED: 45.0,
+        ATTR_DURATION: 20.0,
+    }
+
+
+def test_running_stats_match_batch() -> None:
+    """Welford's mean and variance match a batch computation."""
+    stats = RunningStats()
+    assert stats.variance is None
+    for value in VALUES:
+        stats.add(value)
+    assert stats.count == len(VALUES)
+    assert stats.total == pytest.approx(sum(VALUES))
+    assert stats.mean == pytest.approx(statistics.mean(VALUES))
+    assert stats.variance == pytest.approx(statistics.variance(VALUES))
+    assert stats.stddev == pytest.approx(statistics.stdev(VALUES))
+
+    restored = RunningStats(*stats.as_list())
+    assert restored.variance == stats.variance
+
+
+def test_running_stats_remove() -> None:
+    """Taking a value back gives the statistics without it."""
+    stats = RunningStats()
+    for value in VALUES:
+        stats.add(value)
+    stats.remove(VALUES[2])
+    rest = VALUES[:2] + VALUES[3:]
+    assert stats.count == len(rest)
+    assert stats.mean == pytest.approx(statistics.mean(rest))
+    assert stats.variance == pytest.approx(statistics.variance(rest))
+
+    for value in rest:
+        stats.remove(value)
+    assert stats.as_list() == [0, 0.0, 0.0, 0.0]
+
+
+def test_window_consumption_is_distance_weighted() -> None:
+    """Trips without a known energy use do not dilute the consumption."""
+    window = PeriodStatistics(PERIOD_LIFETIME, None)
+    window.add_trip(_trip(SATURDAY, 10.0, 2.0))
+    window.add_trip(_trip(SATURDAY, 30.0, 3.0))
+    window.add_trip(_trip(SATURDAY, 60.0))
+    attributes = window.as_attributes()
+    assert attributes["trips"] == 3
+    assert attributes[ATTR_DISTANCE] == 100.0
+    assert attributes[ATTR_ENERGY_CONSUMPTION] == 12.5
+    # The mean of the per-trip figures weighs the short trip as much
+    assert attributes["consumption_mean"] == 15.0
+
+    window.remove_trip(_trip(SATURDAY, 10.0, 2.0))
+    assert window.as_attributes()[ATTR_ENERGY_CONSUMPTION] == 10.0
+
+
+async def test_windows_roll_over_at_midnight(storage_hass, freezer) -> None:
+    """Each window starts over when local midnight leaves its period."""
+    now = SATURDAY.replace(tzinfo=dt_util.DEFAULT_TIME_ZONE)
+    freezer.move_to(now)
+    stats = TripStatistics(storage_hass, "entry")
+    await stats.async_load()
+    stats.async_add_trip(_trip(now, 10.0, 2.0))
+    assert stats.periods[PERIOD_WEEK].start.isoformat() == "2024-03-25"
+
+    async def midnight(days: int) -> None:
+        when = dt_util.start_of_local_day(now + timedelta(days=days))
+        freezer.move_to(when)
+        async_fire_time_changed(storage_hass, when)
+        await storage_hass.async_block_till_done()
+
+    def trips() -> dict[str, int]:
+        return {period: window.trips for period, window in stats.periods.items()}
+
+    await midnight(1)
+    assert trips() == {
+        PERIOD_DAY: 0,
+        PERIOD_WEEK: 1,
+        PERIOD_MONTH: 1,
+        PERIOD_LIFETIME: 1,
+    }
+    assert stats.periods[PERIOD_DAY].start.isoformat() == "2024-03-31"
+
+    await midnight(2)
+    assert trips() == {
+        PERIOD_DAY: 0,
+        PERIOD_WEEK: 0,
+        PERIOD_MONTH: 0,
+        PERIOD_LIFETIME: 1,
+    }
+    assert stats.periods[PERIOD_WEEK].start.isoformat() == "2024-04-01"
+    assert stats.periods[PERIOD_MONTH].start.isoformat() == "2024-04-01"
+    stats.async_unload()
+
+
+async def test_replace_trip_skips_rolled_windows(storage_hass, freezer) -> None:
+    """A corrected trip from yesterday only updates the windows still open."""
+    now = SATURDAY.replace(tzinfo=dt_util.DEFAULT_TIME_ZONE)
+    freezer.move_to(now)
+    stats = TripStatistics(storage_hass, "entry")
+    await stats.async_load()
+    old = _trip(now, 10.0, 2.0)
+    stats.async_add_trip(old)
+    stats.async_add_trips([_trip(now + timedelta(days=1), 5.0, 1.0)])
+    assert stats.periods[PERIOD_DAY].trips == 1
+
+    stats.async_replace_trip(old, _trip(now, 12.0, 2.4))
+    assert stats.periods[PERIOD_DAY].distance == 5.0
+    assert stats.periods[PERIOD_WEEK].distance == pytest.approx(17.0)
+    assert stats.periods[PERIOD_LIFETIME].distance == pytest.approx(17.0)
+    assert stats.periods[PERIOD_LIFETIME].trips == 2
+    stats.async_unload()
@@ -0,0 +1,95 @@
+"""Tests for the weather along a trip from one batched hourly request."""
+
+from custom_components.ev_trip_tracker.const import (
+    ATTR_AVG_TEMPERATURE,
+    ATTR_AVG_WIND_SPEED,
+    ATTR_END_TEMPERATURE,
+    ATTR_PRECIPITATION,
+    ATTR_START_TEMPERATURE,
+)
+from custom_components.ev_trip_tracker.sampler import (
+    COLUMN_LATITUDE,
+    COLUMN_LONGITUDE,
+    SampleBuffer,
+)
+from custom_components.ev_trip_tracker.weather import (
+    HOURLY_PRECIPITATION,
+    HOURLY_TEMPERATURE,
+    HOURLY_WIND_SPEED,
+    summarize,
+    trip_points,
+)
+
+HOUR = 3600
+T0 = 1_709_280_000
+
+
+def _hourly(temperature: list, precipitation: list, wind: list) -> dict:
+    return {
+        "hourly": {
+            "time": [T0 + hour * HOUR for hour in range(len(temperature))],
+            HOURLY_TEMPERATURE: temperature,
+            HOURLY_PRECIPITATION: precipitation,
+            HOURLY_WIND_SPEED: wind,
+        }
+    }
+
+
+def test_summarize_interpolates_between_hours() -> None:
+    """Each point takes its values at its own time, then they are averaged."""
+    location = _hourly([10.0, 12.0, 14.0], [0.0, 2.0, 4.0], [5.0, 5.0, 5.0])
+    points = [(T0 + HOUR / 2, 52.0, 4.0), (T0 + 3 * HOUR / 2, 52.1, 4.1)]
+    assert summarize(points, [location, location]) == {
+        ATTR_START_TEMPERATURE: 11.0,
+        ATTR_END_TEMPERATURE: 13.0,
+        ATTR_AVG_TEMPERATURE: 12.0,
+        ATTR_AVG_WIND_SPEED: 5.0,
+        # 1 mm/h rising to 3 mm/h over an hour
+        ATTR_PRECIPITATION: 2.0,
+    }
+
+
+def test_summarize_weighs_by_time() -> None:
+    """A point long after the one before counts for that whole stretch."""
+    location = _hourly([10.0] * 4, [0.0] * 4, [0.0] * 4)
+    warm = _hourly([20.0] * 4, [0.0] * 4, [0.0] * 4)
+    points = [(T0, 52.0, 4.0), (T0 + 600, 52.1, 4.0), (T0 + 3 * HOUR, 52.2, 4.0)]
+    attributes = summarize(points, [location, location, warm])
+    assert attributes[ATTR_AVG_TEMPERATURE] == round(
+        (10.0 * 600 + 15.0 * (3 * HOUR - 600)) / (3 * HOUR), 1
+    )
+
+
+def test_summarize_skips_missing_values() -> None:
+    """Gaps in the hourly data are bridged, and no data gives no value."""
+    location = _hourly([10.0, None, 14.0], [None] * 3, [None] * 3)
+    points = [(T0 + HOUR, 52.0, 4.0)]
+    attributes = summarize(points, [location])
+    assert attributes[ATTR_START_TEMPERATURE] == 12.0
+    assert attributes[ATTR_AVG_TEMPERATURE] == 12.0
+    assert attributes[ATTR_AVG_WIND_SPEED] is None
+    assert attributes[ATTR_PRECIPITATION] is None
+
+    assert summarize(points, [{}])[ATTR_START_TEMPERATURE] is None
+
+
+def test_trip_points_merge_weather_cells() -> None:
+    """Points in the same weather cell are merged, keeping the start and end."""
+    samples = SampleBuffer(capacity=16, min_interval=1)
+    for minute in range(10):
+        samples.add(
+            T0 + minute * 60,
+            {COLUMN_LATITUDE: 52.0 + minute * 0.001, COLUMN_LONGITUDE: 4.0},
+        )
+    samples.add(T0 + 900, {COLUMN_LATITUDE: 52.25, COLUMN_LONGITUDE: 4.25})
+    samples.add(T0 + 1200, {COLUMN_LATITUDE: 52.5, COLUMN_LONGITUDE: 4.5})
+    # The end replaces the last sample, which lies in its cell
+    assert trip_points(samples, (T0 + 1260, 52.5001, 4.5001), max_points=16) == [
+        (T0, 52.0, 4.0),
+        (T0 + 900, 52.25, 4.25),
+        (T0 + 1260, 52.5001, 4.5001),
+    ]
+
+    # Without location samples only the end is known
+    assert trip_points(None, (T0, 52.0, 4.0)) == [(T0, 52.0, 4.0)]
+    assert trip_points(None, (T0, None, None)) == []
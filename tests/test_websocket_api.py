@@ -0,0 +1,183 @@
+"""Tests for the websocket commands over the stored trips."""
+
+import asyncio
+import json
+
+import pytest
+import voluptuous as vol
+
+from custom_components.ev_trip_tracker.const import (
+    ATTR_CONFIG_ENTRY_ID,
+    ATTR_CURSOR,
+    ATTR_DISTANCE,
+    ATTR_END_ODOMETER,
+    ATTR_END_TIME,
+    ATTR_ENERGY_USED,
+    ATTR_LIMIT,
+    ATTR_START_ODOMETER,
+    ATTR_START_TIME,
+    DATA_WEBSOCKET_CACHE,
+    DOMAIN,
+)
+from custom_components.ev_trip_tracker.history import TripHistoryStore
+from custom_components.ev_trip_tracker.places import Places
+from custom_components.ev_trip_tracker.websocket_api import (
+    ws_aggregate_trips,
+    ws_list_trips,
+)
+
+
+def _trip(hour: int, odometer: float = 1000.0) -> dict:
+    return {
+        ATTR_START_TIME: f"2024-03-01T{hour:02d}:00:00+00:00",
+        ATTR_END_TIME: f"2024-03-01T{hour:02d}:30:00+00:00",
+        ATTR_START_ODOMETER: odometer,
+        ATTR_END_ODOMETER: odometer + 10.0,
+        ATTR_DISTANCE: 10.0,
+        ATTR_ENERGY_USED: 1.5,
+    }
+
+
+async def _add_vehicle(hass, entry_id: str, trips: int) -> dict:
+    """Register a vehicle with loaded stores holding ``trips`` trips."""
+    data = {
+        "history": TripHistoryStore(hass, entry_id),
+        "places": Places(hass, entry_id),
+        "loaded": asyncio.Event(),
+    }
+    await data["history"].async_load()
+    await data["places"].async_load()
+    for hour in range(trips):
+        data["history"].async_append(_trip(hour, 1000.0 + 10 * hour))
+    await data["history"].async_flush()
+    data["loaded"].set()
+    data["loader"] = hass.async_create_task(asyncio.sleep(0))
+    hass.data.setdefault(DOMAIN, {})[entry_id] = data
+    return data
+
+
+class _Connection:
+    """Record what a command sends back."""
+
+    def __init__(self) -> None:
+        self.results: list[dict] = []
+        self.errors: list[str] = []
+
+    def send_message(self, payload: bytes) -> None:
+        self.results.append(json.loads(payload)["result"])
+
+    def send_error(self, msg_id: int, code: str, message: str) -> None:
+        self.errors.append(code)
+
+    def async_handle_exception(self, msg: dict, err: Exception) -> None:
+        self.errors.append(type(err).__name__)
+
+
+async def _query(hass, handler, **msg) -> _Connection:
+    """Run a command to completion, the way the websocket API would."""
+    connection = _Connection()
+    msg = handler._ws_schema({"id": 1, "type": handler._ws_command, **msg})
+    try:
+        await handler.__wrapped__(hass, connection, msg)
+    except Exception as err:
+        connection.async_handle_exception(msg, err)
+    return connection
+
+
+async def test_failed_vehicle_does_not_block_others(storage_hass) -> None:
+    """A vehicle that is loading or failed to load only holds up queries naming it."""
+    await _add_vehicle(storage_hass, "good", 2)
+
+    release = asyncio.Event()
+
+    async def fail_loading() -> None:
+        await release.wait()
+        broken["load_failed"] = True
+
+    broken = {"loaded": asyncio.Event()}
+    broken["loader"] = asyncio.create_task(fail_loading())
+    storage_hass.data[DOMAIN]["broken"] = broken
+
+    # Answered while the other vehicle is still loading
+    response = await asyncio.wait_for(
+        _query(storage_hass, ws_list_trips, **{ATTR_CONFIG_ENTRY_ID: "good"}), 1
+    )
+    assert not response.errors
+    assert len(response.results[0]["trips"]) == 2
+
+    # A query over every vehicle waits, then leaves the failed one out
+    pending = asyncio.create_task(_query(storage_hass, ws_aggregate_trips))
+    await asyncio.sleep(0)
+    assert not pending.done()
+    release.set()
+    response = await pending
+    assert not response.errors
+    assert response.results[0]["groups"][0]["trips"] == 2
+
+    response = await _query(storage_hass, ws_list_trips)
+    assert len(response.results[0]["trips"]) == 2
+
+    response = await _query(
+        storage_hass, ws_list_trips, **{ATTR_CONFIG_ENTRY_ID: "broken"}
+    )
+    assert response.errors == ["HomeAssistantError"]
+    assert not response.results
+
+
+async def test_pages_cover_every_trip_once(storage_hass) -> None:
+    """Following the cursor lists the trips of all vehicles, newest first.
+
+    Both vehicles have trips starting at the same times, which the cursor
+    tells apart by vehicle and record.
+    """
+    await _add_vehicle(storage_hass, "a", 5)
+    await _add_vehicle(storage_hass, "b", 3)
+
+    listed = []
+    cursor = None
+    while True:
+        msg = {ATTR_LIMIT: 3}
+        if cursor is not None:
+            msg[ATTR_CURSOR] = cursor
+        response = await _query(storage_hass, ws_list_trips, **msg)
+        page = response.results[0]
+        assert len(page["trips"]) <= 3
+        listed.extend(
+            (trip[ATTR_START_TIME], trip[ATTR_CONFIG_ENTRY_ID])
+            for trip in page["trips"]
+        )
+        cursor = page[ATTR_CURSOR]
+        if cursor is None:
+            break
+
+    assert len(listed) == 8
+    assert len(set(listed)) == 8
+    assert [start for start, _ in listed] == sorted(
+        (start for start, _ in listed), reverse=True
+    )
+
+    with pytest.raises(vol.Invalid):
+        ws_list_trips._ws_schema(
+            {"id": 1, "type": ws_list_trips._ws_command, ATTR_CURSOR: "yesterday"}
+        )
+
+
+async def test_cached_result_until_history_changes(storage_hass) -> None:
+    """A repeated query is answered from the cache until a trip is written."""
+    data = await _add_vehicle(storage_hass, "a", 2)
+    first = await _query(storage_hass, ws_aggregate_trips)
+    cache = storage_hass.data[DATA_WEBSOCKET_CACHE]
+    ((stamp, payload),) = cache.values()
+    second = await _query(storage_hass, ws_aggregate_trips)
+    assert second.results == first.results
+    # Sent as encoded the first time
+    assert next(iter(cache.values()))[1] is payload
+
+    data["history"].async_append(_trip(5, 1100.0))
+    third = await _query(storage_hass, ws_aggregate_trips)
+    assert third.results[0]["groups"][0]["trips"] == 3
+    assert next(iter(cache.values()))[0] != stamp
+
+    # Another query is cached next to it
+    await _query(storage_hass, ws_list_trips)
+    assert len(cache) == 2